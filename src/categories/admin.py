@@ -4,5 +4,5 @@ from .models import Category
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-	list_display = ("name", "slug", "created_at")
+	list_display = ("name", "slug", "recipe_count", "created_at")
 	search_fields = ("name", "slug")
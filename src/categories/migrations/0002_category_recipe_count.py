@@ -0,0 +1,38 @@
+# Generated by Django 4.2.27 on 2026-10-17 07:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_recipe_count(apps, schema_editor):
+    Category = apps.get_model('categories', 'Category')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    db_alias = schema_editor.connection.alias
+    counts = (
+        Recipe.objects.using(db_alias)
+        .filter(category=OuterRef('pk'))
+        .order_by().values('category').annotate(n=Count('pk')).values('n')
+    )
+    Category.objects.using(db_alias).update(recipe_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['-recipe_count', 'name'], name='category_count_name_idx'),
+        ),
+        migrations.RunPython(backfill_recipe_count, migrations.RunPython.noop),
+    ]
@@ -5,6 +5,14 @@ class Category(models.Model):
 	name = models.CharField(max_length=100, unique=True)
 	slug = models.SlugField(max_length=120, unique=True)
 	created_at = models.DateTimeField(auto_now_add=True)
+	# Denormalized number of recipes in this category, maintained by
+	# recipes.signals; `manage.py repair_recipe_counts` fixes any drift.
+	recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['-recipe_count', 'name'], name='category_count_name_idx'),
+		]
 
 	def __str__(self) -> str:
 		return self.name
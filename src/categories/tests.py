@@ -1,4 +1,5 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from recipes.models import Recipe
@@ -40,6 +41,9 @@ class CategoryListViewTests(TestCase):
 			category=cls.category2,
 		)
 
+	def setUp(self):
+		cache.clear()
+
 	def test_category_list_status_code(self):
 		"""Category list page returns 200."""
 		response = self.client.get(reverse('categories:category_list'))
@@ -98,3 +102,41 @@ class CategoryListViewTests(TestCase):
 		self.assertContains(response, 'Italian')
 		self.assertContains(response, 'Mexican')
 		self.assertContains(response, 'Indian')
+
+	@override_settings(KEYSET_PAGE_SIZE=2)
+	def test_category_list_paginates_by_name(self):
+		"""Categories are split into pages using name cursors."""
+		response = self.client.get(reverse('categories:category_list'))
+		self.assertEqual([c.name for c in response.context['categories']], ['Indian', 'Italian'])
+		page = response.context['page']
+		response = self.client.get(reverse('categories:category_list') + '?' + page.next_query)
+		self.assertEqual([c.name for c in response.context['categories']], ['Mexican'])
+		self.assertEqual(response.context['page'].total_count, 3)
+
+	def test_category_list_sorted_by_recipe_count(self):
+		"""sort=popular orders by the stored recipe count, then name."""
+		response = self.client.get(reverse('categories:category_list'), {'sort': 'popular'})
+		names = [c.name for c in response.context['categories']]
+		self.assertEqual(names, ['Italian', 'Mexican', 'Indian'])
+		self.assertEqual(response.context['sort'], 'popular')
+
+	def test_category_list_unknown_sort_falls_back_to_name(self):
+		response = self.client.get(reverse('categories:category_list'), {'sort': 'bogus'})
+		self.assertEqual(response.context['sort'], 'name')
+		self.assertEqual([c.name for c in response.context['categories']], ['Indian', 'Italian', 'Mexican'])
+
+	def test_category_list_min_recipes_filter(self):
+		"""min_recipes keeps categories with at least that many recipes."""
+		response = self.client.get(reverse('categories:category_list'), {'min_recipes': '1'})
+		self.assertEqual([c.name for c in response.context['categories']], ['Italian', 'Mexican'])
+		response = self.client.get(reverse('categories:category_list'), {'min_recipes': 'lots'})
+		self.assertEqual(len(response.context['categories']), 3)
+		self.assertEqual(response.context['min_recipes'], '')
+
+	@override_settings(KEYSET_PAGE_SIZE=2)
+	def test_category_list_paginates_by_recipe_count(self):
+		response = self.client.get(reverse('categories:category_list'), {'sort': 'popular'})
+		page = response.context['page']
+		self.assertIn('sort=popular', page.next_query)
+		response = self.client.get(reverse('categories:category_list') + '?' + page.next_query)
+		self.assertEqual([c.name for c in response.context['categories']], ['Indian'])
@@ -1,23 +1,80 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from django.db.models import Count
+from django.http import JsonResponse
+from recipes.api import ApiError, ApiField, Resource, api_view, paginated_list, with_content_etag
+from recipes.page_cache import cache_anonymous_page
+from recipes.pagination import apaginate
+from recipes.routers import use_replica
 from .models import Category
 
 
-def category_list(request):
+# ?sort= values and their keyset orderings
+LIST_ORDERINGS = {
+    'name': ('name', 'id'),
+    'popular': ('-recipe_count', 'name', 'id'),
+}
+
+
+@use_replica
+@cache_anonymous_page()
+async def category_list(request):
     """Display all categories with recipe counts."""
-    categories = Category.objects.annotate(
-        recipe_count=Count('recipes')
-    ).order_by('name')
+    categories = Category.objects.all()
 
     search_query = request.GET.get('q', '').strip()
+    sort = request.GET.get('sort', '')
+    if sort not in LIST_ORDERINGS:
+        sort = 'name'
+    min_recipes = request.GET.get('min_recipes', '')
 
     if search_query:
         categories = categories.filter(name__icontains=search_query)
 
+    # recipe_count is a stored column, so filtering and sorting on it is indexed
+    if min_recipes:
+        try:
+            categories = categories.filter(recipe_count__gte=int(min_recipes))
+        except ValueError:
+            min_recipes = ''
+
+    page = await apaginate(request, categories, LIST_ORDERINGS[sort])
+
     context = {
-        'categories': categories,
+        'categories': page.object_list,
+        'page': page,
         'search_query': search_query,
+        'sort': sort,
+        'min_recipes': min_recipes,
     }
-    return render(request, 'categories/category_list.html', context)
+    return await sync_to_async(render)(request, 'categories/category_list.html', context)
+
+
+CATEGORY_RESOURCE = Resource(
+    fields={
+        'id': ApiField(),
+        'name': ApiField(),
+        'slug': ApiField(),
+        'created_at': ApiField(),
+        'recipe_count': ApiField(),
+    },
+    list_fields=('id', 'name', 'slug', 'recipe_count'),
+)
+
+
+@api_view
+def category_list_api(request):
+    """Categories by name; ``q`` filters on the name."""
+    categories = Category.objects.all()
+    search_query = request.GET.get('q', '').strip()
+    if search_query:
+        categories = categories.filter(name__icontains=search_query)
+    return paginated_list(request, CATEGORY_RESOURCE, categories, ('name', 'id'))
 
 
+@api_view
+def category_detail_api(request, pk):
+    names = CATEGORY_RESOURCE.parse_fields(request, CATEGORY_RESOURCE.detail_fields)
+    category = CATEGORY_RESOURCE.queryset(Category.objects.all(), names).filter(pk=pk).first()
+    if category is None:
+        raise ApiError('Not found.', status=404)
+    return with_content_etag(request, JsonResponse(CATEGORY_RESOURCE.serialize(category, names, request)))
@@ -4,5 +4,5 @@ from .models import Ingredient
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
-	list_display = ("name", "default_unit")
+	list_display = ("name", "default_unit", "recipe_count")
 	search_fields = ("name",)
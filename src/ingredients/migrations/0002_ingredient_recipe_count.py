@@ -0,0 +1,38 @@
+# Generated by Django 4.2.27 on 2026-10-17 07:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_recipe_count(apps, schema_editor):
+    Ingredient = apps.get_model('ingredients', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    db_alias = schema_editor.connection.alias
+    counts = (
+        RecipeIngredient.objects.using(db_alias)
+        .filter(ingredient=OuterRef('pk'))
+        .order_by().values('ingredient').annotate(n=Count('pk')).values('n')
+    )
+    Ingredient.objects.using(db_alias).update(recipe_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients', '0001_initial'),
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['-recipe_count', 'name'], name='ingredient_count_name_idx'),
+        ),
+        migrations.RunPython(backfill_recipe_count, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,14 @@ from django.db import models
 class Ingredient(models.Model):
 	name = models.CharField(max_length=120, unique=True)
 	default_unit = models.CharField(max_length=20, blank=True)
+	# Denormalized number of recipes using this ingredient, maintained by
+	# recipes.signals; `manage.py repair_recipe_counts` fixes any drift.
+	recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['-recipe_count', 'name'], name='ingredient_count_name_idx'),
+		]
 
 	def __str__(self) -> str:
 		return self.name
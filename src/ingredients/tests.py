@@ -1,4 +1,5 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from recipes.models import Recipe, RecipeIngredient
 from .models import Ingredient
@@ -28,6 +29,9 @@ class IngredientListViewTests(TestCase):
 		RecipeIngredient.objects.create(recipe=cls.recipe2, ingredient=cls.ingredient1)
 		RecipeIngredient.objects.create(recipe=cls.recipe2, ingredient=cls.ingredient2)
 
+	def setUp(self):
+		cache.clear()
+
 	def test_ingredient_list_status_code(self):
 		"""Ingredient list page returns 200."""
 		response = self.client.get(reverse('ingredients:ingredient_list'))
@@ -92,3 +96,24 @@ class IngredientListViewTests(TestCase):
 		"""Ingredient list page shows default units."""
 		response = self.client.get(reverse('ingredients:ingredient_list'))
 		self.assertContains(response, 'cloves')
+
+	@override_settings(KEYSET_PAGE_SIZE=2)
+	def test_ingredient_list_pagination_keeps_search(self):
+		"""Next-page links keep the search query."""
+		response = self.client.get(reverse('ingredients:ingredient_list'), {'q': 'o'})
+		self.assertEqual(len(response.context['ingredients']), 2)
+		page = response.context['page']
+		self.assertIn('q=o', page.next_query)
+		response = self.client.get(reverse('ingredients:ingredient_list') + '?' + page.next_query)
+		self.assertEqual([i.name for i in response.context['ingredients']], ['Tomatoes'])
+
+	def test_ingredient_list_sorted_by_recipe_count(self):
+		"""sort=popular orders by the stored recipe count, ties by name."""
+		response = self.client.get(reverse('ingredients:ingredient_list'), {'sort': 'popular'})
+		names = [i.name for i in response.context['ingredients']]
+		self.assertEqual(names, ['Onions', 'Tomatoes', 'Garlic', 'Olive Oil'])
+
+	def test_ingredient_list_min_recipes_filter(self):
+		response = self.client.get(reverse('ingredients:ingredient_list'), {'min_recipes': '2', 'sort': 'popular'})
+		self.assertEqual([i.name for i in response.context['ingredients']], ['Onions', 'Tomatoes'])
+		self.assertContains(response, 'value="2"')
@@ -1,22 +1,87 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from django.db.models import Count
+from django.http import JsonResponse
+from recipes.api import ApiError, ApiField, Resource, api_view, paginated_list, with_content_etag
+from recipes.fuzzy import get_index as get_fuzzy_index, suggestion_query
+from recipes.page_cache import cache_anonymous_page
+from recipes.pagination import apaginate
+from recipes.routers import use_replica
 from .models import Ingredient
 
 
-def ingredient_list(request):
+# ?sort= values and their keyset orderings
+LIST_ORDERINGS = {
+    'name': ('name', 'id'),
+    'popular': ('-recipe_count', 'name', 'id'),
+}
+
+
+@use_replica
+@cache_anonymous_page()
+async def ingredient_list(request):
     """Display all ingredients with recipe counts."""
-    ingredients = Ingredient.objects.annotate(
-        recipe_count=Count('ingredient_recipes')
-    ).order_by('name')
+    ingredients = Ingredient.objects.all()
 
     search_query = request.GET.get('q', '').strip()
+    sort = request.GET.get('sort', '')
+    if sort not in LIST_ORDERINGS:
+        sort = 'name'
+    min_recipes = request.GET.get('min_recipes', '')
 
-    if search_query:
-        ingredients = ingredients.filter(name__icontains=search_query)
+    # recipe_count is a stored column, so filtering and sorting on it is indexed
+    if min_recipes:
+        try:
+            ingredients = ingredients.filter(recipe_count__gte=int(min_recipes))
+        except ValueError:
+            min_recipes = ''
+
+    matches = ingredients.filter(name__icontains=search_query) if search_query else ingredients
+    page = await apaginate(request, matches, LIST_ORDERINGS[sort])
+
+    # Nothing matched: retry with the misspelt words corrected
+    suggestion = None
+    if search_query and not page.object_list:
+        suggestion = await sync_to_async(get_fuzzy_index().suggest_ingredient)(search_query)
+        if suggestion:
+            page = await apaginate(request, ingredients.filter(name__icontains=suggestion), LIST_ORDERINGS[sort])
 
     context = {
-        'ingredients': ingredients,
+        'ingredients': page.object_list,
+        'page': page,
         'search_query': search_query,
+        'suggestion': suggestion,
+        'suggestion_query': suggestion_query(request.GET, 'q', suggestion) if suggestion else '',
+        'sort': sort,
+        'min_recipes': min_recipes,
     }
-    return render(request, 'ingredients/ingredient_list.html', context)
+    return await sync_to_async(render)(request, 'ingredients/ingredient_list.html', context)
+
+
+INGREDIENT_RESOURCE = Resource(
+    fields={
+        'id': ApiField(),
+        'name': ApiField(),
+        'default_unit': ApiField(),
+        'recipe_count': ApiField(),
+    },
+    list_fields=('id', 'name', 'default_unit', 'recipe_count'),
+)
+
+
+@api_view
+def ingredient_list_api(request):
+    """Ingredients by name; ``q`` filters on the name."""
+    ingredients = Ingredient.objects.all()
+    search_query = request.GET.get('q', '').strip()
+    if search_query:
+        ingredients = ingredients.filter(name__icontains=search_query)
+    return paginated_list(request, INGREDIENT_RESOURCE, ingredients, ('name', 'id'))
+
 
+@api_view
+def ingredient_detail_api(request, pk):
+    names = INGREDIENT_RESOURCE.parse_fields(request, INGREDIENT_RESOURCE.detail_fields)
+    ingredient = INGREDIENT_RESOURCE.queryset(Ingredient.objects.all(), names).filter(pk=pk).first()
+    if ingredient is None:
+        raise ApiError('Not found.', status=404)
+    return with_content_etag(request, JsonResponse(INGREDIENT_RESOURCE.serialize(ingredient, names, request)))
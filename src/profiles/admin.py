@@ -6,3 +6,4 @@ from .models import Profile
 class ProfileAdmin(admin.ModelAdmin):
 	list_display = ("user", "bio")
 	search_fields = ("user__username",)
+	list_select_related = ("user",)
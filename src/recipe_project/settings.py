@@ -46,12 +46,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'recipes.middleware.DatabaseRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'recipes.middleware.QueryCountMiddleware',
 ]
 
 ROOT_URLCONF = 'recipe_project.urls'
@@ -77,13 +79,83 @@ WSGI_APPLICATION = 'recipe_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# 'default' is the primary and takes every write. 'replica' is a read-only
+# connection to the same file, which WAL mode lets read while the primary
+# writes; reads from the list, detail and search views are routed to the
+# DATABASE_REPLICAS aliases by recipes.routers.PrimaryReplicaRouter. Point
+# more aliases at real replicas (e.g. LiteFS copies) and list them there.
+# Connections are kept open for CONN_MAX_AGE seconds; under ASGI, where
+# each request runs on its own thread, set it to 0.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"{(BASE_DIR / 'db.sqlite3').as_uri()}?mode=ro",
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_ROUTERS = ['recipes.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = ['replica']
+# Apps whose models those views read from a replica. Writing to one of them
+# pins the session to the primary; sessions and users always use the primary.
+REPLICA_APPS = ['recipes', 'ingredients', 'categories', 'profiles']
+# Seconds a session that wrote to REPLICA_APPS keeps reading from the primary
+REPLICA_PIN_SECONDS = 5
+
+# Applied to every new SQLite connection (recipes.routers.configure_sqlite):
+# busy_timeout (ms) makes a writer wait for the lock instead of failing, reads
+# go through a memory map of up to mmap_size bytes, and synchronous is relaxed
+# once the file uses WAL. WAL, which lets the replica read while the primary
+# writes, is a property of the file: switch a deployment's database once with
+# `python manage.py enable_wal`.
+SQLITE_PRAGMAS = {
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Chart images, data-version tokens and the change logs of the in-process
+# indexes live here. Use a shared backend (Redis, Memcached, database) when
+# running more than one worker process so that invalidations reach every
+# worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recipe-app',
     }
 }
 
+# Seconds a rendered chart stays cached (it is also invalidated on data change)
+CHART_CACHE_TIMEOUT = 60 * 60 * 24
+# Seconds an anonymous recipe/category/ingredient page stays cached (pages are
+# also invalidated whenever those models change)
+PAGE_CACHE_TIMEOUT = 60 * 10
+# recipe_search results each process keeps (least recently used are evicted),
+# and seconds an entry lives (entries are also dropped when the data changes)
+SEARCH_CACHE_SIZE = 128
+SEARCH_CACHE_TIMEOUT = 60 * 5
+# Seconds a change to the typeahead, pantry and fuzzy-search indexes stays in
+# their change log; a process that has not caught up by then rebuilds
+INDEX_LOG_TIMEOUT = 60 * 60 * 24
+# Seconds other requests wait for an in-flight render of the same chart
+CHART_RENDER_LOCK_TIMEOUT = 30
+# Chart rendering process pool: worker processes (0 renders on the request
+# thread), maximum queued/running jobs, and per-job timeout in seconds.
+CHART_RENDER_WORKERS = 2
+CHART_RENDER_QUEUE_SIZE = 8
+CHART_RENDER_TIMEOUT = 20
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -124,6 +196,42 @@ STATIC_URL = '/static/'
 # Use BigAutoField for implicit primary keys
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Keyset (cursor) pagination for the list views.
+# Set KEYSET_COUNT_TOTAL to False to skip the COUNT(*) on every page load.
+KEYSET_PAGE_SIZE = 24
+KEYSET_COUNT_TOTAL = True
+
+# JSON API (/api/): largest page a client may ask for with ?limit=, and most
+# ids accepted by /api/recipes/batch/
+API_MAX_PAGE_SIZE = 100
+API_MAX_BATCH_SIZE = 100
+
+# Maximum number of rows rendered in the recipe_search results table
+SEARCH_RESULTS_LIMIT = 500
+
+# "What can I cook": most ingredients in one pantry, and most ranked recipes
+# shown on the pantry page
+PANTRY_MAX_INGREDIENTS = 50
+PANTRY_RESULTS_LIMIT = 50
+
+# Trigram similarity (0-1) a word needs before a search that found nothing is
+# retried with it in place of a misspelt word
+FUZZY_SEARCH_THRESHOLD = 0.4
+
+# Rows fetched per database round trip by the streaming CSV/JSONL exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Inclusive upper bounds (minutes) of the recipe time buckets used by the charts
+RECIPE_TIME_BUCKETS = (15, 45)
+# Maximum number of points plotted in the collection growth chart
+RECIPE_GROWTH_MAX_POINTS = 120
+
+# Per-request SQL instrumentation (recipes.middleware.QueryCountMiddleware):
+# log a warning above this many queries, and expose counts in a Server-Timing
+# header while developing.
+QUERY_COUNT_WARNING_THRESHOLD = 50
+QUERY_COUNT_HEADER = DEBUG
+
 # Authentication settings
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
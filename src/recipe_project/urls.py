@@ -24,6 +24,8 @@ urlpatterns = [
     path('categories/', include('categories.urls')),
     path('ingredients/', include('ingredients.urls')),
     path('admin/', admin.site.urls),
+    # Read-only JSON API
+    path('api/', include('recipes.api_urls')),
     # Authentication URLs
     path('login/', auth_views.LoginView.as_view(template_name='auth/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
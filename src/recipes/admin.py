@@ -1,20 +1,49 @@
 from django.contrib import admin
+from django.forms.models import BaseInlineFormSet
 from .models import Recipe, RecipeIngredient
 
 
+class RecipeIngredientFormSet(BaseInlineFormSet):
+	"""Load the ingredient choices once per formset instead of once per row."""
+
+	def _share_choices(self, form):
+		field = form.fields["ingredient"]
+		if not hasattr(self, "_ingredient_choices"):
+			# A comprehension, not list(): list() would len() the iterator and COUNT(*)
+			self._ingredient_choices = [choice for choice in field.choices]
+		field.choices = self._ingredient_choices
+		# The admin wraps the select in a RelatedFieldWidgetWrapper
+		getattr(field.widget, "widget", field.widget).choices = self._ingredient_choices
+		return form
+
+	def _construct_form(self, i, **kwargs):
+		return self._share_choices(super()._construct_form(i, **kwargs))
+
+	@property
+	def empty_form(self):
+		return self._share_choices(super().empty_form)
+
+
 class RecipeIngredientInline(admin.TabularInline):
 	model = RecipeIngredient
+	formset = RecipeIngredientFormSet
 	extra = 1
 
+	def get_queryset(self, request):
+		# Each row's label is RecipeIngredient.__str__, which reads ingredient.name
+		return super().get_queryset(request).select_related("ingredient")
+
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
 	list_display = ("title", "category", "author", "created_at")
 	search_fields = ("title", "description")
 	list_filter = ("category",)
+	list_select_related = ("category", "author")
 	inlines = [RecipeIngredientInline]
 
 
 @admin.register(RecipeIngredient)
 class RecipeIngredientAdmin(admin.ModelAdmin):
 	list_display = ("recipe", "ingredient", "quantity", "unit")
+	list_select_related = ("recipe", "ingredient")
@@ -0,0 +1,413 @@
+"""
+Read-only JSON API.
+
+Every resource describes its fields with ApiField, which says which columns,
+joins, prefetches or annotations the field needs. A ``fields=`` parameter
+picks a subset, and only what that subset needs is loaded: the queryset gets
+``.only()`` for the columns, ``select_related()`` for to-one relations and a
+``Prefetch`` for to-many ones.
+
+Lists use the keyset paginator (``after``/``before`` cursors, ``limit``) and
+never count. Responses carry an ETag; recipe ETags are built from
+``updated_at`` plus a version token that changes with related rows, so an
+unchanged page or recipe is answered with 304 without being serialized.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+
+from .forms import RecipeSearchForm
+from .models import Recipe, RecipeIngredient
+from .pagination import paginate
+from .pantry import get_index as get_pantry_index, load_matches, max_pantry_size
+from .results import apply_search_filters
+from .typeahead import get_index as get_typeahead_index
+from .versioning import get_version, register_bulk_scope
+
+
+# Bumped when categories, ingredients or recipe ingredients change, none of
+# which touch Recipe.updated_at but all of which show up in recipe payloads.
+RELATIONS_SCOPE = register_bulk_scope('recipe-relations')
+
+DEFAULT_API_MAX_PAGE_SIZE = 100
+DEFAULT_API_MAX_BATCH_SIZE = 100
+DEFAULT_PANTRY_PAGE_SIZE = 20
+DEFAULT_TYPEAHEAD_LIMIT = 8
+DEFAULT_TYPEAHEAD_MIN_LENGTH = 2
+TYPEAHEAD_KINDS = ('ingredients', 'recipes')
+
+
+class ApiError(Exception):
+	"""A client error, returned as ``{"error": message}`` with ``status``."""
+
+	def __init__(self, message, status=400):
+		super().__init__(message)
+		self.message = message
+		self.status = status
+
+
+def api_view(view):
+	"""GET/HEAD only, with ApiError turned into a JSON error response."""
+	@require_safe
+	@wraps(view)
+	def wrapper(request, *args, **kwargs):
+		try:
+			return view(request, *args, **kwargs)
+		except ApiError as error:
+			return JsonResponse({'error': error.message}, status=error.status)
+	return wrapper
+
+
+class ApiField:
+	"""How to load and serialize one API field."""
+
+	def __init__(self, columns=None, related=(), prefetch=None, annotate=None, value=None):
+		self.columns = columns
+		self.related = related
+		self.prefetch = prefetch
+		self.annotate = annotate or {}
+		self.value = value
+
+	def get(self, name, obj, request):
+		if self.value is not None:
+			return self.value(obj, request)
+		return getattr(obj, name)
+
+
+class Resource:
+	"""A set of ApiFields plus the default field lists for lists and details."""
+
+	def __init__(self, fields, list_fields, always=('id',)):
+		self.fields = fields
+		self.list_fields = tuple(list_fields)
+		self.detail_fields = tuple(fields)
+		self.always = always
+
+	def parse_fields(self, request, default):
+		"""The requested field names, in order, or ApiError for unknown ones."""
+		raw = request.GET.get('fields')
+		if not raw:
+			return default
+		names = tuple(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+		unknown = [name for name in names if name not in self.fields]
+		if unknown:
+			raise ApiError(
+				f"Unknown field(s): {', '.join(unknown)}. "
+				f"Available: {', '.join(self.fields)}."
+			)
+		return names or default
+
+	def queryset(self, queryset, names):
+		"""Restrict ``queryset`` to what serializing ``names`` needs."""
+		columns = set(self.always)
+		related, prefetches, annotations = set(), [], {}
+		for name in names:
+			field = self.fields[name]
+			columns.update(field.columns if field.columns is not None else (name,))
+			related.update(field.related)
+			annotations.update(field.annotate)
+			if field.prefetch is not None:
+				prefetches.append(field.prefetch())
+		if annotations:
+			queryset = queryset.annotate(**annotations)
+			columns.difference_update(annotations)
+		if related:
+			queryset = queryset.select_related(*related)
+		if prefetches:
+			queryset = queryset.prefetch_related(*prefetches)
+		return queryset.only(*columns)
+
+	def serialize(self, obj, names, request):
+		return {name: self.fields[name].get(name, obj, request) for name in names}
+
+
+def _digest(*parts):
+	return hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def conditional(request, etag, build):
+	"""Return 304 if the client already has ``etag``, else the response from build()."""
+	etag = quote_etag(etag)
+	response = get_conditional_response(request, etag=etag)
+	if response is None:
+		response = build()
+		response['ETag'] = etag
+	patch_cache_control(response, no_cache=True)
+	return response
+
+
+def with_content_etag(request, response):
+	"""ETag hashed from the body, for rows that have no updated_at to go by."""
+	set_response_etag(response)
+	patch_cache_control(response, no_cache=True)
+	return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+def page_size(request):
+	maximum = getattr(settings, 'API_MAX_PAGE_SIZE', DEFAULT_API_MAX_PAGE_SIZE)
+	raw = request.GET.get('limit')
+	if not raw:
+		return None
+	try:
+		size = int(raw)
+	except ValueError:
+		raise ApiError('limit must be an integer.')
+	if not 1 <= size <= maximum:
+		raise ApiError(f'limit must be between 1 and {maximum}.')
+	return size
+
+
+def int_list(request, name):
+	"""``name=1,2,3`` as a list of distinct ints, in order."""
+	try:
+		return list(dict.fromkeys(int(value) for value in request.GET.get(name, '').split(',') if value.strip()))
+	except ValueError:
+		raise ApiError(f'{name} must be a comma-separated list of integers.')
+
+
+def page_links(request, page):
+	"""Absolute next/previous URLs for a KeysetPage."""
+	def link(query):
+		return request.build_absolute_uri(f'{request.path}?{query}') if query else None
+	return {'next': link(page.next_query), 'previous': link(page.previous_query)}
+
+
+def paginated_list(request, resource, queryset, ordering, etag_parts=None):
+	"""
+	A page of ``queryset`` serialized with the requested fields.
+
+	With ``etag_parts`` (a function of the page rows) the ETag is computed
+	from the rows before serializing; otherwise it is a hash of the body.
+	"""
+	names = resource.parse_fields(request, resource.list_fields)
+	page = paginate(
+		request, resource.queryset(queryset, names), ordering,
+		per_page=page_size(request), count=False,
+	)
+
+	def build():
+		return JsonResponse({
+			'results': [resource.serialize(obj, names, request) for obj in page.object_list],
+			**page_links(request, page),
+		})
+
+	if etag_parts is None:
+		return with_content_etag(request, build())
+	return conditional(request, _digest(names, page.next_cursor, *etag_parts(page.object_list)), build)
+
+
+# Recipes -------------------------------------------------------------------
+
+def _category(recipe, request):
+	category = recipe.category
+	if category is None:
+		return None
+	return {'id': category.pk, 'name': category.name, 'slug': category.slug}
+
+
+def _author(recipe, request):
+	return recipe.author.get_username() if recipe.author_id else None
+
+
+def _ingredients(recipe, request):
+	return [
+		{
+			'id': line.ingredient_id,
+			'name': line.ingredient.name,
+			'quantity': line.quantity,
+			'unit': line.unit,
+			'notes': line.notes,
+		}
+		for line in recipe.recipe_ingredients.all()
+	]
+
+
+def _ingredient_lines():
+	return Prefetch(
+		'recipe_ingredients',
+		queryset=RecipeIngredient.objects.select_related('ingredient').only(
+			'recipe', 'ingredient', 'quantity', 'unit', 'notes', 'ingredient__name',
+		).order_by('pk'),
+	)
+
+
+RECIPE_RESOURCE = Resource(
+	fields={
+		'id': ApiField(),
+		'url': ApiField(columns=(), value=lambda recipe, request: request.build_absolute_uri(
+			reverse('api:recipe_detail', args=[recipe.pk])
+		)),
+		'title': ApiField(),
+		'description': ApiField(),
+		'instructions': ApiField(),
+		'category': ApiField(
+			columns=('category', 'category__name', 'category__slug'), related=('category',), value=_category,
+		),
+		'author': ApiField(columns=('author', 'author__username'), related=('author',), value=_author),
+		'prep_time_minutes': ApiField(),
+		'cook_time_minutes': ApiField(),
+		'total_time_minutes': ApiField(),
+		'ingredients': ApiField(columns=(), prefetch=_ingredient_lines, value=_ingredients),
+		'created_at': ApiField(),
+		'updated_at': ApiField(),
+	},
+	list_fields=(
+		'id', 'url', 'title', 'description', 'category', 'author', 'prep_time_minutes',
+		'cook_time_minutes', 'total_time_minutes', 'created_at', 'updated_at',
+	),
+	# The keyset ordering columns and the ETag source are always loaded
+	always=('id', 'created_at', 'updated_at'),
+)
+
+
+def _recipe_etag_parts(recipes):
+	return [get_version(RELATIONS_SCOPE)] + [f'{recipe.pk}:{recipe.updated_at.isoformat()}' for recipe in recipes]
+
+
+@api_view
+def recipe_list(request):
+	"""Recipes, newest first (best match first with ``recipe_name``), filtered like recipe_search."""
+	form = RecipeSearchForm(request.GET)
+	if not form.is_valid():
+		raise ApiError(form.errors.get_json_data())
+	recipes, ranked = apply_search_filters(Recipe.objects.all(), form.cleaned_data)
+	ordering = ('search_rank', '-created_at', '-id') if ranked else ('-created_at', '-id')
+	return paginated_list(request, RECIPE_RESOURCE, recipes, ordering, etag_parts=_recipe_etag_parts)
+
+
+@api_view
+def recipe_detail(request, pk):
+	names = RECIPE_RESOURCE.parse_fields(request, RECIPE_RESOURCE.detail_fields)
+	recipe = RECIPE_RESOURCE.queryset(Recipe.objects.all(), names).filter(pk=pk).first()
+	if recipe is None:
+		raise ApiError('Not found.', status=404)
+	return conditional(
+		request,
+		_digest(names, *_recipe_etag_parts([recipe])),
+		lambda: JsonResponse(RECIPE_RESOURCE.serialize(recipe, names, request)),
+	)
+
+
+@api_view
+def recipe_batch(request):
+	"""Several recipes by id (``ids=1,2,3``) in one request, in the order asked for."""
+	maximum = getattr(settings, 'API_MAX_BATCH_SIZE', DEFAULT_API_MAX_BATCH_SIZE)
+	ids = int_list(request, 'ids')
+	if not ids:
+		raise ApiError('ids is required.')
+	if len(ids) > maximum:
+		raise ApiError(f'At most {maximum} ids can be requested at once.')
+
+	names = RECIPE_RESOURCE.parse_fields(request, RECIPE_RESOURCE.detail_fields)
+	found = RECIPE_RESOURCE.queryset(Recipe.objects.all(), names).in_bulk(ids)
+	recipes = [found[pk] for pk in ids if pk in found]
+	return conditional(
+		request,
+		_digest(names, *_recipe_etag_parts(recipes)),
+		lambda: JsonResponse({
+			'results': [RECIPE_RESOURCE.serialize(recipe, names, request) for recipe in recipes],
+			'missing': [pk for pk in ids if pk not in found],
+		}),
+	)
+
+
+# Typeahead -----------------------------------------------------------------
+
+@api_view
+def typeahead(request):
+	"""
+	Ingredient names and recipe titles with a word starting with ``q``.
+
+	``types=ingredients`` or ``types=recipes`` limits the lookup to one kind;
+	each kind returns up to ``limit`` matches, most recipes first.
+	"""
+	query = request.GET.get('q', '').strip()
+	kinds = [kind.strip() for kind in request.GET.get('types', ','.join(TYPEAHEAD_KINDS)).split(',') if kind.strip()]
+	unknown = [kind for kind in kinds if kind not in TYPEAHEAD_KINDS]
+	if unknown:
+		raise ApiError(f"Unknown type(s): {', '.join(unknown)}. Available: {', '.join(TYPEAHEAD_KINDS)}.")
+	limit = page_size(request) or getattr(settings, 'TYPEAHEAD_LIMIT', DEFAULT_TYPEAHEAD_LIMIT)
+
+	results = {kind: [] for kind in kinds}
+	if len(query) >= getattr(settings, 'TYPEAHEAD_MIN_LENGTH', DEFAULT_TYPEAHEAD_MIN_LENGTH):
+		matches = get_typeahead_index().search(
+			query, limit, ingredients='ingredients' in kinds, titles='recipes' in kinds,
+		)
+		if 'ingredients' in kinds:
+			results['ingredients'] = [
+				{'id': pk, 'name': name, 'recipe_count': count} for pk, name, count in matches['ingredients']
+			]
+		if 'recipes' in kinds:
+			results['recipes'] = [
+				{'title': title, 'recipe_count': count} for _key, title, count in matches['recipes']
+			]
+	return with_content_etag(request, JsonResponse({'query': query, **results}))
+
+
+# Pantry --------------------------------------------------------------------
+
+def _non_negative(request, name):
+	raw = request.GET.get(name)
+	if not raw:
+		return None
+	try:
+		value = int(raw)
+	except ValueError:
+		raise ApiError(f'{name} must be an integer.')
+	if value < 0:
+		raise ApiError(f'{name} cannot be negative.')
+	return value
+
+
+@api_view
+def pantry(request):
+	"""
+	Recipes ranked by coverage of ``ingredients=1,2,3`` (ingredient ids).
+
+	``max_missing`` drops recipes needing more than that many other
+	ingredients; pages are picked with ``offset`` and ``limit``.
+	"""
+	ingredient_ids = int_list(request, 'ingredients')
+	if not ingredient_ids:
+		raise ApiError('ingredients is required.')
+	if len(ingredient_ids) > max_pantry_size():
+		raise ApiError(f'At most {max_pantry_size()} ingredients can be given.')
+	limit = page_size(request) or DEFAULT_PANTRY_PAGE_SIZE
+	offset = _non_negative(request, 'offset') or 0
+
+	count, matches = get_pantry_index().match(
+		ingredient_ids, max_missing=_non_negative(request, 'max_missing'), offset=offset, limit=limit,
+	)
+	matches = load_matches(matches, ingredient_ids)
+
+	def link(start):
+		query = request.GET.copy()
+		query['offset'] = start
+		return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+	return with_content_etag(request, JsonResponse({
+		'count': count,
+		'results': [
+			{
+				'recipe': {
+					'id': match.recipe.pk,
+					'title': match.recipe.title,
+					'url': request.build_absolute_uri(reverse('api:recipe_detail', args=[match.recipe.pk])),
+				},
+				'have': match.have,
+				'total': match.total,
+				'coverage': round(match.coverage, 4),
+				'missing': [{'id': ingredient.pk, 'name': ingredient.name} for ingredient in match.missing_ingredients],
+			}
+			for match in matches
+		],
+		'next': link(offset + limit) if offset + limit < count else None,
+		'previous': link(max(offset - limit, 0)) if offset else None,
+	}))
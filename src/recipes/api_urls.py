@@ -0,0 +1,19 @@
+from django.urls import path
+
+from categories import views as category_views
+from ingredients import views as ingredient_views
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('recipes/', api.recipe_list, name='recipe_list'),
+    path('recipes/batch/', api.recipe_batch, name='recipe_batch'),
+    path('recipes/<int:pk>/', api.recipe_detail, name='recipe_detail'),
+    path('categories/', category_views.category_list_api, name='category_list'),
+    path('categories/<int:pk>/', category_views.category_detail_api, name='category_detail'),
+    path('ingredients/', ingredient_views.ingredient_list_api, name='ingredient_list'),
+    path('ingredients/<int:pk>/', ingredient_views.ingredient_detail_api, name='ingredient_detail'),
+    path('pantry/', api.pantry, name='pantry'),
+    path('typeahead/', api.typeahead, name='typeahead'),
+]
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     name = 'recipes'
+
+    def ready(self):
+        from . import middleware, routers, signals
+
+        post_migrate.connect(signals.ensure_search_index, sender=self)
+        connection_created.connect(middleware.install_query_counter)
+        connection_created.connect(routers.configure_sqlite)
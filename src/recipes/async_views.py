@@ -0,0 +1,54 @@
+"""
+Helpers for ``async def`` views.
+
+The ORM is synchronous, so async views hand their database work to threads.
+gather_blocking() runs independent stages (a page of rows, its COUNT, the
+chart data...) at the same time, each on a worker thread with its own
+connection, and the event loop serves other requests meanwhile.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections, connections
+
+
+def _in_transaction():
+	return any(connection.in_atomic_block for connection in connections.all(initialized_only=True))
+
+
+def _on_worker(call):
+	@wraps(call)
+	def run():
+		try:
+			return call()
+		finally:
+			# What request_finished does for the request thread: close the
+			# worker's connections unless CONN_MAX_AGE keeps them.
+			close_old_connections()
+	return run
+
+
+async def gather_blocking(*calls):
+	"""
+	Run the blocking callables ``calls`` at the same time; return their results in order.
+
+	Inside a transaction (ATOMIC_REQUESTS, or a TestCase) another connection
+	would not see its uncommitted rows, so the calls then run one after
+	another on the request's own thread instead.
+	"""
+	if len(calls) < 2 or await sync_to_async(_in_transaction)():
+		return [await sync_to_async(call)() for call in calls]
+	return await asyncio.gather(*(sync_to_async(_on_worker(call), thread_sensitive=False)() for call in calls))
+
+
+def async_login_required(view):
+	"""login_required for async views; Django 4.2's decorator only wraps sync ones."""
+	@wraps(view)
+	async def wrapper(request, *args, **kwargs):
+		# request.user loads the session and the user from the database
+		if await sync_to_async(lambda: request.user.is_authenticated)():
+			return await view(request, *args, **kwargs)
+		return redirect_to_login(request.get_full_path())
+	return wrapper
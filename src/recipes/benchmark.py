@@ -0,0 +1,282 @@
+"""
+Timing harness for the views and chart helpers.
+
+run_benchmark() times every case against whatever catalog is in the database;
+the benchmark_views command builds synthetic catalogs of several sizes in a
+throwaway test database and collects the results as JSON. run_load_benchmark()
+drives the same pages through Django's WSGI and ASGI handlers under concurrent
+load for the benchmark_concurrency command.
+"""
+import asyncio
+import io
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from categories.models import Category
+from ingredients.models import Ingredient
+
+from . import charts
+from .middleware import counting_queries
+from .models import Recipe
+
+
+BENCHMARK_USER = 'benchmark'
+
+
+def _percentile(samples, fraction):
+	ordered = sorted(samples)
+	return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(samples):
+	"""Milliseconds summary of a list of durations in seconds."""
+	ms = [sample * 1000 for sample in samples]
+	return {
+		'runs': len(ms),
+		'min_ms': round(min(ms), 3),
+		'median_ms': round(statistics.median(ms), 3),
+		'mean_ms': round(statistics.fmean(ms), 3),
+		'p95_ms': round(_percentile(ms, 0.95), 3),
+		'p99_ms': round(_percentile(ms, 0.99), 3),
+		'max_ms': round(max(ms), 3),
+	}
+
+
+def time_call(func, repeat):
+	"""Call ``func`` ``repeat`` times on a cold cache; return (durations, queries of the last run)."""
+	samples = []
+	counter = None
+	for _ in range(repeat):
+		cache.clear()
+		with counting_queries() as counter:
+			start = time.perf_counter()
+			func()
+			samples.append(time.perf_counter() - start)
+	return samples, counter.count if counter else 0
+
+
+def view_cases():
+	"""(name, url, params, needs_login) for every page worth timing."""
+	recipe = Recipe.objects.annotate(n=Count('recipe_ingredients')).filter(n__gt=0).order_by('pk').first()
+	category = Category.objects.order_by('pk').first()
+	ingredient = Ingredient.objects.order_by('pk').first()
+	cases = [
+		('home', reverse('recipes:home'), {}, False),
+		('recipe_list', reverse('recipes:recipe_list'), {}, False),
+		('recipe_list:q', reverse('recipes:recipe_list'), {'q': 'chicken curry'}, False),
+		('recipe_list:typo', reverse('recipes:recipe_list'), {'q': 'chiken cury'}, False),
+		('recipe_list:time', reverse('recipes:recipe_list'), {'min_time': 20, 'max_time': 45}, False),
+		('category_list', reverse('categories:category_list'), {}, False),
+		('ingredient_list', reverse('ingredients:ingredient_list'), {}, False),
+		('recipe_search:all', reverse('recipes:recipe_search'), {'show_all': 1}, True),
+		('recipe_search:name', reverse('recipes:recipe_search'), {'recipe_name': 'chicken'}, True),
+		('recipe_search:time', reverse('recipes:recipe_search'), {'max_time': 30}, True),
+	]
+	if category:
+		cases.append(('recipe_list:category', reverse('recipes:recipe_list'), {'category': category.slug}, False))
+	if ingredient:
+		cases.append(('recipe_list:ingredient', reverse('recipes:recipe_list'), {'ingredient': ingredient.pk}, False))
+	if recipe:
+		cases.append(('recipe_detail', reverse('recipes:recipe_detail', args=[recipe.pk]), {}, False))
+	return cases
+
+
+def run_benchmark(repeat=5):
+	"""
+	Time every view and chart helper against the current catalog.
+
+	Charts render on the request thread (no process pool) and the cache is
+	cleared before each run, so the numbers are the uncached cost.
+	"""
+	User = get_user_model()
+	user, _ = User.objects.get_or_create(username=BENCHMARK_USER)
+	results = []
+
+	with override_settings(CHART_RENDER_WORKERS=0, QUERY_COUNT_HEADER=False, DEBUG=False):
+		anonymous = Client()
+		logged_in = Client()
+		logged_in.force_login(user)
+		for name, url, params, needs_login in view_cases():
+			client = logged_in if needs_login else anonymous
+			status = []
+
+			def request():
+				status.append(client.get(url, params).status_code)
+
+			samples, queries = time_call(request, repeat)
+			results.append({
+				'kind': 'view', 'name': name, 'queries': queries,
+				'status': status[-1], **summarize(samples),
+			})
+
+		recipes = Recipe.objects.all()
+		for name in charts.CHARTS:
+			data = None
+
+			def build():
+				nonlocal data
+				data = charts.chart_data(name, recipes)
+
+			samples, queries = time_call(build, repeat)
+			results.append({'kind': 'chart_data', 'name': name, 'queries': queries, **summarize(samples)})
+			if data is not None:
+				samples, _ = time_call(lambda: charts.render_chart(name, data, 'png'), repeat)
+				results.append({'kind': 'chart_render', 'name': name, 'queries': 0, **summarize(samples)})
+	return results
+
+
+# Pages driven by run_load_benchmark(): the async views
+LOAD_CASES = (
+	'recipe_list', 'recipe_list:q', 'category_list', 'ingredient_list',
+	'recipe_search:all', 'recipe_search:name',
+)
+
+
+def _wsgi_environ(path, query, cookie):
+	return {
+		'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': query,
+		'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+		'HTTP_HOST': 'testserver', 'HTTP_COOKIE': cookie, 'REMOTE_ADDR': '127.0.0.1',
+		'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+		'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+		'wsgi.run_once': False,
+	}
+
+
+def _asgi_scope(path, query, cookie):
+	return {
+		'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+		'scheme': 'http', 'root_path': '', 'path': path, 'raw_path': path.encode(),
+		'query_string': query.encode(), 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+		'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+	}
+
+
+def _wsgi_request(handler, path, query, cookie):
+	status = []
+	body = handler(_wsgi_environ(path, query, cookie), lambda line, headers, exc_info=None: status.append(line))
+	try:
+		b''.join(body)
+	finally:
+		body.close()
+	return int(status[0].split()[0])
+
+
+async def _asgi_request(handler, path, query, cookie):
+	sent = []
+	body_sent = False
+
+	async def receive():
+		nonlocal body_sent
+		if not body_sent:
+			body_sent = True
+			return {'type': 'http.request', 'body': b'', 'more_body': False}
+		# Like a client that stays connected until the response is complete
+		await asyncio.Event().wait()
+
+	async def send(message):
+		sent.append(message)
+
+	await handler(_asgi_scope(path, query, cookie), receive, send)
+	return sent[0]['status']
+
+
+def load_wsgi(handler, path, query, cookie, concurrency, requests):
+	"""
+	Closed-loop load like a threaded WSGI server: ``concurrency`` threads send
+	``requests`` in total, each as soon as its previous one returned.
+
+	Returns ``(latencies, statuses, seconds)``.
+	"""
+	def client(count):
+		results = []
+		for _ in range(count):
+			start = time.perf_counter()
+			status = _wsgi_request(handler, path, query, cookie)
+			results.append((time.perf_counter() - start, status))
+		return results
+
+	shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+	start = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=concurrency) as pool:
+		results = [result for share in pool.map(client, shares) for result in share]
+	return [latency for latency, _ in results], [status for _, status in results], time.perf_counter() - start
+
+
+def load_asgi(handler, path, query, cookie, concurrency, requests):
+	"""load_wsgi() for an ASGI server: ``concurrency`` tasks on one event loop."""
+	async def client(count):
+		results = []
+		for _ in range(count):
+			start = time.perf_counter()
+			status = await _asgi_request(handler, path, query, cookie)
+			results.append((time.perf_counter() - start, status))
+		return results
+
+	async def run():
+		shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+		return await asyncio.gather(*(client(share) for share in shares))
+
+	start = time.perf_counter()
+	results = [result for share in asyncio.run(run()) for result in share]
+	return [latency for latency, _ in results], [status for _, status in results], time.perf_counter() - start
+
+
+def run_load_benchmark(concurrency=(1, 8, 32), requests=200):
+	"""
+	Latency under concurrent load of the async pages, through WSGI and ASGI.
+
+	Requests are sent as a signed-in user, so the anonymous page cache does
+	not answer them; each case is requested once first so charts are cached.
+	"""
+	User = get_user_model()
+	user, _ = User.objects.get_or_create(username=BENCHMARK_USER)
+	client = Client()
+	client.force_login(user)
+	cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+	servers = (('wsgi', WSGIHandler(), load_wsgi), ('asgi', ASGIHandler(), load_asgi))
+	results = []
+
+	with override_settings(QUERY_COUNT_HEADER=False, DEBUG=False):
+		for name, url, params, _needs_login in view_cases():
+			if name not in LOAD_CASES:
+				continue
+			query = urlencode(params)
+			client.get(url, params)
+			for level in concurrency:
+				for server, handler, load in servers:
+					latencies, statuses, seconds = load(handler, url, query, cookie, level, requests)
+					results.append({
+						'kind': 'load', 'server': server, 'name': name, 'concurrency': level,
+						'errors': sum(1 for status in statuses if status != 200),
+						'throughput_rps': round(len(latencies) / seconds, 1),
+						**summarize(latencies),
+					})
+	return results
+
+
+def environment():
+	"""Metadata recorded alongside the results so runs can be compared."""
+	connection = connections['default']
+	return {
+		'python': platform.python_version(),
+		'django': django.get_version(),
+		'database': connection.vendor,
+		'machine': platform.machine(),
+		'platform': platform.platform(),
+	}
@@ -0,0 +1,214 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import charts
+from .chart_pool import get_pool
+from .versioning import get_version, register_bulk_scope
+
+
+logger = logging.getLogger(__name__)
+
+CHART_SCOPE = register_bulk_scope('charts')
+CHART_KEY = 'recipes:chart:{name}:{version}'
+LOCK_KEY = 'recipes:chart-lock:{name}:{version}'
+# The last image rendered for a chart, whatever the version, as (version, image)
+LAST_CHART_KEY = 'recipes:chart-last:{name}'
+
+# schedule_chart() states
+READY = 'ready'
+PENDING = 'pending'
+REJECTED = 'rejected'
+
+
+class ChartUnavailable(Exception):
+	"""
+	The chart is still rendering, or the render queue is full.
+
+	``stale`` is the last good ``(version, image)`` of the chart, if any, to
+	serve until the current version is ready.
+	"""
+
+	def __init__(self, name, stale=None):
+		super().__init__(name)
+		self.stale = stale
+
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def _setting(name, default):
+	return getattr(settings, name, default)
+
+
+def _local_lock(key):
+	with _local_locks_guard:
+		return _local_locks.setdefault(key, threading.Lock())
+
+
+def _release_local_lock(key):
+	with _local_locks_guard:
+		_local_locks.pop(key, None)
+
+
+def get_chart(name, render):
+	"""
+	Return the cached output of ``render()`` for the current chart data version.
+
+	Each chart renders at most once per data change. Concurrent misses are
+	coalesced: threads in this process wait on a per-key lock, and other
+	processes sharing the cache wait for the holder of a cache lock to publish
+	the result instead of rendering it again.
+	"""
+	version = get_version(CHART_SCOPE)
+	key = CHART_KEY.format(name=name, version=version)
+
+	# Results are wrapped in a 1-tuple so that "no chart" (None) is cacheable.
+	cached = cache.get(key)
+	if cached is not None:
+		return cached[0]
+
+	local_lock = _local_lock(key)
+	with local_lock:
+		cached = cache.get(key)
+		if cached is not None:
+			return cached[0]
+
+		lock_key = LOCK_KEY.format(name=name, version=version)
+		lock_timeout = _setting('CHART_RENDER_LOCK_TIMEOUT', 30)
+		if not cache.add(lock_key, 1, lock_timeout):
+			cached = _wait_for(key, lock_key, lock_timeout)
+			if cached is not None:
+				return cached[0]
+			cache.add(lock_key, 1, lock_timeout)
+
+		try:
+			value = render()
+			_publish(name, version, value)
+		finally:
+			cache.delete(lock_key)
+			_release_local_lock(key)
+	return value
+
+
+def _wait_for(key, lock_key, lock_timeout):
+	"""Poll for another process to publish ``key``; give up if its lock disappears."""
+	deadline = time.monotonic() + lock_timeout
+	while time.monotonic() < deadline:
+		cached = cache.get(key)
+		if cached is not None:
+			return cached
+		if cache.get(lock_key) is None:
+			return cache.get(key)
+		time.sleep(0.05)
+	return None
+
+
+def schedule_chart(name, recipes_qs, fmt='png'):
+	"""
+	Make sure chart ``name`` is cached or being rendered, without blocking.
+
+	Returns ``(image, state)``. ``image`` is the cached bytes (None when
+	there is nothing to plot) if ``state`` is READY. PENDING means a render is
+	in flight; REJECTED means the render queue was full and nothing will be
+	published for this version until the chart is scheduled again.
+
+	On a miss the data step runs here (a cheap aggregate query) and the
+	matplotlib step goes to the chart process pool. Without a pool
+	(CHART_RENDER_WORKERS = 0) the chart is rendered inline via get_chart().
+	"""
+	cache_name = f'{name}.{fmt}'
+	pool = get_pool()
+	if pool is None:
+		return get_chart(cache_name, lambda: _render_inline(name, recipes_qs, fmt)), READY
+
+	version = get_version(CHART_SCOPE)
+	key = CHART_KEY.format(name=cache_name, version=version)
+	cached = cache.get(key)
+	if cached is not None:
+		return cached[0], READY
+	if pool.is_pending(key):
+		return None, PENDING
+
+	lock_key = LOCK_KEY.format(name=cache_name, version=version)
+	if not cache.add(lock_key, 1, _setting('CHART_RENDER_LOCK_TIMEOUT', 30)):
+		# Another request or process is already rendering this version
+		return None, PENDING
+
+	data = charts.chart_data(name, recipes_qs)
+	if data is None:
+		_publish(cache_name, version, None)
+		cache.delete(lock_key)
+		return None, READY
+
+	future = pool.submit(key, charts.render_chart, name, data, fmt)
+	if future is None:
+		cache.delete(lock_key)
+		return None, REJECTED
+	future.add_done_callback(lambda f: _store_render(f, cache_name, version, lock_key))
+	return None, PENDING
+
+
+def last_chart(name):
+	"""The last good ``(version, image)`` published for ``name`` (e.g. 'bar.png'), or None."""
+	return cache.get(LAST_CHART_KEY.format(name=name))
+
+
+def get_chart_image(name, recipes_qs, fmt='png', timeout=None):
+	"""
+	Return chart bytes (None if there is nothing to plot), waiting for a render.
+
+	The calling thread only waits; the render itself runs in the pool, so
+	other threads keep serving. Raises ChartUnavailable at once when the
+	render queue is full or an earlier version of the chart can be served
+	meanwhile, and after ``timeout`` otherwise.
+	"""
+	if timeout is None:
+		timeout = _setting('CHART_RENDER_TIMEOUT', 20)
+	image, state = schedule_chart(name, recipes_qs, fmt)
+	if state == READY:
+		return image
+
+	stale = last_chart(f'{name}.{fmt}')
+	if state == REJECTED or stale is not None:
+		raise ChartUnavailable(name, stale)
+
+	key = CHART_KEY.format(name=f'{name}.{fmt}', version=get_version(CHART_SCOPE))
+	deadline = time.monotonic() + timeout
+	while time.monotonic() < deadline:
+		cached = cache.get(key)
+		if cached is not None:
+			return cached[0]
+		time.sleep(0.05)
+	raise ChartUnavailable(name)
+
+
+def _render_inline(name, recipes_qs, fmt):
+	data = charts.chart_data(name, recipes_qs)
+	return charts.render_chart(name, data, fmt) if data is not None else None
+
+
+def _publish(name, version, image):
+	"""Cache ``image`` as chart ``name`` at ``version``, and as its last good image."""
+	timeout = _setting('CHART_CACHE_TIMEOUT', 60 * 60 * 24)
+	cache.set(CHART_KEY.format(name=name, version=version), (image,), timeout)
+	if image is not None:
+		cache.set(LAST_CHART_KEY.format(name=name), (version, image), timeout)
+
+
+def _store_render(future, name, version, lock_key):
+	"""Publish a finished pool render (runs on the pool's callback thread)."""
+	try:
+		if future.cancelled():
+			return
+		error = future.exception()
+		if error is not None:
+			logger.warning('Rendering chart %s failed: %r', name, error)
+			return
+		_publish(name, version, future.result())
+	finally:
+		cache.delete(lock_key)
@@ -0,0 +1,138 @@
+"""
+A small pool of chart-rendering processes.
+
+matplotlib rendering is CPU-bound and holds the GIL, so doing it on the
+request thread blocks the whole worker. Jobs submitted here run in separate
+processes; callers get a Future back (or None when the queue is full) and
+never wait for the render themselves.
+
+The worker processes never call django.setup(). They import this module and
+recipes.charts (for render_chart), which pull in django.conf and
+django.db.models but no model classes; both import fine without an app
+registry. Anything on that path must not import a models module.
+"""
+import atexit
+import logging
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class ChartRenderTimeout(Exception):
+	"""A render job ran longer than CHART_RENDER_TIMEOUT."""
+
+
+def _on_alarm(signum, frame):
+	raise ChartRenderTimeout()
+
+
+def _run_with_timeout(func, args, timeout):
+	"""Worker-side wrapper that aborts ``func`` after ``timeout`` seconds."""
+	use_alarm = timeout and hasattr(signal, 'setitimer')
+	if use_alarm:
+		previous = signal.signal(signal.SIGALRM, _on_alarm)
+		signal.setitimer(signal.ITIMER_REAL, timeout)
+	try:
+		return func(*args)
+	finally:
+		if use_alarm:
+			signal.setitimer(signal.ITIMER_REAL, 0)
+			signal.signal(signal.SIGALRM, previous)
+
+
+class ChartRenderPool:
+	"""
+	Bounded process pool with per-job timeouts and job de-duplication.
+
+	At most ``max_queue`` jobs may be pending (queued or running) at once;
+	further submissions are rejected so a traffic spike cannot build an
+	unbounded backlog. Jobs are keyed, and a key that is already pending is
+	not submitted twice.
+	"""
+
+	def __init__(self, max_workers, max_queue, job_timeout):
+		self.max_workers = max_workers
+		self.max_queue = max_queue
+		self.job_timeout = job_timeout
+		self._executor = None
+		self._pending = {}
+		self._lock = threading.Lock()
+
+	def _get_executor(self):
+		if self._executor is None:
+			# spawn: never fork a (possibly multi-threaded) web worker
+			self._executor = ProcessPoolExecutor(
+				max_workers=self.max_workers,
+				mp_context=multiprocessing.get_context('spawn'),
+			)
+		return self._executor
+
+	def is_pending(self, key):
+		with self._lock:
+			return key in self._pending
+
+	def pending_count(self):
+		with self._lock:
+			return len(self._pending)
+
+	def submit(self, key, func, *args):
+		"""
+		Queue ``func(*args)`` under ``key``.
+
+		Returns the Future, the already pending Future for ``key``, or None if
+		the queue is full.
+		"""
+		with self._lock:
+			if key in self._pending:
+				return self._pending[key]
+			if len(self._pending) >= self.max_queue:
+				logger.warning('Chart render queue full; dropping job %s', key)
+				return None
+			future = self._get_executor().submit(_run_with_timeout, func, args, self.job_timeout)
+			self._pending[key] = future
+		future.add_done_callback(lambda f: self._finished(key, f))
+		return future
+
+	def _finished(self, key, future):
+		with self._lock:
+			if self._pending.get(key) is future:
+				del self._pending[key]
+			if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+				# A worker died; start a fresh executor on the next submit
+				logger.error('Chart render pool broke; restarting it')
+				self._executor = None
+
+	def shutdown(self, wait=True):
+		with self._lock:
+			executor, self._executor = self._executor, None
+			self._pending.clear()
+		if executor is not None:
+			executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+	"""The process-wide render pool, or None when CHART_RENDER_WORKERS is 0."""
+	global _pool
+	workers = getattr(settings, 'CHART_RENDER_WORKERS', 0)
+	if not workers:
+		return None
+	with _pool_lock:
+		if _pool is None:
+			_pool = ChartRenderPool(
+				max_workers=workers,
+				max_queue=getattr(settings, 'CHART_RENDER_QUEUE_SIZE', 8),
+				job_timeout=getattr(settings, 'CHART_RENDER_TIMEOUT', 20),
+			)
+			atexit.register(_pool.shutdown, wait=False)
+		return _pool
@@ -0,0 +1,218 @@
+"""
+Chart rendering for the recipe_search page.
+
+Every chart is drawn on its own matplotlib Figure with its own Agg canvas;
+pyplot and its global "current figure" are never used, so any number of
+threads can render at once without sharing drawing state.
+
+matplotlib is heavy to import, so it is only loaded the first time a chart is
+actually rendered. Importing this module is cheap and safe at startup.
+"""
+import base64
+import threading
+from io import BytesIO
+
+from django.db.models import Count
+
+from .stats import growth_series, time_bucket_counts
+
+
+_figure_classes = None
+_import_lock = threading.Lock()
+
+
+def _matplotlib():
+	"""Import the Figure and Agg canvas classes on first use."""
+	global _figure_classes
+	if _figure_classes is None:
+		with _import_lock:
+			if _figure_classes is None:
+				import matplotlib
+				from matplotlib.backends.backend_agg import FigureCanvasAgg
+				from matplotlib.figure import Figure
+				# Fixed SVG element ids, so identical data gives identical bytes
+				matplotlib.rcParams['svg.hashsalt'] = 'recipes'
+				_figure_classes = Figure, FigureCanvasAgg
+	return _figure_classes
+
+
+def new_figure(figsize):
+	"""A Figure with its own Agg canvas, owned by the caller alone."""
+	Figure, FigureCanvasAgg = _matplotlib()
+	fig = Figure(figsize=figsize)
+	FigureCanvasAgg(fig)
+	return fig
+
+
+def _rotate_x_labels(ax):
+	for label in ax.get_xticklabels():
+		label.set(rotation=45, horizontalalignment='right')
+
+
+# Output formats served by the chart endpoints -> content type
+CHART_FORMATS = {
+	'png': 'image/png',
+	'svg': 'image/svg+xml',
+}
+
+
+def figure_bytes(fig, fmt='png'):
+	"""Save a figure as PNG or SVG bytes."""
+	buffer = BytesIO()
+	# No timestamps in the output, so identical data gives identical bytes
+	metadata = {'Date': None} if fmt == 'svg' else None
+	fig.savefig(buffer, format=fmt, bbox_inches='tight', dpi=100, metadata=metadata)
+	image = buffer.getvalue()
+	buffer.close()
+	return image
+
+
+def bar_chart_data(recipes_qs):
+	"""Recipes per category, or None when there is nothing to plot."""
+	# Count recipes per category
+	category_counts = recipes_qs.values('category__name').annotate(
+		count=Count('id')
+	).order_by('-count')
+	
+	categories = [item['category__name'] or 'Uncategorized' for item in category_counts]
+	counts = [item['count'] for item in category_counts]
+	
+	if not categories:
+		return None
+	return {'categories': categories, 'counts': counts}
+
+
+def render_bar_chart(data, fmt='png'):
+	"""Render a bar chart showing recipes per category."""
+	categories, counts = data['categories'], data['counts']
+	
+	fig = new_figure((10, 6))
+	ax = fig.add_subplot()
+	bars = ax.bar(categories, counts, color='#4f8cff', edgecolor='#3a6fd8')
+	
+	# Add value labels on bars
+	for bar, count in zip(bars, counts):
+		ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
+				str(count), ha='center', va='bottom', fontweight='bold')
+	
+	ax.set_xlabel('Category', fontsize=12)
+	ax.set_ylabel('Number of Recipes', fontsize=12)
+	ax.set_title('Recipes per Category', fontsize=14, fontweight='bold')
+	_rotate_x_labels(ax)
+	fig.tight_layout()
+	
+	return figure_bytes(fig, fmt)
+
+
+def pie_chart_data(recipes_qs):
+	"""Recipe counts per time bucket, or None when there is nothing to plot."""
+	buckets = time_bucket_counts(recipes_qs)
+
+	names = ['Quick', 'Medium', 'Long'] if len(buckets) == 3 else [None] * len(buckets)
+	labels = [f'{name} ({b.label})' if name else b.label for name, b in zip(names, buckets)]
+	sizes = [b.count for b in buckets]
+	palette = ['#4ade80', '#facc15', '#f87171', '#60a5fa', '#c084fc', '#f472b6']
+	colors = [palette[i % len(palette)] for i in range(len(buckets))]
+	
+	# Filter out zero values
+	filtered_data = [(l, s, c) for l, s, c in zip(labels, sizes, colors) if s > 0]
+	if not filtered_data:
+		return None
+	
+	labels, sizes, colors = zip(*filtered_data)
+	return {'labels': list(labels), 'sizes': list(sizes), 'colors': list(colors)}
+
+
+def render_pie_chart(data, fmt='png'):
+	"""Render a pie chart showing recipe distribution by cooking time difficulty."""
+	sizes = data['sizes']
+	
+	fig = new_figure((8, 8))
+	ax = fig.add_subplot()
+	wedges, texts, autotexts = ax.pie(
+		sizes, labels=data['labels'], colors=data['colors'], autopct='%1.1f%%',
+		startangle=90, explode=[0.02] * len(sizes)
+	)
+	
+	for autotext in autotexts:
+		autotext.set_fontsize(11)
+		autotext.set_fontweight('bold')
+	
+	ax.set_title('Recipe Distribution by Time Complexity', fontsize=14, fontweight='bold')
+	fig.tight_layout()
+	
+	return figure_bytes(fig, fmt)
+
+
+def line_chart_data(recipes_qs):
+	"""Cumulative recipes over time, or None with fewer than two points."""
+	series = growth_series(recipes_qs)
+	
+	if len(series.dates) < 2:
+		return None
+	return {'dates': series.dates, 'totals': series.totals.tolist()}
+
+
+def render_line_chart(data, fmt='png'):
+	"""Render a line chart showing cumulative recipes over time."""
+	dates, cumulative_counts = data['dates'], data['totals']
+	
+	fig = new_figure((10, 6))
+	ax = fig.add_subplot()
+	ax.plot(dates, cumulative_counts, marker='o', color='#4f8cff', linewidth=2, markersize=4)
+	ax.fill_between(dates, cumulative_counts, alpha=0.3, color='#4f8cff')
+	
+	ax.set_xlabel('Date', fontsize=12)
+	ax.set_ylabel('Cumulative Recipes', fontsize=12)
+	ax.set_title('Recipe Collection Growth Over Time', fontsize=14, fontweight='bold')
+	_rotate_x_labels(ax)
+	ax.grid(True, alpha=0.3)
+	fig.tight_layout()
+	
+	return figure_bytes(fig, fmt)
+
+
+# name -> (data function run in the request, render function safe to run in a worker)
+CHARTS = {
+	'bar': ('bar_chart_data', 'render_bar_chart'),
+	'pie': ('pie_chart_data', 'render_pie_chart'),
+	'line': ('line_chart_data', 'render_line_chart'),
+}
+
+
+def chart_data(name, recipes_qs):
+	"""Run the (cheap, database-side) data step of chart ``name``."""
+	return globals()[CHARTS[name][0]](recipes_qs)
+
+
+def render_chart(name, data, fmt='png'):
+	"""
+	Run the (CPU-bound) matplotlib step of chart ``name``, returning image bytes.
+
+	Takes and returns plain picklable values so it can run in a worker process.
+	"""
+	return globals()[CHARTS[name][1]](data, fmt)
+
+
+def create_bar_chart(recipes_qs):
+	"""Create a bar chart showing recipes per category (base64 PNG)."""
+	data = bar_chart_data(recipes_qs)
+	if data is None:
+		return None
+	return base64.b64encode(render_bar_chart(data)).decode('utf-8')
+
+
+def create_pie_chart(recipes_qs):
+	"""Create a pie chart showing recipe distribution by cooking time difficulty."""
+	data = pie_chart_data(recipes_qs)
+	if data is None:
+		return None
+	return base64.b64encode(render_pie_chart(data)).decode('utf-8')
+
+
+def create_line_chart(recipes_qs):
+	"""Create a line chart showing cumulative recipes over time."""
+	data = line_chart_data(recipes_qs)
+	if data is None:
+		return None
+	return base64.b64encode(render_line_chart(data)).decode('utf-8')
@@ -0,0 +1,87 @@
+"""
+Denormalized ``recipe_count`` columns on Category and Ingredient.
+
+The counts are adjusted in place with ``UPDATE ... SET recipe_count =
+recipe_count + n`` so concurrent writers never lose an update. recipes.signals
+applies them for ordinary saves and deletes; bulk paths (bulk_create,
+QuerySet.update) call adjust_counts() themselves or finish with
+repair_counts().
+"""
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.dispatch import Signal
+
+from categories.models import Category
+from ingredients.models import Ingredient
+
+from .models import Recipe, RecipeIngredient
+
+
+# (model with recipe_count, model whose rows are counted, foreign key on it)
+COUNTED = (
+	(Category, Recipe, 'category'),
+	(Ingredient, RecipeIngredient, 'ingredient'),
+)
+
+# Sent with sender=<counted model> after adjust_counts() (deltas={pk: change})
+# and after a repair rewrote counts (deltas=None), for in-memory copies to follow.
+recipe_counts_changed = Signal()
+
+
+def adjust_counts(model, deltas, using=DEFAULT_DB_ALIAS):
+	"""
+	Add ``deltas`` ({pk: change}) to ``model.recipe_count``.
+
+	Rows that share a change are updated together, so a batch costs one
+	UPDATE per distinct delta. Counts never go below zero.
+	"""
+	by_delta = defaultdict(list)
+	for pk, delta in deltas.items():
+		if pk is not None and delta:
+			by_delta[delta].append(pk)
+	for delta, pks in by_delta.items():
+		value = F('recipe_count') + delta
+		if delta < 0:
+			value = Greatest(value, Value(0))
+		for start in range(0, len(pks), 500):
+			model.objects.using(using).filter(pk__in=pks[start:start + 500]).update(recipe_count=value)
+	if by_delta:
+		recipe_counts_changed.send(
+			sender=model, deltas={pk: delta for delta, pks in by_delta.items() for pk in pks}, using=using,
+		)
+
+
+def actual_count(model):
+	"""Expression computing the true recipe count of each ``model`` row."""
+	for counted, source, fk in COUNTED:
+		if counted is model:
+			return Coalesce(Subquery(
+				source.objects.filter(**{fk: OuterRef('pk')})
+				.order_by().values(fk).annotate(n=Count('pk')).values('n')
+			), 0)
+	raise ValueError(f'{model.__name__} has no recipe_count')
+
+
+def repair_counts(model, using=DEFAULT_DB_ALIAS, dry_run=False):
+	"""Recount rows whose stored recipe_count has drifted; return how many did."""
+	drifted = (
+		model.objects.using(using)
+		.annotate(actual=actual_count(model))
+		.exclude(recipe_count=F('actual'))
+	)
+	pks = list(drifted.values_list('pk', flat=True))
+	if pks and not dry_run:
+		for start in range(0, len(pks), 500):
+			model.objects.using(using).filter(pk__in=pks[start:start + 500]).update(
+				recipe_count=actual_count(model)
+			)
+		recipe_counts_changed.send(sender=model, deltas=None, using=using)
+	return len(pks)
+
+
+def repair_all_counts(using=DEFAULT_DB_ALIAS, dry_run=False):
+	"""repair_counts() for every counted model; returns {model: drifted rows}."""
+	return {model: repair_counts(model, using, dry_run) for model, _source, _fk in COUNTED}
@@ -0,0 +1,86 @@
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, F, OuterRef, Subquery
+
+from .models import RecipeIngredient
+
+
+DEFAULT_EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = (
+	'id', 'title', 'category', 'author', 'prep_time_minutes', 'cook_time_minutes',
+	'total_time_minutes', 'ingredient_count', 'created_at', 'updated_at',
+)
+
+EXPORT_FORMATS = {
+	'csv': 'text/csv; charset=utf-8',
+	'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Spreadsheet apps run cells starting with these as formulas
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def export_rows(queryset, chunk_size=None):
+	"""
+	Yield one dict per recipe, keyed by EXPORT_FIELDS.
+
+	Rows come from a single annotated query read with ``.iterator()``, so only
+	``chunk_size`` rows are held in memory however large the export is.
+	"""
+	if chunk_size is None:
+		chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', DEFAULT_EXPORT_CHUNK_SIZE)
+	# A correlated subquery instead of a JOIN + GROUP BY lets SQLite stream
+	# rows straight off the ordering index rather than grouping them all first.
+	ingredient_count = Subquery(
+		RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+		.order_by().values('recipe').annotate(n=Count('pk')).values('n')
+	)
+	rows = queryset.annotate(
+		category_name=F('category__name'),
+		author_name=F('author__username'),
+		n_ingredients=ingredient_count,
+	).values_list(
+		'id', 'title', 'category_name', 'author_name', 'prep_time_minutes',
+		'cook_time_minutes', 'total_time_minutes', 'n_ingredients', 'created_at', 'updated_at',
+	)
+	for row in rows.iterator(chunk_size=chunk_size):
+		record = dict(zip(EXPORT_FIELDS, row))
+		record['ingredient_count'] = record['ingredient_count'] or 0
+		yield record
+
+
+class _Echo:
+	"""File-like object whose write() just returns the line csv.writer produced."""
+
+	def write(self, value):
+		return value
+
+
+def _csv_cell(value):
+	if value is None:
+		return ''
+	if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+		return "'" + value
+	return value
+
+
+def csv_lines(rows):
+	"""Encode rows as CSV, one line at a time, header first."""
+	writer = csv.writer(_Echo())
+	yield writer.writerow(EXPORT_FIELDS)
+	for row in rows:
+		yield writer.writerow([_csv_cell(row[field]) for field in EXPORT_FIELDS])
+
+
+def jsonl_lines(rows):
+	"""Encode rows as JSON Lines."""
+	for row in rows:
+		yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def export_lines(rows, fmt):
+	return csv_lines(rows) if fmt == 'csv' else jsonl_lines(rows)
@@ -1,6 +1,33 @@
+import re
+from functools import reduce
+from operator import or_
+
 from django import forms
+from django.db.models import Q
+from django.urls import reverse
 from categories.models import Category
 from ingredients.models import Ingredient
+from .pantry import max_pantry_size
+
+
+class IngredientTypeaheadWidget(forms.Widget):
+    """A hidden ingredient id plus a text box that suggests names as you type."""
+
+    template_name = 'recipes/widgets/ingredient_typeahead.html'
+
+    def __init__(self, attrs=None):
+        super().__init__(attrs)
+        # Name shown in the text box; the form fills it in once the id is validated
+        self.label = None
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        label = self.label
+        if label is None and value and str(value).isdigit():
+            label = Ingredient.objects.filter(pk=value).values_list('name', flat=True).first()
+        context['widget']['label'] = label or ''
+        context['widget']['typeahead_url'] = reverse('api:typeahead')
+        return context
 
 
 class RecipeSearchForm(forms.Form):
@@ -16,12 +43,16 @@ class RecipeSearchForm(forms.Form):
         })
     )
     
+    # Suggested through /api/typeahead/ rather than rendered as a <select> of
+    # every ingredient
     ingredient = forms.ModelChoiceField(
-        queryset=Ingredient.objects.all().order_by('name'),
+        queryset=Ingredient.objects.all(),
         required=False,
-        empty_label='All Ingredients',
         label='Ingredient',
-        widget=forms.Select(attrs={'class': 'form-control'})
+        widget=IngredientTypeaheadWidget(attrs={
+            'placeholder': 'Start typing (e.g., "tom")',
+            'class': 'form-control'
+        })
     )
     
     category = forms.ModelChoiceField(
@@ -32,6 +63,17 @@ class RecipeSearchForm(forms.Form):
         widget=forms.Select(attrs={'class': 'form-control'})
     )
     
+    min_time = forms.IntegerField(
+        required=False,
+        min_value=0,
+        label='Min Total Time (minutes)',
+        widget=forms.NumberInput(attrs={
+            'placeholder': 'e.g., 10',
+            'class': 'form-control',
+            'min': '0'
+        })
+    )
+    
     max_time = forms.IntegerField(
         required=False,
         min_value=1,
@@ -48,9 +90,69 @@ class RecipeSearchForm(forms.Form):
         name = self.cleaned_data.get('recipe_name', '')
         return name.strip() if name else ''
 
+    def clean_ingredient(self):
+        """Let the widget show the chosen ingredient without looking it up again."""
+        ingredient = self.cleaned_data.get('ingredient')
+        self.fields['ingredient'].widget.label = ingredient.name if ingredient else None
+        return ingredient
+
     def clean_max_time(self):
         """Ensure max_time is a positive integer."""
         max_time = self.cleaned_data.get('max_time')
         if max_time is not None and max_time < 1:
             raise forms.ValidationError('Maximum time must be at least 1 minute.')
         return max_time
+
+    def clean(self):
+        """Ensure the time range is not inverted."""
+        cleaned_data = super().clean()
+        min_time = cleaned_data.get('min_time')
+        max_time = cleaned_data.get('max_time')
+        if min_time is not None and max_time is not None and min_time > max_time:
+            self.add_error('min_time', 'Minimum time cannot be greater than maximum time.')
+        return cleaned_data
+
+
+class PantryForm(forms.Form):
+    """Ingredients on hand, for matching against recipes."""
+
+    # Names that matched no ingredient; set while cleaning
+    unknown_ingredients = ()
+
+    ingredients = forms.CharField(
+        label='Ingredients You Have',
+        help_text='Separate names with commas or new lines.',
+        widget=forms.Textarea(attrs={
+            'rows': 3,
+            'placeholder': 'e.g., eggs, flour, milk, butter',
+            'class': 'form-control'
+        })
+    )
+
+    max_missing = forms.IntegerField(
+        required=False,
+        min_value=0,
+        label='Max Missing Ingredients',
+        widget=forms.NumberInput(attrs={
+            'placeholder': 'Any',
+            'class': 'form-control',
+            'min': '0'
+        })
+    )
+
+    def clean_ingredients(self):
+        """Resolve the names (case-insensitively) to Ingredient rows."""
+        names = list(dict.fromkeys(
+            name.strip() for name in re.split(r'[,\n]', self.cleaned_data['ingredients']) if name.strip()
+        ))
+        if not names:
+            raise forms.ValidationError('Enter at least one ingredient.')
+        limit = max_pantry_size()
+        if len(names) > limit:
+            raise forms.ValidationError(f'Enter at most {limit} ingredients.')
+        found = list(Ingredient.objects.filter(reduce(or_, (Q(name__iexact=name) for name in names))))
+        known = {ingredient.name.casefold() for ingredient in found}
+        self.unknown_ingredients = [name for name in names if name.casefold() not in known]
+        if not found:
+            raise forms.ValidationError('None of these ingredients are in the catalog.')
+        return found
@@ -0,0 +1,220 @@
+"""
+Typo-tolerant search over the words of recipe titles and ingredient names.
+
+Every word is split into the trigrams of the word padded with two spaces in
+front and one behind (as PostgreSQL's pg_trgm does), and each trigram keeps a
+posting list of the words containing it. A misspelt word still shares most of
+its trigrams with the word that was meant, so candidates are the words found
+in enough of its posting lists, re-ranked by trigram similarity: shared
+trigrams over the distinct trigrams of both words.
+
+Searches run as usual first. When one finds nothing, the words of the query
+the index does not know are corrected and the search is retried with the
+result, which the page shows as a "did you mean" suggestion.
+"""
+import heapq
+import math
+from bisect import bisect_left, insort
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import Count
+
+from ingredients.models import Ingredient
+
+from .indexing import InProcessIndex
+from .models import Recipe
+from .typeahead import words
+from .versioning import register_bulk_scope
+
+
+FUZZY_SCOPE = register_bulk_scope('fuzzy')
+
+DEFAULT_FUZZY_SEARCH_THRESHOLD = 0.4
+
+# Shorter words have too few trigrams to tell a typo from a different word
+MIN_CORRECTED_LENGTH = 3
+
+
+def trigrams(word):
+	padded = f'  {word} '
+	return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity_threshold():
+	return getattr(settings, 'FUZZY_SEARCH_THRESHOLD', DEFAULT_FUZZY_SEARCH_THRESHOLD)
+
+
+def suggestion_query(params, name, suggestion):
+	"""The query string ``params`` with ``name`` set to ``suggestion``; blank values and page cursors are dropped."""
+	return urlencode([(name, suggestion)] + [
+		(key, value)
+		for key, values in params.lists()
+		if key not in (name, 'after', 'before')
+		for value in values
+		if value
+	])
+
+
+class TrigramIndex:
+	"""Words searchable by trigram similarity, each with the number of labels using it."""
+
+	def __init__(self):
+		self._postings = {}  # trigram -> set of words
+		self._counts = Counter()  # word -> labels using it
+		self._sorted = []  # every word, for prefix lookups
+
+	def __len__(self):
+		return len(self._counts)
+
+	def load(self, labels):
+		"""Replace the contents with the words of ``(label, count)`` pairs."""
+		counts = Counter()
+		for label, count in labels:
+			for word in set(words(label)):
+				counts[word] += count
+		self._counts = counts
+		self._sorted = sorted(counts)
+		self._postings = {}
+		for word in counts:
+			for gram in trigrams(word):
+				self._postings.setdefault(gram, set()).add(word)
+
+	def add(self, label, count=1):
+		for word in set(words(label)):
+			if word not in self._counts:
+				insort(self._sorted, word)
+				for gram in trigrams(word):
+					self._postings.setdefault(gram, set()).add(word)
+			self._counts[word] += count
+
+	def discard(self, label, count=1):
+		for word in set(words(label)):
+			if word not in self._counts:
+				continue
+			self._counts[word] -= count
+			if self._counts[word] > 0:
+				continue
+			del self._counts[word]
+			position = bisect_left(self._sorted, word)
+			if position < len(self._sorted) and self._sorted[position] == word:
+				del self._sorted[position]
+			for gram in trigrams(word):
+				postings = self._postings.get(gram)
+				if postings is not None:
+					postings.discard(word)
+					if not postings:
+						del self._postings[gram]
+
+	def count(self, word):
+		return self._counts.get(word, 0)
+
+	def known(self, word):
+		"""True if ``word`` is in the index or starts one of its words, as search terms do."""
+		position = bisect_left(self._sorted, word)
+		return position < len(self._sorted) and self._sorted[position].startswith(word)
+
+	def similar(self, word, threshold, limit=5):
+		"""
+		The ``limit`` words most similar to ``word``, as ``(word, score)`` pairs.
+
+		A word scoring ``threshold`` or more shares at least ``k`` of the ``n``
+		trigrams of ``word`` (``k = ceil(threshold * n)``), so it is in one of
+		the ``n - k + 1`` shortest posting lists. Their union is the candidate
+		set; membership of each candidate in the other lists counts its shared
+		trigrams, and only candidates sharing ``k`` are scored. Ties go to the
+		word used by more labels.
+		"""
+		grams = trigrams(word)
+		required = max(math.ceil(threshold * len(grams)), 1)
+		lists = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+		candidates = set().union(*lists[:len(lists) - required + 1])
+		matches = []
+		for candidate in candidates:
+			shared = sum(1 for postings in lists if candidate in postings)
+			if shared < required:
+				continue
+			score = shared / (len(grams) + len(trigrams(candidate)) - shared)
+			if score >= threshold:
+				matches.append((candidate, score))
+		return heapq.nsmallest(limit, matches, key=lambda match: (-match[1], -self._counts[match[0]], match[0]))
+
+	def suggest(self, text, threshold):
+		"""``text`` with each unknown word replaced by its closest match; None if nothing was replaced."""
+		corrected, changed = [], False
+		for word in words(text):
+			if len(word) >= MIN_CORRECTED_LENGTH and not word.isdigit() and not self.known(word):
+				matches = self.similar(word, threshold, limit=1)
+				if matches:
+					word, changed = matches[0][0], True
+			corrected.append(word)
+		return ' '.join(corrected) if changed else None
+
+
+class FuzzyIndex(InProcessIndex):
+	"""Trigram indexes of the words in recipe titles and in ingredient names."""
+
+	scope = FUZZY_SCOPE
+
+	def __init__(self):
+		super().__init__()
+		self.titles = TrigramIndex()
+		self.ingredients = TrigramIndex()
+		self._ingredient_names = {}
+
+	def build(self):
+		self.titles.load(Recipe.objects.order_by().values_list('title').annotate(n=Count('pk')).iterator())
+		self._ingredient_names = dict(Ingredient.objects.values_list('pk', 'name').iterator())
+		self.ingredients.load((name, 1) for name in self._ingredient_names.values())
+
+	def suggest_title(self, text):
+		"""A corrected recipe title search for ``text``, or None."""
+		self.ensure()
+		with self._lock:
+			return self.titles.suggest(text, similarity_threshold())
+
+	def suggest_ingredient(self, text):
+		"""A corrected ingredient name search for ``text``, or None."""
+		self.ensure()
+		with self._lock:
+			return self.ingredients.suggest(text, similarity_threshold())
+
+	# Incremental updates, called from recipes.signals
+
+	def title_changed(self, old, new):
+		"""A recipe titled ``old`` (None when created) is now titled ``new`` (None when deleted)."""
+		self.update('_title_changed', old, new)
+
+	def ingredient_saved(self, pk, name):
+		self.update('_ingredient_saved', pk, name)
+
+	def ingredient_deleted(self, pk):
+		self.update('_ingredient_deleted', pk)
+
+	# The changes themselves, applied with the lock held (see InProcessIndex.update)
+
+	def _title_changed(self, old, new):
+		if old is not None:
+			self.titles.discard(old)
+		if new is not None:
+			self.titles.add(new)
+
+	def _ingredient_saved(self, pk, name):
+		old = self._ingredient_names.get(pk)
+		if old is not None:
+			self.ingredients.discard(old)
+		self._ingredient_names[pk] = name
+		self.ingredients.add(name)
+
+	def _ingredient_deleted(self, pk):
+		old = self._ingredient_names.pop(pk, None)
+		if old is not None:
+			self.ingredients.discard(old)
+
+
+_index = FuzzyIndex()
+
+
+def get_index():
+	return _index
@@ -0,0 +1,382 @@
+"""
+Streaming bulk import of recipes from CSV or JSON Lines feeds.
+
+Records are read one at a time, grouped into batches that are written with
+bulk_create(), and committed every ``transaction_size`` records. Category,
+ingredient and author names are resolved through in-memory caches loaded once
+up front, so a batch costs a handful of queries no matter how many rows it
+has, the denormalized recipe counts are bumped with one UPDATE per
+distinct delta, and the new recipes' similarity signatures are computed for
+the whole batch at once. After each commit the number of records consumed is written to a
+checkpoint file, which lets an interrupted import resume where it stopped.
+
+CSV columns: title, description, instructions, category, author,
+prep_time_minutes, cook_time_minutes, ingredients. The ingredients column
+holds ``name:quantity:unit`` entries separated by ``;`` (quantity and unit are
+optional). JSONL records use the same keys, with ``ingredients`` as a list of
+``{"name", "quantity", "unit", "notes"}`` objects (or plain name strings).
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.text import slugify
+
+from categories.models import Category
+from ingredients.models import Ingredient
+
+from .counts import adjust_counts
+from .models import Recipe, RecipeIngredient
+from .similarity import minhash_many, store_signatures
+from .versioning import invalidate_bulk_change
+
+
+FORMATS = ('csv', 'jsonl')
+
+_QUANTITY_LIMIT = Decimal('999999.99')
+_CENTS = Decimal('0.01')
+
+
+class RowError(ValueError):
+	"""A single record is malformed; it is skipped and reported."""
+
+
+def detect_format(path):
+	"""Guess the feed format from the file name (``.gz`` is looked through)."""
+	name = path[:-3] if path.endswith('.gz') else path
+	if name.endswith('.csv'):
+		return 'csv'
+	if name.endswith(('.jsonl', '.ndjson')):
+		return 'jsonl'
+	return None
+
+
+def open_feed(path):
+	"""Open a (possibly gzipped) feed as text."""
+	if path.endswith('.gz'):
+		return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8', newline='')
+	return open(path, encoding='utf-8', newline='')
+
+
+def _split_ingredients(value):
+	entries = []
+	for part in (value or '').split(';'):
+		if not part.strip():
+			continue
+		name, _, rest = part.partition(':')
+		quantity, _, unit = rest.partition(':')
+		entries.append({'name': name, 'quantity': quantity, 'unit': unit})
+	return entries
+
+
+def read_records(handle, fmt):
+	"""Yield one dict per record, with ingredients as a list of dicts."""
+	if fmt == 'csv':
+		for row in csv.DictReader(handle):
+			row['ingredients'] = _split_ingredients(row.get('ingredients'))
+			yield row
+	elif fmt == 'jsonl':
+		for line in handle:
+			if not line.strip():
+				continue
+			try:
+				record = json.loads(line)
+			except ValueError:
+				yield None  # counted as a malformed record
+				continue
+			yield record if isinstance(record, dict) else None
+	else:
+		raise ValueError(f'Unknown format {fmt!r}; expected one of {", ".join(FORMATS)}.')
+
+
+def _minutes(record, key):
+	value = record.get(key)
+	if value in (None, ''):
+		return 0
+	try:
+		minutes = int(value)
+	except (TypeError, ValueError):
+		raise RowError(f'{key} must be a whole number of minutes')
+	if minutes < 0:
+		raise RowError(f'{key} cannot be negative')
+	return minutes
+
+
+def _quantity(value):
+	if value in (None, ''):
+		return None
+	try:
+		quantity = Decimal(str(value).strip()).quantize(_CENTS)
+	except InvalidOperation:
+		raise RowError(f'invalid quantity {value!r}')
+	if not 0 <= quantity <= _QUANTITY_LIMIT:
+		raise RowError(f'quantity {value!r} is out of range')
+	return quantity
+
+
+def _text(record, key, max_length=None):
+	value = record.get(key)
+	value = '' if value is None else str(value).strip()
+	if max_length and len(value) > max_length:
+		raise RowError(f'{key} is longer than {max_length} characters')
+	return value
+
+
+def parse_record(record):
+	"""Validate a raw record into the fields the importer writes."""
+	if not isinstance(record, dict):
+		raise RowError('not a valid record')
+	title = _text(record, 'title', Recipe._meta.get_field('title').max_length)
+	if not title:
+		raise RowError('title is required')
+	ingredients = []
+	for entry in record.get('ingredients') or []:
+		if isinstance(entry, str):
+			entry = {'name': entry}
+		if not isinstance(entry, dict):
+			raise RowError('ingredients must be names or objects')
+		name = _text(entry, 'name', Ingredient._meta.get_field('name').max_length)
+		if name:
+			ingredients.append({
+				'name': name,
+				'quantity': _quantity(entry.get('quantity')),
+				'unit': _text(entry, 'unit', RecipeIngredient._meta.get_field('unit').max_length),
+				'notes': _text(entry, 'notes', RecipeIngredient._meta.get_field('notes').max_length),
+			})
+	return {
+		'title': title,
+		'description': _text(record, 'description'),
+		'instructions': _text(record, 'instructions'),
+		'category': _text(record, 'category', Category._meta.get_field('name').max_length),
+		'author': _text(record, 'author'),
+		'prep_time_minutes': _minutes(record, 'prep_time_minutes'),
+		'cook_time_minutes': _minutes(record, 'cook_time_minutes'),
+		'ingredients': ingredients,
+	}
+
+
+class NameCache:
+	"""
+	Case-insensitive name -> primary key map for a model with a unique name.
+
+	Loaded with one query; names that are still missing when a batch is
+	resolved are created together with a single bulk_create().
+	"""
+
+	def __init__(self, model, field='name', using=DEFAULT_DB_ALIAS, create=True):
+		self.model = model
+		self.field = field
+		self.using = using
+		self.create = create
+		self.created = 0
+		self._ids = {
+			str(name).casefold(): pk
+			for pk, name in model.objects.using(using).values_list('pk', field)
+		}
+
+	def get(self, name):
+		return self._ids.get(name.casefold()) if name else None
+
+	def _build(self, names):
+		return [self.model(**{self.field: name}) for name in names]
+
+	def resolve(self, names):
+		"""Make sure every name in ``names`` has an id, creating the missing ones."""
+		missing = {}
+		for name in names:
+			if name and name.casefold() not in self._ids:
+				missing.setdefault(name.casefold(), name)
+		if not missing or not self.create:
+			return
+		manager = self.model.objects.using(self.using)
+		names = list(missing.values())
+		manager.bulk_create(self._build(names), ignore_conflicts=True)
+		# ignore_conflicts leaves pks unset, so read them back (in chunks that
+		# stay under SQLite's bound-parameter limit)
+		for start in range(0, len(names), 500):
+			lookup = {f'{self.field}__in': names[start:start + 500]}
+			for pk, name in manager.filter(**lookup).values_list('pk', self.field):
+				self._ids[name.casefold()] = pk
+		self.created += len(names)
+
+
+class CategoryCache(NameCache):
+	"""NameCache for categories, which also need a unique slug."""
+
+	def __init__(self, using=DEFAULT_DB_ALIAS):
+		super().__init__(Category, using=using)
+		self._slugs = set(Category.objects.using(using).values_list('slug', flat=True))
+
+	def _build(self, names):
+		objs = []
+		for name in names:
+			base = slugify(name)[:110] or 'category'
+			slug, suffix = base, 2
+			while slug in self._slugs:
+				slug, suffix = f'{base}-{suffix}', suffix + 1
+			self._slugs.add(slug)
+			objs.append(Category(name=name, slug=slug))
+		return objs
+
+
+class Checkpoint:
+	"""How many records of a feed have been committed, kept in a small JSON file."""
+
+	def __init__(self, path, source):
+		self.path = path
+		self.source = os.path.abspath(source)
+		self.size = os.path.getsize(source)
+
+	def load(self):
+		"""Records already imported from this exact file, or 0."""
+		try:
+			with open(self.path) as handle:
+				state = json.load(handle)
+		except (OSError, ValueError):
+			return 0
+		if state.get('source') != self.source or state.get('size') != self.size:
+			return 0
+		return int(state.get('records', 0))
+
+	def save(self, records):
+		tmp = f'{self.path}.tmp'
+		with open(tmp, 'w') as handle:
+			json.dump({'source': self.source, 'size': self.size, 'records': records}, handle)
+		os.replace(tmp, self.path)
+
+	def clear(self):
+		try:
+			os.remove(self.path)
+		except FileNotFoundError:
+			pass
+
+
+class ImportStats:
+	def __init__(self):
+		self.started = time.perf_counter()
+		self.records = 0
+		self.recipes = 0
+		self.links = 0
+		self.skipped = 0
+		self.resumed_from = 0
+
+	@property
+	def seconds(self):
+		return time.perf_counter() - self.started
+
+	@property
+	def rate(self):
+		return self.records / max(self.seconds, 1e-9)
+
+
+class RecipeImporter:
+	"""Import a stream of raw records; see the module docstring for the format."""
+
+	def __init__(self, batch_size=1000, transaction_size=10000, using=DEFAULT_DB_ALIAS,
+			checkpoint=None, on_error=None, progress=None):
+		if batch_size < 1 or transaction_size < 1:
+			raise ValueError('batch_size and transaction_size must be positive.')
+		self.batch_size = batch_size
+		# Commits happen on batch boundaries
+		self.transaction_size = max(transaction_size, batch_size)
+		self.using = using
+		self.checkpoint = checkpoint
+		self.on_error = on_error or (lambda number, error: None)
+		self.progress = progress or (lambda stats: None)
+		self.stats = ImportStats()
+
+	def run(self, records, skip=0):
+		"""Import ``records``, skipping the first ``skip`` (already imported) ones."""
+		self.categories = CategoryCache(using=self.using)
+		self.ingredients = NameCache(Ingredient, using=self.using)
+		User = get_user_model()
+		self.authors = NameCache(User, field=User.USERNAME_FIELD, using=self.using, create=False)
+
+		stats = self.stats
+		stats.resumed_from = stats.records = skip
+		records = islice(records, skip, None)
+		try:
+			while True:
+				chunk = list(islice(records, self.transaction_size))
+				if not chunk:
+					break
+				with transaction.atomic(using=self.using):
+					for start in range(0, len(chunk), self.batch_size):
+						self._write_batch(chunk[start:start + self.batch_size], stats.records + start)
+				stats.records += len(chunk)
+				if self.checkpoint:
+					self.checkpoint.save(stats.records)
+				self.progress(stats)
+		finally:
+			if stats.recipes:
+				# bulk_create() sends no post_save, so invalidate every cache and
+				# in-process index here
+				invalidate_bulk_change()
+		if self.checkpoint:
+			self.checkpoint.clear()
+		return stats
+
+	def _write_batch(self, raw_records, first_number):
+		parsed = []
+		for offset, raw in enumerate(raw_records):
+			try:
+				parsed.append(parse_record(raw))
+			except RowError as error:
+				self.stats.skipped += 1
+				self.on_error(first_number + offset + 1, error)
+		if not parsed:
+			return
+
+		self.categories.resolve(record['category'] for record in parsed)
+		self.ingredients.resolve(entry['name'] for record in parsed for entry in record['ingredients'])
+
+		recipes = [
+			Recipe(
+				title=record['title'],
+				description=record['description'],
+				instructions=record['instructions'],
+				category_id=self.categories.get(record['category']),
+				author_id=self.authors.get(record['author']),
+				prep_time_minutes=record['prep_time_minutes'],
+				cook_time_minutes=record['cook_time_minutes'],
+				# bulk_create() skips Recipe.save(), which normally fills this in
+				total_time_minutes=record['prep_time_minutes'] + record['cook_time_minutes'],
+			)
+			for record in parsed
+		]
+		Recipe.objects.using(self.using).bulk_create(recipes)
+		adjust_counts(Category, Counter(recipe.category_id for recipe in recipes), self.using)
+
+		links = []
+		for recipe, record in zip(recipes, parsed):
+			seen = set()
+			for entry in record['ingredients']:
+				ingredient_id = self.ingredients.get(entry['name'])
+				if ingredient_id is None or ingredient_id in seen:
+					continue  # (recipe, ingredient) is unique; keep the first line
+				seen.add(ingredient_id)
+				links.append(RecipeIngredient(
+					recipe_id=recipe.pk,
+					ingredient_id=ingredient_id,
+					quantity=entry['quantity'],
+					unit=entry['unit'],
+					notes=entry['notes'],
+				))
+		RecipeIngredient.objects.using(self.using).bulk_create(links)
+		adjust_counts(Ingredient, Counter(link.ingredient_id for link in links), self.using)
+		groups = {}
+		for link in links:
+			groups.setdefault(link.recipe_id, []).append(link.ingredient_id)
+		if groups:
+			signatures = minhash_many(list(groups.values()))
+			store_signatures(dict(zip(groups, signatures)), self.using, replace=False)
+		self.stats.recipes += len(recipes)
+		self.stats.links += len(links)
@@ -0,0 +1,108 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .versioning import bump_version, get_version
+
+
+# Per scope and version: the number of logged changes, and each change
+LOG_LENGTH_KEY = 'recipes:index-log:{scope}:{version}'
+LOG_ENTRY_KEY = 'recipes:index-log:{scope}:{version}:{position}'
+
+DEFAULT_INDEX_LOG_TIMEOUT = 60 * 60 * 24
+
+
+class InProcessIndex:
+	"""
+	A structure held in this process's memory and built from the database.
+
+	The index is built lazily on first use and rebuilt whenever the version
+	token of ``scope`` changes, which is how bulk loads that skip signals
+	invalidate it. Changes made through signals are appended to a change log
+	in the shared cache instead, one log per version: every process, the one
+	that made the change included, applies the entries it has not seen yet
+	in place. A process missing an entry (expired or evicted) rebuilds.
+	"""
+
+	scope = None
+
+	def __init__(self):
+		self._lock = threading.RLock()
+		self._version = None
+		self._position = 0  # log entries already applied (or in the build)
+		self._built = False
+
+	def build(self):
+		"""Load the whole index from the database; called with the lock held."""
+		raise NotImplementedError
+
+	def ensure(self):
+		"""Build the index if it is missing or stale, or apply the changes logged since."""
+		version = get_version(self.scope)
+		if self._built and version == self._version and self._log_length(version) == self._position:
+			return
+		with self._lock:
+			self._sync()
+
+	def _sync(self):
+		# Entries logged before the build started are taken to be in the database
+		version = get_version(self.scope)
+		length = self._log_length(version)
+		if self._built and version == self._version and self._replay(version, length):
+			return
+		self.build()
+		self._built = True
+		self._version = version
+		self._position = length
+
+	def _log_length(self, version):
+		return cache.get(LOG_LENGTH_KEY.format(scope=self.scope, version=version), 0)
+
+	def _replay(self, version, length):
+		"""Apply log entries up to ``length``; False if some are gone and a rebuild is needed."""
+		if length < self._position:
+			return False
+		keys = [
+			LOG_ENTRY_KEY.format(scope=self.scope, version=version, position=position)
+			for position in range(self._position + 1, length + 1)
+		]
+		entries = cache.get_many(keys)
+		if len(entries) < len(keys):
+			return False
+		for key in keys:
+			method, args = entries[key]
+			getattr(self, method)(*args)
+		self._position = length
+		return True
+
+	def update(self, method, *args):
+		"""
+		Log the change ``self.method(*args)`` and apply it to this process's copy.
+
+		``method`` names a method that changes the built index in place; it
+		and ``args`` must be picklable, since other processes replay them.
+		"""
+		version = get_version(self.scope)
+		timeout = getattr(settings, 'INDEX_LOG_TIMEOUT', DEFAULT_INDEX_LOG_TIMEOUT)
+		length_key = LOG_LENGTH_KEY.format(scope=self.scope, version=version)
+		# The length never expires, so positions are never reused within a version
+		cache.add(length_key, 0, None)
+		try:
+			position = cache.incr(length_key)
+		except ValueError:
+			# Evicted since add(): nobody can tell which changes they missed
+			self.invalidate()
+			return
+		cache.set(
+			LOG_ENTRY_KEY.format(scope=self.scope, version=version, position=position), (method, args), timeout,
+		)
+		with self._lock:
+			if self._built:
+				self._sync()
+
+	def invalidate(self):
+		"""Drop this process's copy and tell the other processes to drop theirs."""
+		with self._lock:
+			self._built = False
+			bump_version(self.scope)
@@ -0,0 +1,97 @@
+import json
+import os
+import sys
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import (
+	setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.utils import timezone
+
+from recipes.benchmark import environment, run_load_benchmark
+from recipes.management.commands.benchmark_views import catalog_shape
+from recipes.synthetic import CatalogGenerator, clear_catalog
+
+
+class Command(BaseCommand):
+	help = (
+		'Compare latency under concurrent load of the async pages served through '
+		"Django's WSGI and ASGI handlers, on a synthetic catalog in a throwaway "
+		'test database, and write the results as JSON.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--recipes', type=int, default=10000, help='Catalog size (default: 10000).')
+		parser.add_argument(
+			'--concurrency', default='1,8,32',
+			help='Comma-separated numbers of concurrent clients (default: 1,8,32).',
+		)
+		parser.add_argument(
+			'--requests', type=int, default=200,
+			help='Requests per case, server and concurrency level (default: 200).',
+		)
+		parser.add_argument('--seed', type=int, default=0, help='Catalog random seed (default: 0).')
+		parser.add_argument('--output', help='Write JSON results to this file instead of stdout.')
+
+	def handle(self, *args, **options):
+		try:
+			levels = [int(level) for level in options['concurrency'].split(',') if level.strip()]
+		except ValueError:
+			raise CommandError('--concurrency must be a comma-separated list of integers.')
+		if not levels or min(levels) < 1 or options['requests'] < 1 or options['recipes'] < 1:
+			raise CommandError('Need --recipes, --requests and every concurrency level >= 1.')
+
+		shape = catalog_shape(options['recipes'])
+		report = {
+			'created_at': timezone.now().isoformat(),
+			'environment': environment(),
+			'requests': options['requests'],
+			'seed': options['seed'],
+			**shape,
+		}
+		setup_test_environment()
+		# A database file rather than SQLite's shared in-memory database, so
+		# concurrent connections behave as they do in production.
+		with tempfile.TemporaryDirectory() as directory:
+			connections['default'].settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+			old_config = setup_databases(
+				verbosity=0, interactive=False, aliases={'default'}, serialized_aliases=set(),
+			)
+			try:
+				self.stderr.write(f"Generating {shape['recipes']} recipes...")
+				clear_catalog()
+				CatalogGenerator(seed=options['seed'], **shape).run()
+				self.stderr.write('Benchmarking...')
+				report['results'] = run_load_benchmark(levels, options['requests'])
+			finally:
+				teardown_databases(old_config, verbosity=0)
+				teardown_test_environment()
+		self._print_table(report['results'])
+
+		payload = json.dumps(report, indent=2)
+		if options['output']:
+			with open(options['output'], 'w') as handle:
+				handle.write(payload + '\n')
+			self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+		else:
+			self.stdout.write(payload)
+
+	def _print_table(self, results):
+		out = self.stderr
+		by_case = {}
+		for result in results:
+			by_case.setdefault((result['name'], result['concurrency']), {})[result['server']] = result
+		out.write(
+			f"\n{'case':<24}{'clients':>8}{'wsgi p50':>10}{'wsgi p99':>10}{'asgi p50':>10}"
+			f"{'asgi p99':>10}{'wsgi rps':>10}{'asgi rps':>10}"
+		)
+		for (name, level), servers in by_case.items():
+			wsgi, asgi = servers['wsgi'], servers['asgi']
+			out.write(
+				f"{name:<24}{level:>8}{wsgi['median_ms']:>10.1f}{wsgi['p99_ms']:>10.1f}"
+				f"{asgi['median_ms']:>10.1f}{asgi['p99_ms']:>10.1f}"
+				f"{wsgi['throughput_rps']:>10.1f}{asgi['throughput_rps']:>10.1f}"
+			)
+		sys.stderr.flush()
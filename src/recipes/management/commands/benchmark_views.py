@@ -0,0 +1,114 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+	setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.utils import timezone
+
+from recipes.benchmark import environment, run_benchmark
+from recipes.synthetic import CatalogGenerator, clear_catalog
+
+
+def catalog_shape(recipes):
+	"""Scale ingredients, categories and authors with the number of recipes."""
+	return {
+		'recipes': recipes,
+		'ingredients': max(100, recipes // 25),
+		'categories': min(200, max(10, recipes // 2500)),
+		'authors': min(500, max(5, recipes // 1000)),
+	}
+
+
+class Command(BaseCommand):
+	help = (
+		'Time every view and chart helper against synthetic catalogs of several sizes '
+		'(built in a throwaway test database) and write the results as JSON.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--sizes', default='1000,10000,100000',
+			help='Comma-separated recipe counts to benchmark (default: 1000,10000,100000).',
+		)
+		parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case (default: 5).')
+		parser.add_argument('--seed', type=int, default=0, help='Catalog random seed (default: 0).')
+		parser.add_argument('--output', help='Write JSON results to this file instead of stdout.')
+		parser.add_argument('--compare', help='Print median changes against an earlier results file.')
+
+	def handle(self, *args, **options):
+		try:
+			sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+		except ValueError:
+			raise CommandError('--sizes must be a comma-separated list of integers.')
+		if not sizes or options['repeat'] < 1:
+			raise CommandError('Need at least one size and --repeat >= 1.')
+		baseline = self._load(options['compare']) if options['compare'] else None
+
+		report = {
+			'created_at': timezone.now().isoformat(),
+			'environment': environment(),
+			'repeat': options['repeat'],
+			'seed': options['seed'],
+			'runs': [],
+		}
+		setup_test_environment()
+		old_config = setup_databases(
+			verbosity=0, interactive=False, aliases={'default'}, serialized_aliases=set(),
+		)
+		try:
+			for size in sizes:
+				shape = catalog_shape(size)
+				self.stderr.write(f'Generating {size} recipes...')
+				clear_catalog()
+				generated = CatalogGenerator(seed=options['seed'], **shape).run()
+				self.stderr.write(f'Benchmarking {size} recipes...')
+				results = run_benchmark(repeat=options['repeat'])
+				report['runs'].append({
+					**shape,
+					'recipe_ingredients': generated['recipe_ingredients'],
+					'generate_seconds': round(generated['seconds'], 3),
+					'results': results,
+				})
+				self._print_table(size, results, baseline)
+		finally:
+			teardown_databases(old_config, verbosity=0)
+			teardown_test_environment()
+
+		payload = json.dumps(report, indent=2)
+		if options['output']:
+			with open(options['output'], 'w') as handle:
+				handle.write(payload + '\n')
+			self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+		else:
+			self.stdout.write(payload)
+
+	def _load(self, path):
+		try:
+			with open(path) as handle:
+				report = json.load(handle)
+		except (OSError, ValueError) as exc:
+			raise CommandError(f'Cannot read {path}: {exc}')
+		return {
+			(run['recipes'], result['kind'], result['name']): result['median_ms']
+			for run in report.get('runs', [])
+			for result in run['results']
+		}
+
+	def _print_table(self, size, results, baseline):
+		out = self.stderr
+		out.write(f'\n{size} recipes')
+		out.write(f"{'case':<32}{'median ms':>12}{'p95 ms':>12}{'queries':>9}{'change':>10}")
+		for result in results:
+			label = f"{result['kind']}:{result['name']}"
+			change = ''
+			if baseline:
+				before = baseline.get((size, result['kind'], result['name']))
+				if before:
+					change = f"{(result['median_ms'] - before) / before:+.0%}"
+			out.write(
+				f"{label:<32}{result['median_ms']:>12.2f}{result['p95_ms']:>12.2f}"
+				f"{result['queries']:>9}{change:>10}"
+			)
+		sys.stderr.flush()
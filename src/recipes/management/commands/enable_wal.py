@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from recipes.routers import enable_wal
+
+
+class Command(BaseCommand):
+	help = (
+		'Switch an SQLite database file to write-ahead logging, so reads from the '
+		'replica connection do not wait for writes. Run once per deployment.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--database', default=DEFAULT_DB_ALIAS,
+			help='Database alias to switch (default: "default").',
+		)
+
+	def handle(self, *args, **options):
+		connection = connections[options['database']]
+		if connection.vendor != 'sqlite':
+			raise CommandError('Only SQLite databases have a journal mode to switch.')
+
+		mode = enable_wal(connection)
+		if mode != 'wal':
+			raise CommandError(f'The database stayed in {mode!r} journal mode.')
+		self.stdout.write(self.style.SUCCESS(f"{connection.settings_dict['NAME']} uses WAL."))
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from recipes.synthetic import CatalogGenerator, catalog_is_empty, clear_catalog
+
+
+class Command(BaseCommand):
+	help = 'Fill the database with a large, reproducible synthetic recipe catalog.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--recipes', type=int, default=500_000, help='Number of recipes (default: 500000).')
+		parser.add_argument('--ingredients', type=int, default=20_000, help='Number of ingredients (default: 20000).')
+		parser.add_argument('--categories', type=int, default=200, help='Number of categories (default: 200).')
+		parser.add_argument('--authors', type=int, default=50, help='Number of recipe authors (default: 50).')
+		parser.add_argument(
+			'--per-recipe', type=int, nargs=2, default=(3, 12), metavar=('MIN', 'MAX'),
+			help='Range of ingredients per recipe (default: 3 12).',
+		)
+		parser.add_argument('--days', type=int, default=3 * 365, help='Spread created_at over this many days.')
+		parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same catalog.')
+		parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create/transaction.')
+		parser.add_argument(
+			'--clear', action='store_true',
+			help='Delete all existing recipes, ingredients and categories first.',
+		)
+		parser.add_argument(
+			'--database', default=DEFAULT_DB_ALIAS,
+			help='Database alias to fill (default: "default").',
+		)
+
+	def handle(self, *args, **options):
+		using = options['database']
+		if options['clear']:
+			clear_catalog(using)
+		elif not catalog_is_empty(using):
+			raise CommandError('The catalog is not empty; pass --clear to replace it.')
+
+		low, high = options['per_recipe']
+		try:
+			generator = CatalogGenerator(
+				recipes=options['recipes'],
+				ingredients=options['ingredients'],
+				categories=options['categories'],
+				authors=options['authors'],
+				min_ingredients=low,
+				max_ingredients=high,
+				days=options['days'],
+				seed=options['seed'],
+				batch_size=options['batch_size'],
+				using=using,
+				progress=self.stdout.write if options['verbosity'] > 1 else None,
+			)
+		except ValueError as exc:
+			raise CommandError(str(exc))
+
+		stats = generator.run()
+		self.stdout.write(self.style.SUCCESS(
+			f"Created {stats['recipes']} recipes, {stats['ingredients']} ingredients, "
+			f"{stats['categories']} categories and {stats['recipe_ingredients']} recipe ingredients "
+			f"in {stats['seconds']:.1f}s."
+		))
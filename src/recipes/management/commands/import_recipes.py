@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from recipes.importer import FORMATS, Checkpoint, RecipeImporter, detect_format, open_feed, read_records
+
+
+class Command(BaseCommand):
+	help = (
+		'Stream recipes from a CSV or JSON Lines file (optionally gzipped) into the '
+		'database in batches. Interrupted imports can be resumed with --resume.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help='Feed file (.csv, .jsonl or .ndjson, optionally .gz).')
+		parser.add_argument('--format', choices=FORMATS, help='Feed format (default: from the file name).')
+		parser.add_argument('--batch-size', type=int, default=1000, help='Records per bulk_create (default: 1000).')
+		parser.add_argument(
+			'--transaction-size', type=int, default=10000,
+			help='Records per transaction/checkpoint (default: 10000).',
+		)
+		parser.add_argument(
+			'--resume', action='store_true',
+			help='Skip the records a previous, interrupted run of the same file already committed.',
+		)
+		parser.add_argument('--checkpoint', help='Checkpoint file (default: PATH.checkpoint).')
+		parser.add_argument(
+			'--database', default=DEFAULT_DB_ALIAS,
+			help='Database alias to import into (default: "default").',
+		)
+
+	def handle(self, *args, **options):
+		path = options['path']
+		fmt = options['format'] or detect_format(path)
+		if fmt is None:
+			raise CommandError('Cannot tell the feed format from the file name; pass --format.')
+		try:
+			checkpoint = Checkpoint(options['checkpoint'] or f'{path}.checkpoint', path)
+		except OSError as exc:
+			raise CommandError(f'Cannot read {path}: {exc}')
+
+		skip = checkpoint.load() if options['resume'] else 0
+		if skip:
+			self.stdout.write(f'Resuming after record {skip}.')
+
+		try:
+			importer = RecipeImporter(
+				batch_size=options['batch_size'],
+				transaction_size=options['transaction_size'],
+				using=options['database'],
+				checkpoint=checkpoint,
+				on_error=self._report_error,
+				progress=self._report_progress if options['verbosity'] > 0 else None,
+			)
+		except ValueError as exc:
+			raise CommandError(str(exc))
+
+		with open_feed(path) as handle:
+			stats = importer.run(read_records(handle, fmt), skip=skip)
+
+		self.stdout.write(self.style.SUCCESS(
+			f'Imported {stats.recipes} recipe(s) with {stats.links} ingredient line(s) '
+			f'in {stats.seconds:.1f}s ({(stats.records - stats.resumed_from) / max(stats.seconds, 1e-9):,.0f} records/s); '
+			f'created {importer.ingredients.created} ingredient(s) and '
+			f'{importer.categories.created} categor{"y" if importer.categories.created == 1 else "ies"}; '
+			f'skipped {stats.skipped} invalid record(s).'
+		))
+
+	def _report_error(self, number, error):
+		self.stderr.write(f'Record {number}: {error}; skipped.')
+
+	def _report_progress(self, stats):
+		done = stats.records - stats.resumed_from
+		self.stdout.write(f'{stats.records} records committed ({done / max(stats.seconds, 1e-9):,.0f}/s)')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from recipes import search
+
+
+class Command(BaseCommand):
+	help = 'Drop and rebuild the FTS5 recipe search index from the recipes table.'
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--database', default=DEFAULT_DB_ALIAS,
+			help='Database alias to rebuild the index on (default: "default").',
+		)
+
+	def handle(self, *args, **options):
+		connection = connections[options['database']]
+		if not search.supports_fts(connection):
+			raise CommandError('The database does not support SQLite FTS5.')
+
+		search.drop_index(connection)
+		search.install_index(connection)
+		with connection.cursor() as cursor:
+			cursor.execute(f'SELECT COUNT(*) FROM {search.FTS_TABLE}')
+			indexed = cursor.fetchone()[0]
+		self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} recipe(s).'))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from recipes.similarity import rebuild_signatures
+
+
+class Command(BaseCommand):
+	help = 'Recompute the MinHash signatures and LSH buckets behind the "similar recipes" panel.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=5000, help='Recipes hashed per batch (default: 5000).')
+		parser.add_argument(
+			'--database', default=DEFAULT_DB_ALIAS,
+			help='Database alias to rebuild the signatures on (default: "default").',
+		)
+
+	def handle(self, *args, **options):
+		started = time.perf_counter()
+		progress = (lambda done: self.stdout.write(f'{done} recipes signed')) if options['verbosity'] > 1 else None
+		signed = rebuild_signatures(using=options['database'], batch_size=options['batch_size'], progress=progress)
+		self.stdout.write(self.style.SUCCESS(
+			f'Signed {signed} recipe(s) in {time.perf_counter() - started:.1f}s.'
+		))
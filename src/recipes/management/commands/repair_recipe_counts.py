@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from recipes.counts import repair_all_counts
+
+
+class Command(BaseCommand):
+	help = 'Recount Category.recipe_count and Ingredient.recipe_count where they have drifted.'
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--dry-run', action='store_true',
+			help='Only report how many rows are wrong.',
+		)
+		parser.add_argument(
+			'--database', default=DEFAULT_DB_ALIAS,
+			help='Database alias to repair (default: "default").',
+		)
+
+	def handle(self, *args, **options):
+		with transaction.atomic(using=options['database']):
+			drift = repair_all_counts(using=options['database'], dry_run=options['dry_run'])
+		verb = 'have' if options['dry_run'] else 'had'
+		for model, rows in drift.items():
+			self.stdout.write(f'{model.__name__}: {rows} row(s) {verb} a wrong recipe_count.')
+		if not options['dry_run']:
+			self.stdout.write(self.style.SUCCESS(f'Repaired {sum(drift.values())} row(s).'))
@@ -0,0 +1,164 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import routers
+
+
+logger = logging.getLogger(__name__)
+
+# Counters collecting the queries run in the current context. Context
+# variables follow sync_to_async() into worker threads, so queries an async
+# view hands to other threads are still charged to its request.
+_active_counters = ContextVar('query_counters', default=())
+
+
+class QueryCounter:
+	"""Number of queries and their total duration."""
+
+	def __init__(self):
+		self.count = 0
+		self.duration = 0.0
+		self._lock = threading.Lock()
+
+	def add(self, duration):
+		with self._lock:
+			self.count += 1
+			self.duration += duration
+
+
+def count_query(execute, sql, params, many, context):
+	"""Execute wrapper on every connection; feeds the counters active in this context."""
+	counters = _active_counters.get()
+	if not counters:
+		return execute(sql, params, many, context)
+	start = time.perf_counter()
+	try:
+		return execute(sql, params, many, context)
+	finally:
+		duration = time.perf_counter() - start
+		for counter in counters:
+			counter.add(duration)
+
+
+def install_query_counter(sender, connection, **kwargs):
+	"""
+	connection_created receiver that puts count_query() on new connections.
+
+	It goes first in the list, so temporary wrappers added and popped with
+	connection.execute_wrapper() never remove it.
+	"""
+	if count_query not in connection.execute_wrappers:
+		connection.execute_wrappers.insert(0, count_query)
+
+
+@contextmanager
+def counting_queries():
+	"""Count the queries run in this context (and in threads it hands work to)."""
+	counter = QueryCounter()
+	token = _active_counters.set(_active_counters.get() + (counter,))
+	try:
+		yield counter
+	finally:
+		_active_counters.reset(token)
+
+
+class QueryCountMiddleware:
+	"""
+	Record how many SQL queries each view runs and how long they take.
+
+	Every request is logged at DEBUG level with its view name; requests above
+	QUERY_COUNT_WARNING_THRESHOLD queries are logged as warnings. When
+	QUERY_COUNT_HEADER is set the figures are also sent back in a
+	``Server-Timing`` header so they show up in the browser dev tools.
+
+	Queries run while a streaming response is consumed happen after this
+	middleware returns and are not counted.
+	"""
+
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		self.is_async = iscoroutinefunction(get_response)
+		if self.is_async:
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if self.is_async:
+			return self.__acall__(request)
+		with counting_queries() as counter:
+			response = self.get_response(request)
+		return self._record(request, response, counter)
+
+	async def __acall__(self, request):
+		with counting_queries() as counter:
+			response = await self.get_response(request)
+		return self._record(request, response, counter)
+
+	def _record(self, request, response, counter):
+		request.query_count = counter.count
+		request.query_duration = counter.duration
+		match = request.resolver_match
+		view = match.view_name if match else request.path
+		duration_ms = counter.duration * 1000
+
+		threshold = getattr(settings, 'QUERY_COUNT_WARNING_THRESHOLD', None)
+		level = logging.WARNING if threshold and counter.count > threshold else logging.DEBUG
+		logger.log(level, '%s ran %d queries in %.1f ms', view, counter.count, duration_ms)
+
+		if getattr(settings, 'QUERY_COUNT_HEADER', False):
+			response['Server-Timing'] = f'db;dur={duration_ms:.1f};desc="{counter.count} queries"'
+		return response
+
+
+class DatabaseRoutingMiddleware:
+	"""
+	Give each request the routing state recipes.routers.PrimaryReplicaRouter reads.
+
+	A request that wrote to a REPLICA_APPS model sets a cookie pinning the
+	session's reads to the primary for REPLICA_PIN_SECONDS, so it does not
+	read back from a replica that has not caught up yet.
+	"""
+
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		self.is_async = iscoroutinefunction(get_response)
+		if self.is_async:
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if self.is_async:
+			return self.__acall__(request)
+		state, token = routers.begin_request(routers.is_pinned(request))
+		try:
+			response = self.get_response(request)
+		finally:
+			routers.end_request(token)
+		return self._pin(state, response)
+
+	async def __acall__(self, request):
+		state, token = routers.begin_request(routers.is_pinned(request))
+		try:
+			response = await self.get_response(request)
+		finally:
+			routers.end_request(token)
+		return self._pin(state, response)
+
+	def _pin(self, state, response):
+		if state.wrote:
+			seconds = routers.pin_seconds()
+			response.set_cookie(
+				routers.PIN_COOKIE, f'{time.time() + seconds:.3f}', max_age=seconds,
+				httponly=True, samesite='Lax',
+			)
+		return response
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_fts_index(apps, schema_editor):
+    from recipes.search import install_index
+
+    install_index(schema_editor.connection)
+
+
+def drop_fts_index(apps, schema_editor):
+    from recipes.search import drop_index
+
+    drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_recipe_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.27 on 2026-10-17 06:59
+
+from django.db import migrations, models, transaction
+from django.db.models import F, Max
+
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_total_time(apps, schema_editor):
+    """Fill total_time_minutes in primary-key ranges, one transaction per range."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    db_alias = schema_editor.connection.alias
+    recipes = Recipe.objects.using(db_alias)
+    last_id = recipes.aggregate(last=Max('id'))['last'] or 0
+    for start in range(0, last_id + 1, BACKFILL_BATCH_SIZE):
+        with transaction.atomic(using=db_alias):
+            recipes.filter(id__gte=start, id__lt=start + BACKFILL_BATCH_SIZE).update(
+                total_time_minutes=F('prep_time_minutes') + F('cook_time_minutes')
+            )
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Adding the column rebuilds recipes_recipe on SQLite, dropping the FTS triggers
+    from recipes.search import install_index
+
+    install_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    # The backfill commits batch by batch instead of holding one transaction
+    # (and on SQLite, the write lock) over the whole table
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0003_recipe_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='total_time_minutes',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_total_time, migrations.RunPython.noop),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop, atomic=True),
+    ]
@@ -14,12 +14,28 @@ class Recipe(models.Model):
 	)
 	prep_time_minutes = models.PositiveIntegerField(default=0)
 	cook_time_minutes = models.PositiveIntegerField(default=0)
+	# prep + cook, stored so time-range filters can use an index. Kept in sync
+	# by save(); code that bypasses save() (bulk_create, update) must set it.
+	total_time_minutes = models.PositiveIntegerField(default=0, db_index=True, editable=False)
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
 
+	class Meta:
+		indexes = [
+			# Backs the keyset pagination ordering used by recipe_list
+			models.Index(fields=['-created_at', '-id'], name='recipe_created_id_idx'),
+		]
+
 	def __str__(self) -> str:
 		return self.title
 
+	def save(self, *args, **kwargs):
+		self.total_time_minutes = (self.prep_time_minutes or 0) + (self.cook_time_minutes or 0)
+		update_fields = kwargs.get('update_fields')
+		if update_fields is not None and {'prep_time_minutes', 'cook_time_minutes'} & set(update_fields):
+			kwargs['update_fields'] = set(update_fields) | {'total_time_minutes'}
+		super().save(*args, **kwargs)
+
 
 class RecipeIngredient(models.Model):
 	recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='recipe_ingredients')
@@ -36,3 +52,23 @@ class RecipeIngredient(models.Model):
 		if self.quantity:
 			base = f"{self.quantity} {self.unit} {base}".strip()
 		return base
+
+
+class RecipeSignature(models.Model):
+	"""MinHash signature of a recipe's ingredient set (see recipes.similarity)."""
+	recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+	# SIMILARITY_HASHES unsigned 32-bit minimums, in native byte order
+	minhash = models.BinaryField()
+
+
+class RecipeBucket(models.Model):
+	"""One LSH band of a recipe's signature; recipes sharing a bucket are candidates."""
+	recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='similarity_buckets')
+	band = models.PositiveSmallIntegerField()
+	bucket = models.BigIntegerField()
+
+	class Meta:
+		indexes = [
+			# Covers the candidate lookup by (band, bucket)
+			models.Index(fields=['band', 'bucket', 'recipe'], name='recipe_bucket_lookup_idx'),
+		]
@@ -0,0 +1,113 @@
+"""
+Full-page cache for anonymous visitors.
+
+A page is cached under its path, its normalized query string and the version
+tokens of the data scopes it shows, so a change that bumps one of those
+scopes makes the next request render afresh and nothing ever has to be
+deleted. A hit is served straight from the cache without touching the
+database. Signed-in users always get a fresh render: their header differs
+and carries a CSRF token.
+"""
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .versioning import get_version, register_bulk_scope
+
+
+PAGE_SCOPE = register_bulk_scope('pages')
+PAGE_KEY = 'recipes:page:{request}:{version}'
+
+
+def normalized_query(query_dict):
+	"""The query string with blank parameters dropped and the rest sorted."""
+	return urlencode(sorted(
+		(name, value) for name, values in query_dict.lists() for value in values if value
+	))
+
+
+def page_key(request, scopes):
+	target = f'{request.path}?{normalized_query(request.GET)}'
+	return PAGE_KEY.format(
+		request=hashlib.md5(target.encode()).hexdigest(),
+		version='.'.join(get_version(scope) for scope in scopes),
+	)
+
+
+def _cacheable(response):
+	return (
+		response.status_code == 200
+		and not response.streaming
+		and not response.cookies
+	)
+
+
+def _lookup(request, scopes):
+	"""``(key, cached)`` for a cacheable request, ``(None, None)`` otherwise."""
+	if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+		return None, None
+	key = page_key(request, scopes)
+	return key, cache.get(key)
+
+
+def _store(key, response):
+	if _cacheable(response):
+		cache.set(
+			key, (response.content, response['Content-Type']),
+			getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 10),
+		)
+		response['X-Page-Cache'] = 'miss'
+
+
+def _hit(cached):
+	content, content_type = cached
+	response = HttpResponse(content, content_type=content_type)
+	response['X-Page-Cache'] = 'hit'
+	return response
+
+
+def cache_anonymous_page(*scopes):
+	"""
+	Cache a view's GET responses for anonymous users.
+
+	Pages are keyed on PAGE_SCOPE plus any extra ``scopes`` whose data the
+	view also shows. Responses carry ``X-Page-Cache: hit`` or ``miss``.
+	Works on sync and async views.
+	"""
+	scopes = (PAGE_SCOPE,) + scopes
+
+	def decorator(view):
+		if iscoroutinefunction(view):
+			@wraps(view)
+			async def async_wrapper(request, *args, **kwargs):
+				# The user check reads the session from the database
+				key, cached = await sync_to_async(_lookup)(request, scopes)
+				if cached is not None:
+					response = _hit(cached)
+				else:
+					response = await view(request, *args, **kwargs)
+					if key is not None:
+						await sync_to_async(_store)(key, response)
+				patch_vary_headers(response, ('Cookie',))
+				return response
+			return async_wrapper
+
+		@wraps(view)
+		def wrapper(request, *args, **kwargs):
+			key, cached = _lookup(request, scopes)
+			if cached is not None:
+				response = _hit(cached)
+			else:
+				response = view(request, *args, **kwargs)
+				if key is not None:
+					_store(key, response)
+			patch_vary_headers(response, ('Cookie',))
+			return response
+		return wrapper
+	return decorator
@@ -0,0 +1,219 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.http import urlencode
+
+from .async_views import gather_blocking
+
+
+DEFAULT_PAGE_SIZE = 24
+
+
+class InvalidCursor(ValueError):
+	"""Raised when a cursor from the query string cannot be decoded."""
+
+
+def _split_ordering(ordering):
+	"""Turn ('-created_at', 'id') into [('created_at', True), ('id', False)]."""
+	return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def _reverse_ordering(ordering):
+	return [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+
+
+def encode_cursor(values):
+	"""Encode a list of ordering values as an opaque, URL-safe cursor."""
+	raw = json.dumps(values, separators=(',', ':'), default=str)
+	return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+	"""Decode a cursor produced by encode_cursor back into a list of values."""
+	try:
+		padded = cursor + '=' * (-len(cursor) % 4)
+		values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+	except (ValueError, TypeError) as exc:
+		raise InvalidCursor(cursor) from exc
+	if not isinstance(values, list):
+		raise InvalidCursor(cursor)
+	return values
+
+
+class KeysetPage:
+	"""A single page of results plus the cursors needed to move around it."""
+
+	def __init__(self, object_list, paginator, next_cursor, previous_cursor, total_count):
+		self.object_list = object_list
+		self.paginator = paginator
+		self.next_cursor = next_cursor
+		self.previous_cursor = previous_cursor
+		self.total_count = total_count
+		self.next_query = ''
+		self.previous_query = ''
+
+	def __iter__(self):
+		return iter(self.object_list)
+
+	def __len__(self):
+		return len(self.object_list)
+
+	def __getitem__(self, index):
+		return self.object_list[index]
+
+	@property
+	def has_next(self):
+		return self.next_cursor is not None
+
+	@property
+	def has_previous(self):
+		return self.previous_cursor is not None
+
+	@property
+	def has_other_pages(self):
+		return self.has_next or self.has_previous
+
+
+def _querystring(params, **cursor):
+	"""Rebuild a query string from ``params`` with the cursor swapped in."""
+	query = [
+		(key, value)
+		for key, values in params.lists()
+		if key not in ('after', 'before')
+		for value in values
+		if value != ''
+	]
+	query.extend((key, value) for key, value in cursor.items() if value)
+	return urlencode(query)
+
+
+class KeysetPaginator:
+	"""
+	Cursor pagination over a fixed, unique ordering.
+
+	Instead of OFFSET, each page is fetched with a ``WHERE (a, b) < (x, y)``
+	style predicate built from the last row of the previous page, so the cost
+	of a page depends only on the page size. The last ordering field must be
+	unique (usually ``id``) so that ties are broken deterministically.
+	"""
+
+	def __init__(self, queryset, ordering, per_page=None, count=None):
+		self.queryset = queryset
+		self.ordering = list(ordering)
+		self.fields = _split_ordering(self.ordering)
+		self.per_page = per_page or getattr(settings, 'KEYSET_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+		if count is None:
+			count = getattr(settings, 'KEYSET_COUNT_TOTAL', True)
+		self.count = count
+
+	def _to_python(self, name, value):
+		opts = self.queryset.model._meta
+		try:
+			field = opts.pk if name == 'pk' else opts.get_field(name)
+		except FieldDoesNotExist:
+			# Annotations (e.g. a search rank) are stored as plain JSON values.
+			return value
+		try:
+			return field.to_python(value)
+		except ValidationError as exc:
+			raise InvalidCursor(value) from exc
+
+	def _values(self, obj):
+		values = []
+		for name, _descending in self.fields:
+			value = getattr(obj, name)
+			if hasattr(value, 'isoformat'):
+				value = value.isoformat()
+			values.append(value)
+		return values
+
+	def _seek(self, cursor, backwards=False):
+		"""Build the Q object selecting rows strictly after (or before) cursor."""
+		values = decode_cursor(cursor)
+		if len(values) != len(self.fields):
+			raise InvalidCursor(cursor)
+		values = [self._to_python(name, value) for (name, _), value in zip(self.fields, values)]
+
+		condition = Q()
+		for index, (name, descending) in enumerate(self.fields):
+			# Moving forward on a descending column means "less than".
+			lookup = 'lt' if descending != backwards else 'gt'
+			branch = Q(**{f'{name}__{lookup}': values[index]})
+			for prev_index, (prev_name, _) in enumerate(self.fields[:index]):
+				branch &= Q(**{prev_name: values[prev_index]})
+			condition |= branch
+		return condition
+
+	def page(self, after=None, before=None):
+		"""Return the page after ``after`` or before ``before`` (first page if neither)."""
+		queryset = self.queryset
+		backwards = bool(before) and not after
+		try:
+			if after:
+				queryset = queryset.filter(self._seek(after))
+			elif before:
+				queryset = queryset.filter(self._seek(before, backwards=True))
+		except InvalidCursor:
+			# A tampered or stale cursor just starts over from the first page.
+			after = before = None
+			backwards = False
+			queryset = self.queryset
+
+		ordering = _reverse_ordering(self.ordering) if backwards else self.ordering
+		rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+		has_more = len(rows) > self.per_page
+		rows = rows[:self.per_page]
+		if backwards:
+			rows.reverse()
+
+		next_cursor = previous_cursor = None
+		if rows:
+			if backwards:
+				next_cursor = encode_cursor(self._values(rows[-1]))
+				if has_more:
+					previous_cursor = encode_cursor(self._values(rows[0]))
+			else:
+				if has_more:
+					next_cursor = encode_cursor(self._values(rows[-1]))
+				if after:
+					previous_cursor = encode_cursor(self._values(rows[0]))
+
+		total_count = count_total(self.queryset, self.count)
+		return KeysetPage(rows, self, next_cursor, previous_cursor, total_count)
+
+
+def count_total(queryset, count=None):
+	"""The total a KeysetPaginator reports for ``queryset``; None when counting is off."""
+	if count is None:
+		count = getattr(settings, 'KEYSET_COUNT_TOTAL', True)
+	return queryset.count() if count else None
+
+
+def paginate(request, queryset, ordering, per_page=None, count=None):
+	"""
+	Paginate ``queryset`` using the ``after``/``before`` cursors in request.GET.
+
+	The returned page carries ``next_query`` and ``previous_query`` so templates
+	can link to neighbouring pages while keeping every active filter.
+	"""
+	paginator = KeysetPaginator(queryset, ordering, per_page=per_page, count=count)
+	page = paginator.page(
+		after=request.GET.get('after') or None,
+		before=request.GET.get('before') or None,
+	)
+	page.next_query = _querystring(request.GET, after=page.next_cursor) if page.has_next else ''
+	page.previous_query = _querystring(request.GET, before=page.previous_cursor) if page.has_previous else ''
+	return page
+
+
+async def apaginate(request, queryset, ordering, per_page=None, count=None):
+	"""paginate() for async views: the page and its COUNT are fetched at the same time."""
+	page, total = await gather_blocking(
+		lambda: paginate(request, queryset, ordering, per_page=per_page, count=False),
+		lambda: count_total(queryset, count),
+	)
+	page.total_count = total
+	return page
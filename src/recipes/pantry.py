@@ -0,0 +1,183 @@
+"""
+"What can I cook" matching over ingredient posting lists.
+
+For every ingredient the index keeps the sorted ids of the recipes that use
+it, plus the number of ingredients each recipe has. Matching a pantry
+concatenates the pantry's posting lists and counts hits per recipe with
+numpy, so scoring the whole catalog is a few vectorised passes over the
+postings instead of a query joining every recipe to its ingredients.
+"""
+from django.conf import settings
+
+from .indexing import InProcessIndex
+from .models import Recipe, RecipeIngredient
+from .versioning import register_bulk_scope
+
+
+PANTRY_SCOPE = register_bulk_scope('pantry')
+
+DEFAULT_PANTRY_MAX_INGREDIENTS = 50
+DEFAULT_PANTRY_RESULTS_LIMIT = 50
+
+
+class PantryMatch:
+	"""A recipe scored against a pantry."""
+
+	def __init__(self, recipe_id, have, total):
+		self.recipe_id = recipe_id
+		self.have = have
+		self.total = total
+		# Filled in by load_matches()
+		self.recipe = None
+		self.missing_ingredients = []
+
+	@property
+	def missing(self):
+		return self.total - self.have
+
+	@property
+	def coverage(self):
+		return self.have / self.total
+
+	def __repr__(self):
+		return f'<PantryMatch recipe={self.recipe_id} {self.have}/{self.total}>'
+
+
+class PantryIndex(InProcessIndex):
+	"""Ingredient -> recipe posting lists, kept as sorted numpy arrays."""
+
+	scope = PANTRY_SCOPE
+
+	def __init__(self):
+		super().__init__()
+		self.postings = {}
+		self.sizes = None  # ingredient count per recipe id
+
+	def build(self):
+		import numpy as np
+
+		rows = RecipeIngredient.objects.order_by('ingredient_id', 'recipe_id').values_list('ingredient_id', 'recipe_id')
+		pairs = np.fromiter(
+			(value for row in rows.iterator(chunk_size=20000) for value in row), dtype=np.int64,
+		).reshape(-1, 2)
+		ingredients, recipes = pairs[:, 0], pairs[:, 1]
+		# Rows arrive grouped by ingredient, so each posting list is a slice
+		starts = np.flatnonzero(np.diff(ingredients, prepend=-1)) if len(ingredients) else []
+		ends = list(starts[1:]) + [len(ingredients)]
+		self.postings = {
+			int(ingredients[start]): recipes[start:end].astype(np.int32) for start, end in zip(starts, ends)
+		}
+		self.sizes = np.bincount(recipes, minlength=1).astype(np.int32)
+
+	def _ensure_size(self, recipe_id):
+		import numpy as np
+		if recipe_id >= len(self.sizes):
+			self.sizes = np.concatenate([self.sizes, np.zeros(recipe_id + 1 - len(self.sizes), dtype=np.int32)])
+
+	def _add(self, recipe_id, ingredient_id):
+		import numpy as np
+		postings = self.postings.get(ingredient_id)
+		if postings is None:
+			postings = np.empty(0, dtype=np.int32)
+		position = np.searchsorted(postings, recipe_id)
+		if position < len(postings) and postings[position] == recipe_id:
+			return
+		self.postings[ingredient_id] = np.insert(postings, position, recipe_id)
+		self._ensure_size(recipe_id)
+		self.sizes[recipe_id] += 1
+
+	def _remove(self, recipe_id, ingredient_id):
+		import numpy as np
+		postings = self.postings.get(ingredient_id)
+		if postings is None:
+			return
+		position = np.searchsorted(postings, recipe_id)
+		if position == len(postings) or postings[position] != recipe_id:
+			return
+		postings = np.delete(postings, position)
+		if len(postings):
+			self.postings[ingredient_id] = postings
+		else:
+			del self.postings[ingredient_id]
+		self.sizes[recipe_id] -= 1
+
+	# Incremental updates, called from recipes.signals
+
+	def link_added(self, recipe_id, ingredient_id):
+		self.update('_add', recipe_id, ingredient_id)
+
+	def link_removed(self, recipe_id, ingredient_id):
+		self.update('_remove', recipe_id, ingredient_id)
+
+	def link_moved(self, old, new):
+		self.update('_move', old, new)
+
+	def _move(self, old, new):
+		self._remove(*old)
+		self._add(*new)
+
+	def match(self, ingredient_ids, max_missing=None, offset=0, limit=None):
+		"""
+		Rank the recipes using any of ``ingredient_ids``; return ``(count, matches)``.
+
+		Recipes are ordered by coverage (the share of their ingredients in the
+		pantry), then by fewest missing ingredients, then newest id first.
+		Only the ``offset:offset + limit`` slice is turned into PantryMatch
+		objects.
+		"""
+		import numpy as np
+
+		self.ensure()
+		with self._lock:
+			lists = [self.postings[pk] for pk in set(ingredient_ids) if pk in self.postings]
+			if not lists:
+				return 0, []
+			hits = np.bincount(np.concatenate(lists), minlength=len(self.sizes))
+			recipe_ids = np.flatnonzero(hits)
+			have = hits[recipe_ids]
+			total = self.sizes[recipe_ids]
+		missing = total - have
+		if max_missing is not None:
+			keep = missing <= max_missing
+			recipe_ids, have, total, missing = recipe_ids[keep], have[keep], total[keep], missing[keep]
+		# lexsort sorts by its last key first
+		order = np.lexsort((-recipe_ids, missing, -(have / total)))
+		end = None if limit is None else offset + limit
+		return len(order), [
+			PantryMatch(int(recipe_ids[i]), int(have[i]), int(total[i])) for i in order[offset:end]
+		]
+
+
+def max_pantry_size():
+	return getattr(settings, 'PANTRY_MAX_INGREDIENTS', DEFAULT_PANTRY_MAX_INGREDIENTS)
+
+
+def load_matches(matches, ingredient_ids):
+	"""
+	Attach each match's recipe and the ingredients it still needs.
+
+	Two queries however many matches there are: one for the recipes and one
+	for their ingredient lines that are not in the pantry.
+	"""
+	recipe_ids = [match.recipe_id for match in matches]
+	recipes = Recipe.objects.select_related('category').in_bulk(recipe_ids)
+	missing = {}
+	lines = (
+		RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+		.exclude(ingredient_id__in=ingredient_ids)
+		.select_related('ingredient').order_by('ingredient__name')
+	)
+	for line in lines:
+		missing.setdefault(line.recipe_id, []).append(line.ingredient)
+	for match in matches:
+		match.recipe = recipes.get(match.recipe_id)
+		match.missing_ingredients = missing.get(match.recipe_id, [])
+	# A recipe deleted since the index was built has no row any more
+	return [match for match in matches if match.recipe is not None]
+
+
+_index = PantryIndex()
+
+
+def get_index():
+	return _index
@@ -0,0 +1,98 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import RecipeIngredient
+from .search import search_recipes
+
+
+DEFAULT_SEARCH_RESULTS_LIMIT = 500
+
+RESULT_FIELDS = (
+	'pk', 'title', 'category_name', 'author_name', 'ingredient_count', 'total_minutes',
+)
+
+SearchResults = namedtuple('SearchResults', 'rows count truncated')
+
+
+def apply_search_filters(queryset, cleaned_data):
+	"""
+	Apply RecipeSearchForm filters to ``queryset``.
+
+	Returns ``(queryset, ranked)``; ``ranked`` is True when a name search was
+	applied and the queryset carries a ``search_rank`` annotation. The
+	ingredient filter uses a subquery rather than a join so rows are never
+	duplicated and no DISTINCT is needed.
+	"""
+	ranked = False
+
+	# Recipe name: any term, prefix matching, ranked by BM25
+	recipe_name = cleaned_data.get('recipe_name')
+	if recipe_name:
+		queryset = search_recipes(queryset, recipe_name, any_term=True)
+		ranked = True
+
+	ingredient = cleaned_data.get('ingredient')
+	if ingredient:
+		queryset = queryset.filter(
+			pk__in=RecipeIngredient.objects.filter(ingredient=ingredient).values('recipe_id')
+		)
+
+	category = cleaned_data.get('category')
+	if category:
+		queryset = queryset.filter(category=category)
+
+	min_time = cleaned_data.get('min_time')
+	if min_time:
+		queryset = queryset.filter(total_time_minutes__gte=min_time)
+
+	max_time = cleaned_data.get('max_time')
+	if max_time:
+		queryset = queryset.filter(total_time_minutes__lte=max_time)
+
+	return queryset, ranked
+
+
+def order_results(queryset, ranked):
+	"""Best matches first for name searches, newest first otherwise."""
+	if ranked:
+		return queryset.order_by('search_rank', '-created_at', '-pk')
+	return queryset.order_by('-created_at', '-pk')
+
+
+def result_rows(queryset):
+	"""
+	Flat result rows with every displayed column computed in the same query.
+
+	Each row is a dict with the keys in RESULT_FIELDS. Ingredients are
+	counted in a subquery rather than a join and GROUP BY: SQLite cannot
+	evaluate a search's bm25() rank in an aggregate query.
+	"""
+	lines = RecipeIngredient.objects.filter(recipe=OuterRef('pk')).order_by().values('recipe')
+	return queryset.annotate(
+		category_name=F('category__name'),
+		author_name=F('author__username'),
+		ingredient_count=Coalesce(Subquery(lines.annotate(n=Count('pk')).values('n')), 0),
+		total_minutes=F('total_time_minutes'),
+	).values(*RESULT_FIELDS)
+
+
+def build_results(queryset, limit=None):
+	"""
+	Fetch at most ``limit`` result rows in a single query.
+
+	The total is only counted separately when the limit is hit, so memory is
+	bounded by the limit and small result sets cost exactly one query.
+	"""
+	if limit is None:
+		limit = getattr(settings, 'SEARCH_RESULTS_LIMIT', DEFAULT_SEARCH_RESULTS_LIMIT)
+	rows = list(result_rows(queryset)[:limit + 1])
+	truncated = len(rows) > limit
+	if truncated:
+		rows = rows[:limit]
+		count = queryset.order_by().count()
+	else:
+		count = len(rows)
+	return SearchResults(rows, count, truncated)
@@ -0,0 +1,153 @@
+"""
+Primary/replica database routing and SQLite connection tuning.
+
+Writes always go to the primary (``default``). Reads of the REPLICA_APPS
+models (the catalog) go to one of the DATABASE_REPLICAS aliases only while a
+view decorated with use_replica() runs, and even then they stay on the
+primary when:
+
+- the primary connection is inside a transaction, whose rows the replicas
+  cannot see yet;
+- the request has already written to a REPLICA_APPS model;
+- the session wrote to one within the last REPLICA_PIN_SECONDS.
+  DatabaseRoutingMiddleware marks that with a cookie, so a user always
+  reads their own writes.
+
+Sessions, users and the other contrib models are always read from the
+primary, so the session saves and last_login updates of ordinary signed-in
+traffic neither pin it nor need pinning.
+"""
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PIN_COOKIE = 'primary_until'
+DEFAULT_REPLICA_PIN_SECONDS = 5
+
+
+class RoutingState:
+	"""How the current request may route its reads."""
+
+	def __init__(self, pinned=False):
+		self.pinned = pinned
+		self.replica_reads = False
+		self.wrote = False
+
+
+# One RoutingState per request; the object is shared with the threads an
+# async view hands work to, so a write on any of them pins the rest.
+_routing = ContextVar('db_routing', default=None)
+
+
+def replicas():
+	return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def replica_apps():
+	return getattr(settings, 'REPLICA_APPS', [])
+
+
+def pin_seconds():
+	return getattr(settings, 'REPLICA_PIN_SECONDS', DEFAULT_REPLICA_PIN_SECONDS)
+
+
+def is_pinned(request, now=None):
+	"""True while the session's last write is younger than REPLICA_PIN_SECONDS."""
+	try:
+		until = float(request.COOKIES.get(PIN_COOKIE, 0))
+	except ValueError:
+		return False
+	return until > (now if now is not None else time.time())
+
+
+def begin_request(pinned):
+	"""Install a RoutingState for this context; returns ``(state, token)``."""
+	state = RoutingState(pinned)
+	return state, _routing.set(state)
+
+
+def end_request(token):
+	_routing.reset(token)
+
+
+def use_replica(view):
+	"""Let ``view`` (sync or async) read from the replicas."""
+	if iscoroutinefunction(view):
+		@wraps(view)
+		async def async_wrapper(request, *args, **kwargs):
+			_allow_replica_reads()
+			return await view(request, *args, **kwargs)
+		return async_wrapper
+
+	@wraps(view)
+	def wrapper(request, *args, **kwargs):
+		_allow_replica_reads()
+		return view(request, *args, **kwargs)
+	return wrapper
+
+
+def _allow_replica_reads():
+	state = _routing.get()
+	if state is not None:
+		state.replica_reads = True
+
+
+class PrimaryReplicaRouter:
+	"""Route reads to a replica when the current request allows it; everything else to the primary."""
+
+	def db_for_read(self, model, **hints):
+		state = _routing.get()
+		if state is None or not state.replica_reads or state.pinned or state.wrote:
+			return None
+		if model._meta.app_label not in replica_apps():
+			return None
+		aliases = replicas()
+		if not aliases or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+			return None
+		return random.choice(aliases)
+
+	def db_for_write(self, model, **hints):
+		state = _routing.get()
+		if state is not None and model._meta.app_label in replica_apps():
+			state.wrote = True
+		return DEFAULT_DB_ALIAS
+
+	def allow_relation(self, obj1, obj2, **hints):
+		# Replicas hold the same rows as the primary
+		return True
+
+	def allow_migrate(self, db, app_label, model_name=None, **hints):
+		return db not in replicas()
+
+
+def configure_sqlite(sender, connection, **kwargs):
+	"""
+	connection_created receiver applying SQLITE_PRAGMAS to new connections.
+
+	They are run on the DB-API connection, so they are not counted as the
+	request's queries. Only per-connection settings are applied here: the
+	journal mode belongs to the database file and is switched once with
+	``manage.py enable_wal``. synchronous=NORMAL is only crash-safe with a
+	write-ahead log, so it is skipped on files still using a rollback journal.
+	"""
+	if connection.vendor != 'sqlite':
+		return
+	execute = connection.connection.execute
+	pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+	if execute('PRAGMA journal_mode').fetchone()[0] != 'wal':
+		pragmas.pop('synchronous', None)
+	for pragma, value in pragmas.items():
+		execute(f'PRAGMA {pragma} = {value}')
+
+
+def enable_wal(connection):
+	"""Switch ``connection``'s database file to write-ahead logging; returns the resulting journal mode."""
+	with connection.cursor() as cursor:
+		cursor.execute('PRAGMA journal_mode = wal')
+		return cursor.fetchone()[0]
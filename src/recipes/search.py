@@ -0,0 +1,178 @@
+import re
+
+from django.db import connections, router
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+
+FTS_TABLE = 'recipes_recipe_fts'
+
+# bm25() column weights for (title, description, instructions)
+BM25_WEIGHTS = (10.0, 4.0, 1.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# (alias, database name) -> whether the FTS table exists there
+_available = {}
+
+# External-content FTS5 table kept in sync with recipes_recipe by triggers, so
+# saves, deletes, bulk_create() and raw updates are all reflected in the index.
+_SCHEMA = [
+	f"""
+	CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+		title, description, instructions,
+		content='recipes_recipe', content_rowid='id',
+		tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+	)
+	""",
+	f"""
+	CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON recipes_recipe BEGIN
+		INSERT INTO {FTS_TABLE}(rowid, title, description, instructions)
+		VALUES (new.id, new.title, new.description, new.instructions);
+	END
+	""",
+	f"""
+	CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON recipes_recipe BEGIN
+		INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, instructions)
+		VALUES ('delete', old.id, old.title, old.description, old.instructions);
+	END
+	""",
+	f"""
+	CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description, instructions
+	ON recipes_recipe BEGIN
+		INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, instructions)
+		VALUES ('delete', old.id, old.title, old.description, old.instructions);
+		INSERT INTO {FTS_TABLE}(rowid, title, description, instructions)
+		VALUES (new.id, new.title, new.description, new.instructions);
+	END
+	""",
+]
+
+_DROP = [
+	f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+	f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+	f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+	f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def supports_fts(connection):
+	"""Return True if the connection is SQLite with the FTS5 extension compiled in."""
+	if connection.vendor != 'sqlite':
+		return False
+	with connection.cursor() as cursor:
+		cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+		return bool(cursor.fetchone()[0])
+
+
+def install_index(connection):
+	"""
+	Create the FTS table and its sync triggers if they are missing.
+
+	SQLite migrations that alter recipes_recipe rebuild the table and drop its
+	triggers, so this is idempotent and also runs after every migrate.
+	"""
+	if not supports_fts(connection):
+		return False
+	with connection.cursor() as cursor:
+		cursor.execute(
+			"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+		)
+		created = cursor.fetchone() is None
+		for statement in _SCHEMA:
+			cursor.execute(statement)
+	if created:
+		rebuild_index(connection)
+	_available.clear()
+	return True
+
+
+def drop_index(connection):
+	"""Remove the FTS table and triggers."""
+	if connection.vendor != 'sqlite':
+		return
+	with connection.cursor() as cursor:
+		for statement in _DROP:
+			cursor.execute(statement)
+	_available.clear()
+
+
+def rebuild_index(connection=None):
+	"""Repopulate the FTS table from recipes_recipe from scratch."""
+	if connection is None:
+		connection = connections[router.db_for_write(Recipe)]
+	with connection.cursor() as cursor:
+		cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+		cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def index_available(using=None):
+	"""Return True if the FTS table exists on the given database alias."""
+	connection = connections[using or router.db_for_read(Recipe)]
+	if connection.vendor != 'sqlite':
+		return False
+	key = (connection.alias, str(connection.settings_dict['NAME']))
+	if key not in _available:
+		with connection.cursor() as cursor:
+			cursor.execute(
+				"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+			)
+			_available[key] = cursor.fetchone() is not None
+	return _available[key]
+
+
+def tokenize(text):
+	"""Split free text into lower-cased word tokens."""
+	return _TOKEN_RE.findall(text.lower())
+
+
+def build_match_expression(text, any_term=False):
+	"""
+	Turn user input into an FTS5 MATCH expression.
+
+	Every token becomes a quoted prefix query (``"chick"*``) so partial words
+	keep working. Tokens are ANDed by default, or ORed when ``any_term`` is set.
+	"""
+	terms = [f'"{token}"*' for token in dict.fromkeys(tokenize(text))]
+	return (' OR ' if any_term else ' ').join(terms)
+
+
+def search_recipes(queryset, text, any_term=False):
+	"""
+	Filter ``queryset`` to recipes matching ``text`` and annotate ``search_rank``.
+
+	Lower ``search_rank`` values are better matches (BM25). When the FTS index
+	is unavailable this falls back to ``icontains`` on title and description
+	with a constant rank.
+	"""
+	if not index_available(queryset.db):
+		return _search_fallback(queryset, text, any_term)
+
+	match = build_match_expression(text, any_term=any_term)
+	if not match:
+		return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+	# The FTS table is joined once: MATCH runs a single full-text query and
+	# bm25() reads the rank of the row it produced, instead of a correlated
+	# subquery repeating the MATCH for every recipe
+	table = Recipe._meta.db_table
+	weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+	return queryset.extra(
+		tables=[FTS_TABLE],
+		where=[f"{FTS_TABLE}.rowid = {table}.id", f"{FTS_TABLE} MATCH %s"],
+		params=[match],
+	).annotate(
+		search_rank=RawSQL(f"bm25({FTS_TABLE}, {weights})", (), output_field=FloatField())
+	)
+
+
+def _search_fallback(queryset, text, any_term):
+	if any_term:
+		query = Q()
+		for term in text.split():
+			query |= Q(title__icontains=term) | Q(description__icontains=term)
+	else:
+		query = Q(title__icontains=text) | Q(description__icontains=text)
+	return queryset.filter(query).annotate(search_rank=Value(0.0, output_field=FloatField()))
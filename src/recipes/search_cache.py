@@ -0,0 +1,140 @@
+"""
+In-process cache of recipe_search results.
+
+Searches are keyed on their normalized filters: name terms lowercased,
+deduplicated and sorted, models by primary key, blanks dropped. So "Chicken
+pie" and "pie chicken" share an entry, and the search is run on the
+normalized filters so the cached value depends on the key alone. Entries
+remember the SEARCH_SCOPE version they were computed under and are dropped
+when it has moved on; the model signals bump it. Each process keeps at most
+SEARCH_CACHE_SIZE entries, evicting the least recently used, and an entry
+expires SEARCH_CACHE_TIMEOUT seconds after it was stored.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Model
+
+from .search import tokenize
+from .versioning import get_version, register_bulk_scope
+
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SCOPE = register_bulk_scope('search-results')
+
+DEFAULT_SEARCH_CACHE_SIZE = 128
+DEFAULT_SEARCH_CACHE_TIMEOUT = 60 * 5
+
+# The key of an unfiltered search (show_all)
+ALL_RECIPES = ()
+
+
+def normalize_search(cleaned_data):
+	"""RecipeSearchForm.cleaned_data as a hashable, order-independent key."""
+	key = []
+	for name, value in sorted(cleaned_data.items()):
+		if name == 'recipe_name' and value:
+			# A name without any words still has to match nothing
+			value = ' '.join(sorted(set(tokenize(value)))) or value.strip().lower()
+		elif isinstance(value, Model):
+			value = value.pk
+		# Blank and zero filters are not applied, so they do not split entries
+		if value:
+			key.append((name, value))
+	return tuple(key)
+
+
+class ResultCache:
+	"""A bounded LRU mapping with a time-to-live, shared by the threads of a process."""
+
+	def __init__(self, max_entries=None, timeout=None, clock=time.monotonic):
+		self._max_entries = max_entries
+		self._timeout = timeout
+		self._clock = clock
+		self._entries = OrderedDict()  # key -> (expires, version, value), oldest first
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	@property
+	def max_entries(self):
+		if self._max_entries is not None:
+			return self._max_entries
+		return getattr(settings, 'SEARCH_CACHE_SIZE', DEFAULT_SEARCH_CACHE_SIZE)
+
+	@property
+	def timeout(self):
+		if self._timeout is not None:
+			return self._timeout
+		return getattr(settings, 'SEARCH_CACHE_TIMEOUT', DEFAULT_SEARCH_CACHE_TIMEOUT)
+
+	def __len__(self):
+		return len(self._entries)
+
+	def get(self, key, version):
+		"""``(True, value)`` for a live entry stored under ``version``, ``(False, None)`` otherwise."""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None:
+				expires, stored_version, value = entry
+				if stored_version == version and expires > self._clock():
+					self._entries.move_to_end(key)
+					self.hits += 1
+					return True, value
+				del self._entries[key]
+			self.misses += 1
+			return False, None
+
+	def set(self, key, version, value):
+		max_entries = self.max_entries
+		if max_entries <= 0:
+			return
+		with self._lock:
+			self._entries[key] = (self._clock() + self.timeout, version, value)
+			self._entries.move_to_end(key)
+			while len(self._entries) > max_entries:
+				self._entries.popitem(last=False)
+				self.evictions += 1
+
+	def get_or_set(self, key, compute):
+		"""
+		The value cached for ``key``, computing and storing it on a miss.
+
+		Returns ``(value, hit)``. The version is read before computing, so a
+		change made meanwhile leaves the entry already stale.
+		"""
+		version = get_version(SEARCH_SCOPE)
+		hit, value = self.get(key, version)
+		if not hit:
+			value = compute()
+			self.set(key, version, value)
+		logger.debug('search cache %s (%d hits, %d misses)', 'hit' if hit else 'miss', self.hits, self.misses)
+		return value, hit
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def stats(self):
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				'entries': len(self._entries),
+				'max_entries': self.max_entries,
+				'hits': self.hits,
+				'misses': self.misses,
+				'evictions': self.evictions,
+				'hit_rate': self.hits / lookups if lookups else 0.0,
+			}
+
+
+_cache = ResultCache()
+
+
+def get_cache():
+	return _cache
@@ -0,0 +1,228 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from categories.models import Category
+from ingredients.models import Ingredient
+
+from . import search
+from .api import RELATIONS_SCOPE
+from .chart_cache import CHART_SCOPE
+from .counts import adjust_counts, recipe_counts_changed
+from .fuzzy import get_index as get_fuzzy_index
+from .models import Recipe, RecipeIngredient
+from .page_cache import PAGE_SCOPE
+from .pantry import get_index as get_pantry_index
+from .search_cache import SEARCH_SCOPE
+from .similarity import refresh_on_commit as refresh_signature
+from .typeahead import get_index as get_typeahead_index
+from .versioning import bump_version
+
+
+def ensure_search_index(sender, using, **kwargs):
+	"""Recreate the FTS table/triggers after migrations that rebuilt recipes_recipe."""
+	search.install_index(connections[using])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_charts(sender, using, **kwargs):
+	"""
+	Any recipe or category change makes the cached charts stale. Like the
+	pages, charts are bumped again on commit: one rendered from the old rows
+	while the transaction was open would otherwise be kept as the new version.
+	"""
+	bump_version(CHART_SCOPE)
+	transaction.on_commit(lambda: bump_version(CHART_SCOPE), using=using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_relations(sender, **kwargs):
+	"""Related rows do not touch Recipe.updated_at, so API ETags key on this too."""
+	bump_version(RELATIONS_SCOPE)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_pages(sender, using, **kwargs):
+	"""
+	Cached pages and search results show all four models. Their scopes are
+	bumped straight away and again on commit, so a page rendered from the old
+	rows by another request while the transaction was open does not outlive it.
+	"""
+	bump_version(PAGE_SCOPE, SEARCH_SCOPE)
+	transaction.on_commit(lambda: bump_version(PAGE_SCOPE, SEARCH_SCOPE), using=using)
+
+
+@receiver(recipe_counts_changed)
+def invalidate_counted_pages(sender, **kwargs):
+	"""Repairs rewrite recipe_count with QuerySet.update(), which sends no post_save."""
+	bump_version(PAGE_SCOPE, SEARCH_SCOPE)
+
+
+def _remember(instance, attnames, update_fields, using):
+	"""
+	Stash the stored values of ``attnames`` before an update overwrites them.
+
+	They end up in ``instance._previous_values``, which every pre_save resets,
+	so post_save receivers can all read it without one consuming it.
+	"""
+	instance._previous_values = {}
+	if instance._state.adding or instance.pk is None:
+		return
+	if update_fields is not None:
+		attnames = [
+			attname for attname in attnames
+			if attname in update_fields or instance._meta.get_field(attname).name in update_fields
+		]
+	if not attnames:
+		return
+	previous = (
+		type(instance)._base_manager.using(using)
+		.filter(pk=instance.pk).values_list(*attnames).first()
+	)
+	if previous is not None:
+		instance._previous_values = dict(zip(attnames, previous))
+
+
+def _previous(instance, attname):
+	"""The stored value of ``attname`` before this save (the current one if unknown)."""
+	return getattr(instance, '_previous_values', {}).get(attname, getattr(instance, attname))
+
+
+def _count_move(model, instance, attname, created, using):
+	current = getattr(instance, attname)
+	if created:
+		adjust_counts(model, {current: 1}, using)
+		return
+	previous = _previous(instance, attname)
+	if previous != current:
+		adjust_counts(model, {previous: -1, current: 1}, using)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_fields(sender, instance, using, update_fields=None, **kwargs):
+	_remember(instance, ('category_id', 'title'), update_fields, using)
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe_category(sender, instance, created, using, **kwargs):
+	"""Keep Category.recipe_count in step with recipes being added or moved."""
+	_count_move(Category, instance, 'category_id', created, using)
+
+
+@receiver(post_delete, sender=Recipe)
+def uncount_recipe_category(sender, instance, using, **kwargs):
+	adjust_counts(Category, {instance.category_id: -1}, using)
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_recipe_ingredient(sender, instance, using, update_fields=None, **kwargs):
+	_remember(instance, ('recipe_id', 'ingredient_id'), update_fields, using)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def count_recipe_ingredient(sender, instance, created, using, **kwargs):
+	"""Keep Ingredient.recipe_count in step with ingredient lines."""
+	_count_move(Ingredient, instance, 'ingredient_id', created, using)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def uncount_recipe_ingredient(sender, instance, using, **kwargs):
+	adjust_counts(Ingredient, {instance.ingredient_id: -1}, using)
+
+
+# The in-process indexes share their changes through a log in the cache, so
+# they are only told once the transaction commits: a rolled back change must
+# not reach them. Values are read now; the instance may change (or lose its
+# pk, once deleted) before the commit.
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient_name(sender, instance, using, **kwargs):
+	pk, name = instance.pk, instance.name
+	transaction.on_commit(lambda: _ingredient_saved(pk, name), using=using)
+
+
+@receiver(post_delete, sender=Ingredient)
+def unindex_ingredient_name(sender, instance, using, **kwargs):
+	pk = instance.pk
+	transaction.on_commit(lambda: _ingredient_deleted(pk), using=using)
+
+
+def _ingredient_saved(pk, name):
+	get_typeahead_index().ingredient_saved(pk, name)
+	get_fuzzy_index().ingredient_saved(pk, name)
+
+
+def _ingredient_deleted(pk):
+	get_typeahead_index().ingredient_deleted(pk)
+	get_fuzzy_index().ingredient_deleted(pk)
+
+
+@receiver(recipe_counts_changed, sender=Ingredient)
+def index_ingredient_counts(sender, deltas, using, **kwargs):
+	if deltas is None:
+		transaction.on_commit(lambda: get_typeahead_index().invalidate(), using=using)
+	else:
+		transaction.on_commit(lambda: get_typeahead_index().ingredient_counts_changed(deltas), using=using)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe_title(sender, instance, created, using, **kwargs):
+	"""Keep the typeahead's and the fuzzy search's titles in step with recipes being added or renamed."""
+	previous = None if created else _previous(instance, 'title')
+	title = instance.title
+	if created or previous != title:
+		transaction.on_commit(lambda: _title_changed(previous, title), using=using)
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe_title(sender, instance, using, **kwargs):
+	title = instance.title
+	transaction.on_commit(lambda: _title_changed(title, None), using=using)
+
+
+def _title_changed(old, new):
+	get_typeahead_index().title_changed(old, new)
+	get_fuzzy_index().title_changed(old, new)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def index_recipe_ingredient(sender, instance, created, using, **kwargs):
+	"""Keep the pantry posting lists in step with ingredient lines."""
+	current = (instance.recipe_id, instance.ingredient_id)
+	if created:
+		transaction.on_commit(lambda: get_pantry_index().link_added(*current), using=using)
+		return
+	previous = (_previous(instance, 'recipe_id'), _previous(instance, 'ingredient_id'))
+	if previous != current:
+		transaction.on_commit(lambda: get_pantry_index().link_moved(previous, current), using=using)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def unindex_recipe_ingredient(sender, instance, using, **kwargs):
+	link = (instance.recipe_id, instance.ingredient_id)
+	transaction.on_commit(lambda: get_pantry_index().link_removed(*link), using=using)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def refresh_recipe_signature(sender, instance, using, **kwargs):
+	"""Recompute the MinHash signature of recipes whose ingredient set changed."""
+	refresh_signature(instance.recipe_id, using)
+	previous = _previous(instance, 'recipe_id')
+	if previous != instance.recipe_id:
+		refresh_signature(previous, using)
@@ -0,0 +1,266 @@
+"""
+Similar recipes by ingredient overlap, using MinHash and LSH.
+
+Each recipe's ingredient set is summarised by SIMILARITY_HASHES MinHash values
+(RecipeSignature); the share of positions where two signatures agree
+estimates the Jaccard similarity of the two sets. The signature is cut into
+SIMILARITY_BANDS bands and each band is hashed into a RecipeBucket row, so
+recipes that are likely to be similar share at least one bucket and can be
+found with an indexed lookup instead of comparing against every recipe.
+
+Finding the neighbours of one recipe reads at most SIMILARITY_MAX_CANDIDATES
+bucket rows and as many signatures, however large the catalog or a bucket
+gets, and the result is cached until ingredient lines change.
+"""
+import hashlib
+import random
+from array import array
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+
+from .models import Recipe, RecipeBucket, RecipeIngredient, RecipeSignature
+from .versioning import bump_version, get_version, register_bulk_scope
+
+
+SIMILAR_SCOPE = register_bulk_scope('similar-recipes')
+SIMILAR_KEY = 'recipes:similar:{pk}:{version}'
+
+SIMILARITY_HASHES = 64
+SIMILARITY_BANDS = 16
+ROWS_PER_BAND = SIMILARITY_HASHES // SIMILARITY_BANDS
+
+DEFAULT_SIMILAR_RECIPES_LIMIT = 6
+DEFAULT_SIMILARITY_MAX_CANDIDATES = 300
+
+# h_i(x) = (a_i * x + b_i) mod p, with p the Mersenne prime 2**31 - 1 so that
+# a_i * x stays inside int64 for numpy.
+_PRIME = (1 << 31) - 1
+_rng = random.Random(20240611)
+_A = [_rng.randrange(1, _PRIME) for _ in range(SIMILARITY_HASHES)]
+_B = [_rng.randrange(0, _PRIME) for _ in range(SIMILARITY_HASHES)]
+
+
+def _setting(name, default):
+	return getattr(settings, name, default)
+
+
+def minhash(ingredient_ids):
+	"""The MinHash signature of a non-empty set of ingredient ids."""
+	return array('I', (
+		min((a * x + b) % _PRIME for x in ingredient_ids) for a, b in zip(_A, _B)
+	))
+
+
+def minhash_many(groups):
+	"""
+	Signatures for many ingredient-id lists at once, vectorised with numpy.
+
+	Returns a ``(len(groups), SIMILARITY_HASHES)`` uint32 array whose rows equal
+	minhash() of each group.
+	"""
+	import numpy as np
+
+	lengths = np.fromiter((len(group) for group in groups), dtype=np.int64, count=len(groups))
+	ids = np.fromiter((x for group in groups for x in group), dtype=np.int64, count=int(lengths.sum()))
+	hashes = (ids[:, None] * np.array(_A, dtype=np.int64) + np.array(_B, dtype=np.int64)) % _PRIME
+	starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+	return np.minimum.reduceat(hashes, starts, axis=0).astype(np.uint32)
+
+
+def bands(signature):
+	"""``(band, bucket)`` pairs for a signature (an array('I') or uint32 row)."""
+	data = signature.tobytes()
+	width = ROWS_PER_BAND * 4
+	return [
+		(band, int.from_bytes(
+			hashlib.blake2b(data[band * width:(band + 1) * width], digest_size=8).digest(), 'big', signed=True,
+		))
+		for band in range(SIMILARITY_BANDS)
+	]
+
+
+def agreement(signature, other):
+	"""Estimated Jaccard similarity: the share of positions where two signatures agree."""
+	return sum(1 for mine, theirs in zip(signature, other) if mine == theirs) / SIMILARITY_HASHES
+
+
+def _load(data):
+	signature = array('I')
+	signature.frombytes(bytes(data))
+	return signature
+
+
+def _insert(model, columns, rows, using):
+	"""INSERT ``rows`` with one executemany(); much cheaper than bulk_create() for millions of tiny rows."""
+	connection = connections[using]
+	quote = connection.ops.quote_name
+	sql = (
+		f'INSERT INTO {quote(model._meta.db_table)} ({", ".join(quote(column) for column in columns)}) '
+		f'VALUES ({", ".join(["%s"] * len(columns))})'
+	)
+	with connection.cursor() as cursor:
+		cursor.executemany(sql, rows)
+
+
+def store_signatures(signatures, using=DEFAULT_DB_ALIAS, replace=True):
+	"""
+	Save ``{recipe_id: signature}`` with their LSH buckets.
+
+	With ``replace`` the recipes' old rows are deleted first; bulk loads of
+	new recipes pass False to skip that.
+	"""
+	recipe_ids = list(signatures)
+	if replace:
+		for start in range(0, len(recipe_ids), 500):
+			chunk = recipe_ids[start:start + 500]
+			RecipeBucket.objects.using(using).filter(recipe_id__in=chunk).delete()
+			RecipeSignature.objects.using(using).filter(recipe_id__in=chunk).delete()
+	_insert(
+		RecipeSignature, ('recipe_id', 'minhash'),
+		[(int(pk), signature.tobytes()) for pk, signature in signatures.items()], using,
+	)
+	_insert(
+		RecipeBucket, ('recipe_id', 'band', 'bucket'),
+		[(int(pk), band, bucket) for pk, signature in signatures.items() for band, bucket in bands(signature)], using,
+	)
+
+
+def refresh_signatures(recipe_ids, using=DEFAULT_DB_ALIAS):
+	"""Recompute the signatures of ``recipe_ids`` from their ingredient lines."""
+	recipe_ids = list(recipe_ids)
+	groups = {}
+	for start in range(0, len(recipe_ids), 500):
+		lines = RecipeIngredient.objects.using(using).filter(recipe_id__in=recipe_ids[start:start + 500])
+		for recipe_id, ingredient_id in lines.values_list('recipe_id', 'ingredient_id'):
+			groups.setdefault(recipe_id, []).append(ingredient_id)
+	with transaction.atomic(using=using):
+		# Recipes left without ingredients lose their signature
+		store_signatures({pk: minhash(ids) for pk, ids in groups.items()}, using)
+		empty = [pk for pk in recipe_ids if pk not in groups]
+		if empty:
+			RecipeBucket.objects.using(using).filter(recipe_id__in=empty).delete()
+			RecipeSignature.objects.using(using).filter(recipe_id__in=empty).delete()
+	bump_version(SIMILAR_SCOPE)
+
+
+class _PendingRefresh:
+	"""An on_commit() callback refreshing the signatures of the recipes in ``ids``, once."""
+
+	def __init__(self, using):
+		self.using = using
+		self.ids = set()
+
+	def __call__(self):
+		recipe_ids, self.ids = self.ids, None
+		if recipe_ids:
+			refresh_signatures(recipe_ids, self.using)
+
+
+def refresh_on_commit(recipe_id, using=DEFAULT_DB_ALIAS):
+	"""
+	Refresh a recipe's signature once the current transaction commits.
+
+	Ids are collected in one on_commit() callback per atomic block, so saving
+	a recipe with ten ingredient lines in one transaction refreshes it once.
+	Rolling a block back discards its callbacks, and with them its ids.
+	Outside a transaction the refresh happens straight away.
+	"""
+	connection = connections[using]
+	if not connection.in_atomic_block:
+		refresh_signatures({recipe_id}, using)
+		return
+	# Callbacks are registered with the savepoints open at the time, and
+	# dropped when one of those savepoints is rolled back
+	savepoints = set(connection.savepoint_ids)
+	for callback_savepoints, callback, *_ in connection.run_on_commit:
+		if isinstance(callback, _PendingRefresh) and callback.ids is not None and callback_savepoints == savepoints:
+			callback.ids.add(recipe_id)
+			return
+	pending = _PendingRefresh(using)
+	pending.ids.add(recipe_id)
+	transaction.on_commit(pending, using=using)
+
+
+def rebuild_signatures(using=DEFAULT_DB_ALIAS, batch_size=5000, progress=None):
+	"""Recompute every signature from scratch; returns the number of recipes signed."""
+	with transaction.atomic(using=using):
+		RecipeBucket.objects.using(using).all().delete()
+		RecipeSignature.objects.using(using).all().delete()
+		lines = (
+			RecipeIngredient.objects.using(using).order_by('recipe_id')
+			.values_list('recipe_id', 'ingredient_id').iterator(chunk_size=20000)
+		)
+		done = 0
+		batch, current, ids = {}, None, []
+		for recipe_id, ingredient_id in lines:
+			if recipe_id != current:
+				if ids:
+					batch[current] = ids
+				current, ids = recipe_id, []
+				if len(batch) >= batch_size:
+					done += _store_batch(batch, using)
+					batch = {}
+					if progress:
+						progress(done)
+			ids.append(ingredient_id)
+		if ids:
+			batch[current] = ids
+		if batch:
+			done += _store_batch(batch, using)
+	bump_version(SIMILAR_SCOPE)
+	return done
+
+
+def _store_batch(groups, using):
+	matrix = minhash_many(list(groups.values()))
+	store_signatures(dict(zip(groups, matrix)), using, replace=False)
+	return len(groups)
+
+
+def find_similar(recipe_id, limit=None, using=None):
+	"""
+	Ids of up to ``limit`` recipes most similar to ``recipe_id``, best first.
+
+	Candidates are the recipes sharing an LSH bucket with it (at most
+	SIMILARITY_MAX_CANDIDATES bucket rows are read); they are ranked by how
+	many signature positions agree, ties broken by newest first. With no
+	``using`` the database router picks the connection.
+	"""
+	if limit is None:
+		limit = _setting('SIMILAR_RECIPES_LIMIT', DEFAULT_SIMILAR_RECIPES_LIMIT)
+	row = RecipeSignature.objects.using(using).filter(recipe_id=recipe_id).values_list('minhash', flat=True).first()
+	if row is None:
+		return []
+	signature = _load(row)
+	lookup = reduce(or_, (Q(band=band, bucket=bucket) for band, bucket in bands(signature)))
+	# No ORDER BY, so SQLite can stop reading as soon as it has enough rows
+	candidates = set(
+		RecipeBucket.objects.using(using).filter(lookup).exclude(recipe_id=recipe_id)
+		.order_by().values_list('recipe_id', flat=True)[:_setting('SIMILARITY_MAX_CANDIDATES', DEFAULT_SIMILARITY_MAX_CANDIDATES)]
+	)
+	if not candidates:
+		return []
+	scored = [
+		(agreement(signature, _load(data)), pk)
+		for pk, data in RecipeSignature.objects.using(using).filter(recipe_id__in=candidates).values_list('recipe_id', 'minhash')
+	]
+	scored.sort(reverse=True)
+	return [pk for score, pk in scored[:limit] if score > 0]
+
+
+def similar_recipes(recipe, limit=None):
+	"""The recipes to show next to ``recipe``; neighbour ids are cached per data version."""
+	key = SIMILAR_KEY.format(pk=recipe.pk, version=get_version(SIMILAR_SCOPE))
+	ids = cache.get(key)
+	if ids is None:
+		ids = find_similar(recipe.pk, limit)
+		cache.set(key, ids, _setting('SIMILAR_RECIPES_CACHE_TIMEOUT', 60 * 60))
+	if not ids:
+		return []
+	found = Recipe.objects.select_related('category').in_bulk(ids)
+	return [found[pk] for pk in ids if pk in found]
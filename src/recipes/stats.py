@@ -0,0 +1,127 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count, F, Max, Min, Q
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+
+# Upper bounds (inclusive, in minutes) of every bucket but the last one
+DEFAULT_TIME_BUCKETS = (15, 45)
+
+# Hard cap on the number of points plotted in a growth chart
+DEFAULT_GROWTH_MAX_POINTS = 120
+
+GROWTH_RESOLUTIONS = {
+	'day': (TruncDay, 1),
+	'week': (TruncWeek, 7),
+	'month': (TruncMonth, 30),
+}
+
+TIME_FIELDS = {
+	'prep': lambda: F('prep_time_minutes'),
+	'cook': lambda: F('cook_time_minutes'),
+	'total': lambda: F('total_time_minutes'),
+}
+
+
+class TimeBucket(namedtuple('TimeBucket', 'lower upper count')):
+	"""
+	Recipes whose time is in ``(lower, upper]`` minutes.
+
+	``lower`` is None for the first bucket and ``upper`` is None for the last.
+	"""
+
+	@property
+	def label(self):
+		if self.lower is None:
+			return f'≤{self.upper} min'
+		if self.upper is None:
+			return f'>{self.lower} min'
+		return f'{self.lower + 1}-{self.upper} min'
+
+
+def time_bucket_edges():
+	"""Bucket edges from settings.RECIPE_TIME_BUCKETS, sorted and de-duplicated."""
+	edges = getattr(settings, 'RECIPE_TIME_BUCKETS', DEFAULT_TIME_BUCKETS)
+	return tuple(sorted(set(edges)))
+
+
+def time_bucket_counts(queryset, edges=None, field='total'):
+	"""
+	Count recipes per time bucket with a single aggregate query.
+
+	``field`` is one of 'prep', 'cook' or 'total'. ``edges`` are inclusive
+	upper bounds, so ``(15, 45)`` gives ≤15, 16-45 and >45 minutes.
+	Returns a list of TimeBucket, one per bucket, including empty ones.
+	"""
+	if field not in TIME_FIELDS:
+		raise ValueError(f"Unknown time field {field!r}; expected one of {sorted(TIME_FIELDS)}")
+	edges = tuple(sorted(set(edges))) if edges is not None else time_bucket_edges()
+	bounds = list(zip((None,) + edges, edges + (None,)))
+
+	aggregates = {}
+	for index, (lower, upper) in enumerate(bounds):
+		condition = Q()
+		if lower is not None:
+			condition &= Q(_minutes__gt=lower)
+		if upper is not None:
+			condition &= Q(_minutes__lte=upper)
+		aggregates[f'bucket_{index}'] = Count('pk', filter=condition)
+
+	row = queryset.order_by().alias(_minutes=TIME_FIELDS[field]()).aggregate(**aggregates)
+	return [
+		TimeBucket(lower, upper, row[f'bucket_{index}'])
+		for index, (lower, upper) in enumerate(bounds)
+	]
+
+
+GrowthSeries = namedtuple('GrowthSeries', 'dates totals resolution')
+
+
+def choose_resolution(first, last, max_points):
+	"""Pick the finest of day/week/month that fits the date range in max_points."""
+	span_days = (last - first).days + 1
+	for resolution, (_trunc, days) in GROWTH_RESOLUTIONS.items():
+		if span_days / days <= max_points:
+			return resolution
+	return 'month'
+
+
+def growth_series(queryset, max_points=None, resolution=None):
+	"""
+	Cumulative recipe count over time, bucketed in the database.
+
+	Rows are grouped by day, week or month (chosen from the date range unless
+	``resolution`` is given) with a single GROUP BY query, the running total is
+	computed with numpy, and the result is downsampled to at most
+	``max_points`` points so plotting cost has a fixed upper bound.
+	"""
+	import numpy as np
+
+	if max_points is None:
+		max_points = getattr(settings, 'RECIPE_GROWTH_MAX_POINTS', DEFAULT_GROWTH_MAX_POINTS)
+	max_points = max(int(max_points), 2)
+
+	queryset = queryset.order_by().filter(created_at__isnull=False)
+	bounds = queryset.aggregate(first=Min('created_at'), last=Max('created_at'))
+	if bounds['first'] is None:
+		return GrowthSeries([], np.array([], dtype=np.int64), resolution)
+
+	resolution = resolution or choose_resolution(bounds['first'], bounds['last'], max_points)
+	trunc, _days = GROWTH_RESOLUTIONS[resolution]
+	rows = (
+		queryset.annotate(period=trunc('created_at'))
+		.values('period')
+		.annotate(count=Count('pk'))
+		.order_by('period')
+		.values_list('period', 'count')
+	)
+	dates, counts = zip(*rows) if rows else ((), ())
+	totals = np.cumsum(np.fromiter(counts, dtype=np.int64, count=len(counts)))
+
+	if len(dates) > max_points:
+		# Evenly spaced indices that always keep the first and last point
+		keep = np.unique(np.linspace(0, len(dates) - 1, max_points).round().astype(np.int64))
+		dates = [dates[i] for i in keep]
+		totals = totals[keep]
+	return GrowthSeries(list(dates), totals, resolution)
@@ -0,0 +1,286 @@
+"""
+Reproducible synthetic catalogs for load testing and benchmarks.
+
+Everything is derived from a seeded ``random.Random``, so the same seed and
+sizes always produce the same rows. Rows are written with ``bulk_create`` in
+batches, one transaction per batch, with the FTS triggers dropped for the
+duration and the index rebuilt once at the end.
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from categories.models import Category
+from ingredients.models import Ingredient
+
+from . import search
+from .counts import repair_all_counts
+from .models import Recipe, RecipeBucket, RecipeIngredient, RecipeSignature
+from .similarity import rebuild_signatures
+from .versioning import invalidate_bulk_change
+
+
+BASE_INGREDIENTS = [
+	'Salt', 'Black Pepper', 'Olive Oil', 'Butter', 'Garlic', 'Onion', 'Sugar', 'Flour',
+	'Eggs', 'Milk', 'Tomato', 'Lemon', 'Parsley', 'Basil', 'Oregano', 'Thyme',
+	'Rosemary', 'Cumin', 'Paprika', 'Chili Flakes', 'Ginger', 'Soy Sauce', 'Rice',
+	'Pasta', 'Chicken Breast', 'Ground Beef', 'Pork Shoulder', 'Salmon', 'Shrimp',
+	'Tofu', 'Chickpeas', 'Black Beans', 'Lentils', 'Potato', 'Carrot', 'Celery',
+	'Bell Pepper', 'Zucchini', 'Eggplant', 'Spinach', 'Kale', 'Mushrooms', 'Cheddar',
+	'Parmesan', 'Mozzarella', 'Feta', 'Cream', 'Yogurt', 'Honey', 'Vinegar',
+	'Coconut Milk', 'Cilantro', 'Lime', 'Avocado', 'Corn', 'Peas', 'Broccoli',
+	'Cauliflower', 'Cabbage', 'Apple', 'Banana', 'Strawberries', 'Blueberries',
+	'Oats', 'Almonds', 'Walnuts', 'Peanut Butter', 'Sesame Oil', 'Fish Sauce',
+	'Curry Paste', 'Tortillas', 'Bread', 'Vanilla', 'Cinnamon', 'Nutmeg', 'Cocoa',
+	'Chocolate', 'Baking Powder', 'Baking Soda', 'Stock', 'White Wine', 'Red Wine',
+	'Bacon', 'Sausage', 'Lamb', 'Cod', 'Tuna', 'Quinoa', 'Couscous', 'Noodles',
+]
+QUALIFIERS = [
+	'Fresh', 'Dried', 'Smoked', 'Ground', 'Organic', 'Chopped', 'Frozen', 'Roasted',
+	'Toasted', 'Pickled', 'Sliced', 'Whole', 'Wild', 'Aged', 'Low-Fat', 'Baby',
+]
+CUISINES = [
+	'Italian', 'Mexican', 'Thai', 'Indian', 'Chinese', 'Japanese', 'French', 'Greek',
+	'Spanish', 'Korean', 'Vietnamese', 'Turkish', 'Lebanese', 'Moroccan', 'Ethiopian',
+	'Brazilian', 'Peruvian', 'American', 'Cajun', 'British', 'German', 'Polish',
+	'Caribbean', 'Filipino', 'Nordic',
+]
+COURSES = [
+	'Breakfast', 'Lunch', 'Dinner', 'Dessert', 'Snack', 'Soup', 'Salad', 'Side',
+	'Drink', 'Baking',
+]
+ADJECTIVES = [
+	'Smoky', 'Spicy', 'Creamy', 'Crispy', 'Zesty', 'Hearty', 'Quick', 'Rustic',
+	'Golden', 'Tangy', 'Herby', 'Sticky', 'Garlicky', 'Classic', 'Easy', 'Slow-Cooked',
+]
+DISHES = [
+	'Curry', 'Stew', 'Salad', 'Soup', 'Tacos', 'Pasta', 'Risotto', 'Stir-Fry', 'Bake',
+	'Pie', 'Skewers', 'Burger', 'Bowl', 'Wraps', 'Casserole', 'Frittata', 'Pancakes',
+	'Noodles', 'Tart', 'Sandwich',
+]
+STEPS = [
+	'Preheat the oven.', 'Chop the vegetables.', 'Season generously.',
+	'Simmer until thickened.', 'Stir in the herbs.', 'Fry until golden.',
+	'Whisk everything together.', 'Bake until set.', 'Rest before serving.',
+	'Garnish and serve.', 'Marinate for an hour.', 'Toss with the dressing.',
+]
+
+
+def ingredient_name(index):
+	"""A unique, readable ingredient name for ``index``."""
+	base = BASE_INGREDIENTS[index % len(BASE_INGREDIENTS)]
+	variant = index // len(BASE_INGREDIENTS)
+	if variant == 0:
+		return base
+	if variant <= len(QUALIFIERS):
+		return f'{QUALIFIERS[variant - 1]} {base}'
+	return f'{base} {index}'
+
+
+def category_name(index):
+	"""A unique category name for ``index``."""
+	cuisine = CUISINES[index % len(CUISINES)]
+	course = COURSES[(index // len(CUISINES)) % len(COURSES)]
+	name = f'{cuisine} {course}'
+	if index >= len(CUISINES) * len(COURSES):
+		name = f'{name} {index}'
+	return name
+
+
+@contextmanager
+def explicit_timestamps(*models):
+	"""
+	Let bulk_create() keep the created_at/updated_at values set on instances.
+
+	auto_now/auto_now_add are switched off on the model fields for the duration,
+	so this must not be used while the same process is serving requests.
+	"""
+	fields = [
+		field
+		for model in models
+		for field in model._meta.concrete_fields
+		if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+	]
+	saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+	for field in fields:
+		field.auto_now = field.auto_now_add = False
+	try:
+		yield
+	finally:
+		for field, auto_now, auto_now_add in saved:
+			field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def catalog_is_empty(using=DEFAULT_DB_ALIAS):
+	return not (
+		Recipe.objects.using(using).exists()
+		or Ingredient.objects.using(using).exists()
+		or Category.objects.using(using).exists()
+	)
+
+
+def clear_catalog(using=DEFAULT_DB_ALIAS):
+	"""Delete every recipe, ingredient and category with plain DELETE statements."""
+	connection = connections[using]
+	search.drop_index(connection)
+	with transaction.atomic(using=using), connection.cursor() as cursor:
+		for model in (RecipeBucket, RecipeSignature, RecipeIngredient, Recipe, Ingredient, Category):
+			cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+	search.install_index(connection)
+	invalidate_bulk_change()
+
+
+class CatalogGenerator:
+	"""
+	Build a synthetic catalog of the requested size.
+
+	Ingredient popularity follows a Zipf-like curve (a few staples appear in
+	most recipes, the long tail rarely), and ``created_at`` is spread evenly
+	over the last ``days`` days in id order, like a real collection.
+	"""
+
+	def __init__(self, recipes, ingredients, categories, authors=50,
+			min_ingredients=3, max_ingredients=12, days=3 * 365, seed=0,
+			batch_size=5000, using=DEFAULT_DB_ALIAS, progress=None):
+		if not 0 < min_ingredients <= max_ingredients <= ingredients:
+			raise ValueError('Need 0 < min_ingredients <= max_ingredients <= ingredients.')
+		self.recipes = recipes
+		self.ingredients = ingredients
+		self.categories = categories
+		self.authors = authors
+		self.min_ingredients = min_ingredients
+		self.max_ingredients = max_ingredients
+		self.days = days
+		self.batch_size = batch_size
+		self.using = using
+		self.progress = progress or (lambda message: None)
+		self.rng = random.Random(seed)
+		self.seed = seed
+
+	def run(self):
+		"""Write the catalog and return a dict of row counts and timings."""
+		started = time.perf_counter()
+		connection = connections[self.using]
+		# Per-row FTS triggers dominate insert time; rebuild once at the end.
+		search.drop_index(connection)
+		try:
+			author_ids = self._create_authors()
+			category_ids = self._create_categories()
+			ingredient_ids = self._create_ingredients()
+			links = self._create_recipes(author_ids, category_ids, ingredient_ids)
+			# bulk_create() sends no signals; count everything in one pass
+			with transaction.atomic(using=self.using):
+				repair_all_counts(using=self.using)
+			rebuild_signatures(using=self.using, batch_size=self.batch_size)
+		finally:
+			search.install_index(connection)
+		invalidate_bulk_change()
+		return {
+			'recipes': self.recipes,
+			'ingredients': self.ingredients,
+			'categories': self.categories,
+			'authors': len(author_ids),
+			'recipe_ingredients': links,
+			'seconds': time.perf_counter() - started,
+		}
+
+	def _create_authors(self):
+		User = get_user_model()
+		password = make_password(None)
+		usernames = [f'synthetic-{self.seed}-{index}' for index in range(self.authors)]
+		# Authors survive clear_catalog(), so reuse them on a second run
+		User.objects.using(self.using).bulk_create(
+			[User(username=username, password=password) for username in usernames],
+			batch_size=self.batch_size, ignore_conflicts=True,
+		)
+		return list(
+			User.objects.using(self.using)
+			.filter(username__in=usernames)
+			.order_by('pk')
+			.values_list('pk', flat=True)
+		)
+
+	def _create_categories(self):
+		now = timezone.now()
+		objs = []
+		for index in range(self.categories):
+			name = category_name(index)
+			objs.append(Category(name=name, slug=slugify(name), created_at=now))
+		with explicit_timestamps(Category):
+			created = Category.objects.using(self.using).bulk_create(objs, batch_size=self.batch_size)
+		return [obj.pk for obj in created]
+
+	def _create_ingredients(self):
+		units = ['g', 'kg', 'ml', 'l', 'tsp', 'tbsp', 'cup', 'pcs', '']
+		objs = [
+			Ingredient(name=ingredient_name(index), default_unit=self.rng.choice(units))
+			for index in range(self.ingredients)
+		]
+		created = Ingredient.objects.using(self.using).bulk_create(objs, batch_size=self.batch_size)
+		self.progress(f'Created {len(created)} ingredients and {self.categories} categories.')
+		return [obj.pk for obj in created]
+
+	def _recipe(self, author_ids, category_ids, created_at):
+		rng = self.rng
+		title = f'{rng.choice(ADJECTIVES)} {rng.choice(BASE_INGREDIENTS)} {rng.choice(DISHES)}'
+		prep = rng.randint(0, 60)
+		cook = rng.choice((0, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180))
+		return Recipe(
+			title=title,
+			description=f'A {rng.choice(CUISINES).lower()} take on {title.lower()}.',
+			instructions=' '.join(rng.sample(STEPS, rng.randint(3, 6))),
+			author_id=rng.choice(author_ids) if author_ids and rng.random() > 0.05 else None,
+			category_id=rng.choice(category_ids) if category_ids and rng.random() > 0.05 else None,
+			prep_time_minutes=prep,
+			cook_time_minutes=cook,
+			# bulk_create() skips Recipe.save(), which normally fills this in
+			total_time_minutes=prep + cook,
+			created_at=created_at,
+			updated_at=created_at,
+		)
+
+	def _create_recipes(self, author_ids, category_ids, ingredient_ids):
+		rng = self.rng
+		cum_weights = list(accumulate(1 / (rank + 1) ** 0.9 for rank in range(len(ingredient_ids))))
+		end = timezone.now()
+		start = end - timedelta(days=self.days)
+		step = (end - start) / max(self.recipes, 1)
+		links_total = 0
+		started = time.perf_counter()
+
+		with explicit_timestamps(Recipe):
+			for offset in range(0, self.recipes, self.batch_size):
+				count = min(self.batch_size, self.recipes - offset)
+				recipes = [
+					self._recipe(author_ids, category_ids, start + step * (offset + index))
+					for index in range(count)
+				]
+				with transaction.atomic(using=self.using):
+					Recipe.objects.using(self.using).bulk_create(recipes)
+					links = []
+					for recipe in recipes:
+						wanted = rng.randint(self.min_ingredients, self.max_ingredients)
+						chosen = set()
+						while len(chosen) < wanted:
+							chosen.update(rng.choices(ingredient_ids, cum_weights=cum_weights, k=wanted - len(chosen)))
+						for ingredient_id in sorted(chosen):
+							links.append(RecipeIngredient(
+								recipe_id=recipe.pk,
+								ingredient_id=ingredient_id,
+								quantity=rng.randint(1, 500),
+								unit=rng.choice(('g', 'ml', 'pcs', 'tbsp', 'tsp')),
+							))
+					RecipeIngredient.objects.using(self.using).bulk_create(links, batch_size=self.batch_size)
+				links_total += len(links)
+				done = offset + count
+				rate = done / max(time.perf_counter() - started, 1e-9)
+				self.progress(f'{done}/{self.recipes} recipes ({rate:,.0f}/s)')
+		return links_total
@@ -0,0 +1,173 @@
+"""
+SQL query budgets for every page.
+
+Each test seeds enough data for an N+1 pattern to show up as extra queries
+and pins the number of queries the view is allowed to run. A budget that
+starts failing means a view (or template) began querying per row; fix the
+view with select_related/prefetch_related/annotations rather than raising
+the number.
+"""
+from itertools import product
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from categories.models import Category
+from ingredients.models import Ingredient
+from profiles.models import Profile
+
+from .models import Recipe, RecipeIngredient
+from .page_cache import PAGE_SCOPE
+from .search import index_available
+from .similarity import rebuild_signatures
+from .versioning import bump_version
+
+
+# Queries Django itself spends on an authenticated request: session + user
+AUTH_QUERIES = 2
+
+
+def seed_catalog(recipes=40, categories=6, ingredients=30, per_recipe=5, authors=4):
+	"""Create a small but realistically shaped catalog."""
+	users = [
+		User.objects.create_user(username=f'cook{i}', password='pass12345')
+		for i in range(authors)
+	]
+	for user in users:
+		Profile.objects.create(user=user, bio='Home cook')
+	cats = [
+		Category.objects.create(name=f'Category {i}', slug=f'category-{i}')
+		for i in range(categories)
+	]
+	ings = Ingredient.objects.bulk_create(
+		Ingredient(name=f'Ingredient {i}', default_unit='g') for i in range(ingredients)
+	)
+	links = []
+	for i in range(recipes):
+		recipe = Recipe.objects.create(
+			title=f'Recipe {i} pasta' if i % 2 else f'Recipe {i} soup',
+			description='Tasty and simple',
+			instructions='Chop, mix and cook',
+			author=users[i % authors],
+			category=cats[i % categories],
+			prep_time_minutes=5 + i % 20,
+			cook_time_minutes=10 + i % 30,
+		)
+		for j in range(per_recipe):
+			links.append(RecipeIngredient(
+				recipe=recipe,
+				ingredient=ings[(i + j) % ingredients],
+				quantity=100,
+				unit='g',
+			))
+	RecipeIngredient.objects.bulk_create(links)
+	rebuild_signatures()
+	return users, cats, ings
+
+
+@override_settings(CHART_RENDER_WORKERS=0, QUERY_COUNT_HEADER=False)
+class QueryBudgetTests(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.users, cls.categories, cls.ingredients = seed_catalog()
+		cls.recipe = Recipe.objects.order_by('pk').first()
+		cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+
+	def setUp(self):
+		cache.clear()
+		# Warm the per-process FTS availability check
+		index_available()
+
+	def assertBudget(self, budget, url, data=None):
+		with self.assertNumQueries(budget):
+			response = self.client.get(url, data)
+		self.assertEqual(response.status_code, 200)
+		return response
+
+	def test_home(self):
+		self.assertBudget(0, reverse('recipes:home'))
+
+	def test_recipe_list_filter_combinations(self):
+		filters = {
+			'q': 'pasta',
+			'category': self.categories[1].slug,
+			'ingredient': str(self.ingredients[3].pk),
+			'min_time': '20',
+			'max_time': '40',
+		}
+		for mask in product((False, True), repeat=len(filters)):
+			params = {key: value for (key, value), on in zip(filters.items(), mask) if on}
+			with self.subTest(**params):
+				# recipes page + count, categories for the filter bar,
+				# plus the ingredient name when filtering by ingredient
+				budget = 3 + ('ingredient' in params)
+				self.assertBudget(budget, reverse('recipes:recipe_list'), params)
+
+	def test_recipe_list_next_page(self):
+		first = self.client.get(reverse('recipes:recipe_list'))
+		self.assertBudget(3, reverse('recipes:recipe_list') + '?' + first.context['page'].next_query)
+
+	def test_recipe_detail(self):
+		url = reverse('recipes:recipe_detail', args=[self.recipe.pk])
+		# recipe with category/author, its ingredients joined to names, then
+		# the similar recipes: signature, LSH candidates, their signatures and
+		# the chosen recipes on a cold cache; a repeat view is served from the
+		# page cache, and once pages are invalidated only the neighbour ids
+		# stay cached
+		self.assertBudget(6, url)
+		self.assertBudget(0, url)
+		bump_version(PAGE_SCOPE)
+		self.assertBudget(3, url)
+
+	def test_recipe_search(self):
+		self.client.force_login(self.users[0])
+		url = reverse('recipes:recipe_search')
+		# results table (1) + category choices (1) + chart data (4 on a cold
+		# cache), plus one lookup per selected category/ingredient while
+		# validating; ingredients come from the typeahead, not a <select>
+		cases = [
+			({}, 5),
+			({'show_all': '1'}, 6),
+			({'recipe_name': 'pasta'}, 6),
+			({'recipe_name': 'pasta', 'category': self.categories[1].pk, 'max_time': 40}, 7),
+			({'ingredient': self.ingredients[3].pk, 'min_time': 15}, 7),
+		]
+		for params, budget in cases:
+			with self.subTest(**params):
+				cache.clear()
+				self.assertBudget(AUTH_QUERIES + budget, url, params)
+
+	def test_category_list(self):
+		self.assertBudget(2, reverse('categories:category_list'))
+		self.assertBudget(2, reverse('categories:category_list'), {'q': 'Category'})
+
+	def test_ingredient_list(self):
+		self.assertBudget(2, reverse('ingredients:ingredient_list'))
+		self.assertBudget(2, reverse('ingredients:ingredient_list'), {'q': 'Ingredient'})
+
+	def test_admin_changelists(self):
+		self.client.force_login(self.admin)
+		changelists = [
+			# two counts + the page, plus the category list_filter
+			('recipes', 'recipe', 4),
+			('recipes', 'recipeingredient', 3),
+			('categories', 'category', 3),
+			('ingredients', 'ingredient', 3),
+			('profiles', 'profile', 3),
+			('auth', 'user', 4),  # groups list_filter
+		]
+		for app_label, model, budget in changelists:
+			with self.subTest(model=model):
+				self.assertBudget(
+					AUTH_QUERIES + budget, reverse(f'admin:{app_label}_{model}_changelist')
+				)
+
+	def test_admin_recipe_change_form(self):
+		self.client.force_login(self.admin)
+		# savepoint pair, recipe, inline rows joined to ingredients, content
+		# type, and one choices query each for author, category and ingredient
+		self.assertBudget(
+			AUTH_QUERIES + 8, reverse('admin:recipes_recipe_change', args=[self.recipe.pk])
+		)
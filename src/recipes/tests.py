@@ -1,4 +1,9 @@
-from django.test import TestCase
+import time
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.db.models import Count
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from categories.models import Category
@@ -28,6 +33,14 @@ class RecipeModelTests(TestCase):
 		RecipeIngredient.objects.create(recipe=recipe, ingredient=ing, quantity=500, unit="ml")
 		self.assertEqual(recipe.recipe_ingredients.count(), 1)
 
+	def test_total_time_kept_in_sync_on_save(self):
+		recipe = Recipe.objects.create(title="Stew", instructions="Simmer", prep_time_minutes=10, cook_time_minutes=50)
+		self.assertEqual(recipe.total_time_minutes, 60)
+		recipe.cook_time_minutes = 20
+		recipe.save(update_fields=['cook_time_minutes'])
+		recipe.refresh_from_db()
+		self.assertEqual(recipe.total_time_minutes, 30)
+
 
 class HomeViewTests(TestCase):
 	def test_home_view_status_code(self):
@@ -76,6 +89,9 @@ class RecipeListViewTests(TestCase):
 			cook_time_minutes=60,
 		)
 
+	def setUp(self):
+		cache.clear()
+
 	def test_recipe_list_status_code(self):
 		"""Recipe list page returns 200."""
 		response = self.client.get(reverse('recipes:recipe_list'))
@@ -122,6 +138,14 @@ class RecipeListViewTests(TestCase):
 		self.assertEqual(len(response.context['recipes']), 2)
 		self.assertEqual(response.context['max_time'], '30')
 
+	def test_recipe_list_min_time_filter(self):
+		"""Min time filter returns recipes at or above the limit."""
+		response = self.client.get(reverse('recipes:recipe_list'), {'min_time': '30'})
+		titles = {recipe.title for recipe in response.context['recipes']}
+		self.assertNotIn('Tacos', titles)
+		self.assertIn('Spaghetti Carbonara', titles)
+		self.assertEqual(response.context['min_time'], '30')
+
 	def test_recipe_list_combined_filters(self):
 		"""Multiple filters work together."""
 		response = self.client.get(reverse('recipes:recipe_list'), {
@@ -171,6 +195,9 @@ class RecipeListIngredientFilterTests(TestCase):
 		RecipeIngredient.objects.create(recipe=cls.recipe3, ingredient=cls.ingredient1)
 		RecipeIngredient.objects.create(recipe=cls.recipe3, ingredient=cls.ingredient2)
 
+	def setUp(self):
+		cache.clear()
+
 	def test_recipe_list_ingredient_filter(self):
 		"""Ingredient filter returns recipes containing that ingredient."""
 		response = self.client.get(reverse('recipes:recipe_list'), {'ingredient': self.ingredient1.pk})
@@ -197,6 +224,155 @@ class RecipeListIngredientFilterTests(TestCase):
 		self.assertEqual(response.context['ingredient_name'], '')
 
 
+@override_settings(KEYSET_PAGE_SIZE=2)
+class RecipeListPaginationTests(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.category = Category.objects.create(name="Italian", slug="italian")
+		cls.recipes = [
+			Recipe.objects.create(
+				title=f"Pasta {i}",
+				instructions="Boil",
+				category=cls.category if i % 2 else None,
+				prep_time_minutes=5,
+				cook_time_minutes=5,
+			)
+			for i in range(5)
+		]
+
+	def setUp(self):
+		cache.clear()
+
+	def _walk(self, params):
+		"""Follow next cursors from the first page and return every title seen."""
+		titles = []
+		response = self.client.get(reverse('recipes:recipe_list'), params)
+		while True:
+			page = response.context['page']
+			titles.extend(r.title for r in response.context['recipes'])
+			if not page.has_next:
+				return titles, response
+			response = self.client.get(reverse('recipes:recipe_list') + '?' + page.next_query)
+
+	def test_first_page_is_limited_to_page_size(self):
+		"""Only KEYSET_PAGE_SIZE recipes are rendered per page."""
+		response = self.client.get(reverse('recipes:recipe_list'))
+		self.assertEqual(len(response.context['recipes']), 2)
+		self.assertEqual(response.context['page'].total_count, 5)
+		self.assertTrue(response.context['page'].has_next)
+		self.assertFalse(response.context['page'].has_previous)
+
+	def test_next_cursors_visit_every_recipe_once_newest_first(self):
+		"""Walking the cursors returns every recipe exactly once in order."""
+		titles, _ = self._walk({})
+		self.assertEqual(titles, [f"Pasta {i}" for i in reversed(range(5))])
+
+	def test_cursor_keeps_filters(self):
+		"""Next-page links keep the active filters."""
+		titles, response = self._walk({'category': 'italian', 'max_time': '30'})
+		self.assertEqual(titles, ["Pasta 3", "Pasta 1"])
+		self.assertEqual(response.context['category_filter'], 'italian')
+
+	def test_previous_cursor_returns_prior_page(self):
+		"""The previous link of the second page leads back to the first page."""
+		first = self.client.get(reverse('recipes:recipe_list'))
+		second = self.client.get(reverse('recipes:recipe_list') + '?' + first.context['page'].next_query)
+		back = self.client.get(reverse('recipes:recipe_list') + '?' + second.context['page'].previous_query)
+		self.assertEqual(
+			[r.pk for r in back.context['recipes']],
+			[r.pk for r in first.context['recipes']],
+		)
+		self.assertTrue(back.context['page'].has_next)
+
+	def test_invalid_cursor_falls_back_to_first_page(self):
+		"""A garbage cursor is ignored instead of raising an error."""
+		response = self.client.get(reverse('recipes:recipe_list'), {'after': 'not-a-cursor'})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.context['recipes'][0].title, "Pasta 4")
+
+	@override_settings(KEYSET_COUNT_TOTAL=False)
+	def test_count_can_be_skipped(self):
+		"""With KEYSET_COUNT_TOTAL off no COUNT query is issued."""
+		response = self.client.get(reverse('recipes:recipe_list'))
+		self.assertIsNone(response.context['page'].total_count)
+		self.assertContains(response, 'Showing 2 recipes')
+
+
+class RecipeFullTextSearchTests(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.title_match = Recipe.objects.create(
+			title="Chicken Curry", description="Spicy", instructions="Simmer",
+		)
+		cls.description_match = Recipe.objects.create(
+			title="Rice Bowl", description="Great with leftover chicken", instructions="Assemble",
+		)
+		cls.instructions_match = Recipe.objects.create(
+			title="Stock", description="", instructions="Boil the chicken bones for hours",
+		)
+		Recipe.objects.create(title="Tiramisu", description="Dessert", instructions="Layer")
+
+	def setUp(self):
+		cache.clear()
+
+	def test_search_covers_title_description_and_instructions(self):
+		"""All three text columns are searchable."""
+		from recipes.search import search_recipes
+		found = set(search_recipes(Recipe.objects.all(), 'chicken').values_list('pk', flat=True))
+		self.assertEqual(
+			found,
+			{self.title_match.pk, self.description_match.pk, self.instructions_match.pk},
+		)
+
+	def test_title_matches_rank_first(self):
+		"""BM25 weights a title hit above description and instructions hits."""
+		response = self.client.get(reverse('recipes:recipe_list'), {'q': 'chicken'})
+		titles = [r.title for r in response.context['recipes']]
+		self.assertEqual(titles[0], 'Chicken Curry')
+		self.assertEqual(len(titles), 3)
+
+	def test_ranked_search_matches_once(self):
+		"""The FTS table is joined once; the rank does not repeat the MATCH per row."""
+		from recipes.search import search_recipes
+		qs = search_recipes(Recipe.objects.all(), 'chicken').order_by('search_rank')
+		self.assertEqual(str(qs.query).count('MATCH'), 1)
+		self.assertEqual(qs.first(), self.title_match)
+
+	def test_prefix_query(self):
+		"""Partial words match as prefixes."""
+		from recipes.search import search_recipes
+		qs = search_recipes(Recipe.objects.all(), 'tiram')
+		self.assertEqual([r.title for r in qs], ['Tiramisu'])
+
+	def test_punctuation_only_query_returns_nothing(self):
+		"""Input without word characters cannot break the MATCH syntax."""
+		from recipes.search import search_recipes
+		self.assertFalse(search_recipes(Recipe.objects.all(), '"*)(').exists())
+
+	def test_index_follows_updates_and_deletes(self):
+		"""Saving and deleting a recipe keeps the index in sync."""
+		from recipes.search import search_recipes
+		self.title_match.title = "Lamb Curry"
+		self.title_match.save()
+		self.assertTrue(search_recipes(Recipe.objects.all(), 'lamb').exists())
+		self.assertNotIn(
+			self.title_match.pk,
+			search_recipes(Recipe.objects.all(), 'chicken').values_list('pk', flat=True),
+		)
+		self.description_match.delete()
+		self.assertEqual(search_recipes(Recipe.objects.all(), 'leftover').count(), 0)
+
+	def test_rebuild_command(self):
+		"""The management command rebuilds the index from scratch."""
+		from io import StringIO
+		from django.core.management import call_command
+		out = StringIO()
+		call_command('rebuild_search_index', stdout=out)
+		self.assertIn('Indexed 4 recipe(s).', out.getvalue())
+		response = self.client.get(reverse('recipes:recipe_list'), {'q': 'chick'})
+		self.assertEqual(len(response.context['recipes']), 3)
+
+
 class RecipeDetailViewTests(TestCase):
 	@classmethod
 	def setUpTestData(cls):
@@ -228,6 +404,9 @@ class RecipeDetailViewTests(TestCase):
 			notes="room temperature"
 		)
 
+	def setUp(self):
+		cache.clear()
+
 	def test_recipe_detail_status_code(self):
 		"""Recipe detail page returns 200."""
 		response = self.client.get(reverse('recipes:recipe_detail', args=[self.recipe.pk]))
@@ -415,6 +594,13 @@ class RecipeSearchFormTests(TestCase):
 		self.assertFalse(form.is_valid())
 		self.assertIn('max_time', form.errors)
 
+	def test_form_invalid_inverted_time_range(self):
+		"""Form is invalid when min_time exceeds max_time."""
+		from recipes.forms import RecipeSearchForm
+		form = RecipeSearchForm(data={'min_time': 40, 'max_time': 20})
+		self.assertFalse(form.is_valid())
+		self.assertIn('min_time', form.errors)
+
 	def test_form_invalid_max_time_negative(self):
 		"""Form is invalid with negative max_time."""
 		from recipes.forms import RecipeSearchForm
@@ -489,6 +675,10 @@ class RecipeSearchViewTests(TestCase):
 		# Add ingredient to recipe1
 		RecipeIngredient.objects.create(recipe=cls.recipe1, ingredient=cls.ingredient)
 
+	def setUp(self):
+		# Cached results are keyed on data versions, which rollbacks do not bump
+		cache.clear()
+
 	def test_search_view_requires_login(self):
 		"""Search view redirects unauthenticated users to login."""
 		response = self.client.get(reverse('recipes:recipe_search'))
@@ -549,6 +739,20 @@ class RecipeSearchViewTests(TestCase):
 		# Spaghetti: 30, Tacos: 25
 		self.assertEqual(response.context['result_count'], 2)
 
+	def test_search_by_time_range(self):
+		"""Search filters by a min/max time range."""
+		self.client.login(username='chef', password='pass12345')
+		response = self.client.get(reverse('recipes:recipe_search'), {'min_time': 26, 'max_time': 30})
+		self.assertEqual(response.context['result_count'], 1)
+		self.assertEqual(response.context['results'][0]['title'], 'Spaghetti Carbonara')
+
+	def test_invalid_max_time_shows_error(self):
+		"""An invalid maximum time is reported next to its field."""
+		self.client.login(username='chef', password='pass12345')
+		response = self.client.get(reverse('recipes:recipe_search'), {'max_time': 0})
+		error = response.context['form'].errors['max_time'][0]
+		self.assertContains(response, f'<small style="color: #f87171; margin-top: 0.25rem;">{error}</small>')
+
 	def test_show_all_recipes(self):
 		"""Show all button displays all recipes."""
 		self.client.login(username='chef', password='pass12345')
@@ -592,6 +796,221 @@ class RecipeSearchViewTests(TestCase):
 		self.assertIn('line_chart', response.context)
 
 
+class RecipeSearchResultsTests(TestCase):
+	"""Tests for the single-query search result table."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username="chef", password="pass12345")
+		cls.category = Category.objects.create(name="Italian", slug="italian")
+		cls.tomato = Ingredient.objects.create(name="Tomato")
+		cls.basil = Ingredient.objects.create(name="Basil")
+		cls.recipe = Recipe.objects.create(
+			title="<b>Bruschetta</b>", instructions="Toast", author=cls.user,
+			category=cls.category, prep_time_minutes=5, cook_time_minutes=5,
+		)
+		RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.tomato)
+		RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.basil)
+		Recipe.objects.create(title="Plain Toast", instructions="Toast")
+
+	def setUp(self):
+		cache.clear()
+		self.client.login(username='chef', password='pass12345')
+
+	def test_titles_are_escaped(self):
+		"""Recipe titles are HTML-escaped in the result table."""
+		response = self.client.get(reverse('recipes:recipe_search'), {'show_all': '1'})
+		self.assertContains(response, '&lt;b&gt;Bruschetta&lt;/b&gt;')
+		self.assertNotContains(response, '<b>Bruschetta</b>')
+
+	def test_row_columns(self):
+		"""Rows carry category, author, ingredient count and total time."""
+		response = self.client.get(reverse('recipes:recipe_search'), {'ingredient': self.tomato.pk})
+		row = response.context['results'][0]
+		self.assertEqual(row['category_name'], 'Italian')
+		self.assertEqual(row['author_name'], 'chef')
+		# The ingredient filter must not restrict the counted ingredients
+		self.assertEqual(row['ingredient_count'], 2)
+		self.assertEqual(row['total_minutes'], 10)
+
+	def test_missing_relations_have_defaults(self):
+		"""Recipes without category or author show placeholders."""
+		response = self.client.get(reverse('recipes:recipe_search'), {'recipe_name': 'plain'})
+		self.assertContains(response, 'Uncategorized')
+		self.assertContains(response, 'Unknown')
+
+	def test_results_use_one_query(self):
+		"""Building the result rows is a single query below the limit."""
+		from recipes.results import build_results, order_results
+		with self.assertNumQueries(1):
+			results = build_results(order_results(Recipe.objects.all(), False))
+		self.assertEqual(results.count, 2)
+		self.assertFalse(results.truncated)
+
+	@override_settings(SEARCH_RESULTS_LIMIT=1)
+	def test_results_are_limited(self):
+		"""Only SEARCH_RESULTS_LIMIT rows are rendered but the total is reported."""
+		response = self.client.get(reverse('recipes:recipe_search'), {'show_all': '1'})
+		self.assertEqual(len(response.context['results']), 1)
+		self.assertEqual(response.context['result_count'], 2)
+		self.assertTrue(response.context['results_truncated'])
+
+
+class ResultCacheTests(SimpleTestCase):
+	"""Tests for the LRU/TTL cache in front of recipe_search."""
+
+	def setUp(self):
+		from recipes.search_cache import ResultCache
+		self.now = 0.0
+		self.cache = ResultCache(max_entries=2, timeout=10, clock=lambda: self.now)
+
+	def test_evicts_least_recently_used(self):
+		self.cache.set('a', 'v1', 1)
+		self.cache.set('b', 'v1', 2)
+		self.assertEqual(self.cache.get('a', 'v1'), (True, 1))
+		self.cache.set('c', 'v1', 3)
+		self.assertEqual(self.cache.get('b', 'v1'), (False, None))
+		self.assertEqual(self.cache.get('a', 'v1'), (True, 1))
+		self.assertEqual(self.cache.get('c', 'v1'), (True, 3))
+		self.assertEqual(
+			self.cache.stats(),
+			{'entries': 2, 'max_entries': 2, 'hits': 3, 'misses': 1, 'evictions': 1, 'hit_rate': 0.75},
+		)
+
+	def test_entries_expire_and_follow_the_version(self):
+		self.cache.set('a', 'v1', 1)
+		self.cache.set('b', 'v1', 2)
+		self.assertEqual(self.cache.get('a', 'v2'), (False, None))
+		self.now = 10
+		self.assertEqual(self.cache.get('b', 'v1'), (False, None))
+		self.assertEqual(len(self.cache), 0)
+
+	def test_normalized_keys(self):
+		from recipes.search_cache import normalize_search
+		category = Category(pk=3, name="Desserts", slug="desserts")
+		self.assertEqual(
+			normalize_search({
+				'recipe_name': 'Pie  chicken, PIE', 'category': category, 'ingredient': None,
+				'min_time': None, 'max_time': 30,
+			}),
+			(('category', 3), ('max_time', 30), ('recipe_name', 'chicken pie')),
+		)
+		self.assertEqual(normalize_search({'recipe_name': '!!', 'max_time': 0}), (('recipe_name', '!!'),))
+
+
+class RecipeSearchCacheTests(TestCase):
+	"""Tests for recipe_search served through the result cache."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username="chef", password="pass12345")
+		cls.desserts = Category.objects.create(name="Desserts", slug="desserts")
+		Recipe.objects.create(title="Chicken Pie", instructions="Bake", category=cls.desserts, prep_time_minutes=10)
+		Recipe.objects.create(title="Apple Pie", instructions="Bake", category=cls.desserts, prep_time_minutes=40)
+
+	def setUp(self):
+		from recipes.search_cache import get_cache
+		cache.clear()
+		self.results = get_cache()
+		self.client.force_login(self.user)
+
+	def _search(self, **params):
+		return self.client.get(reverse('recipes:recipe_search'), params)
+
+	def test_repeated_search_is_served_from_the_cache(self):
+		first = self._search(recipe_name='Pie chicken', category=self.desserts.pk)
+		self.assertEqual(first['X-Search-Cache'], 'miss')
+		hits = self.results.hits
+		# The same filters in another order and case: only the session, the
+		# user and the form's category lookup and choices are queried
+		with self.assertNumQueries(4):
+			second = self._search(recipe_name='CHICKEN  pie', category=self.desserts.pk)
+		self.assertEqual(second['X-Search-Cache'], 'hit')
+		self.assertEqual(self.results.hits, hits + 1)
+		self.assertEqual(second.context['results'], first.context['results'])
+		self.assertEqual(self._search(recipe_name='pie', max_time=20)['X-Search-Cache'], 'miss')
+
+	def test_data_changes_invalidate_results(self):
+		self.assertEqual(self._search(recipe_name='pie').context['result_count'], 2)
+		Recipe.objects.create(title="Pumpkin Pie", instructions="Bake")
+		response = self._search(recipe_name='pie')
+		self.assertEqual(response['X-Search-Cache'], 'miss')
+		self.assertEqual(response.context['result_count'], 3)
+
+	def test_no_search_is_not_cached(self):
+		response = self._search()
+		self.assertNotIn('X-Search-Cache', response)
+
+
+class RecipeExportTests(TestCase):
+	"""Tests for the streaming CSV/JSONL export of search results."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username="chef", password="pass12345")
+		cls.category = Category.objects.create(name="Italian", slug="italian")
+		cls.tomato = Ingredient.objects.create(name="Tomato")
+		cls.basil = Ingredient.objects.create(name="Basil")
+		cls.recipe = Recipe.objects.create(
+			title="Bruschetta", instructions="Toast", author=cls.user,
+			category=cls.category, prep_time_minutes=5, cook_time_minutes=5,
+		)
+		RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.tomato)
+		RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.basil)
+		Recipe.objects.create(title="=HYPERLINK(\"x\")", instructions="Toast", cook_time_minutes=40)
+
+	def setUp(self):
+		self.client.login(username='chef', password='pass12345')
+
+	def _export(self, fmt, params=None):
+		response = self.client.get(reverse('recipes:recipe_export', args=[fmt]), params or {})
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(response.streaming)
+		return response, b''.join(response.streaming_content).decode('utf-8')
+
+	def test_csv_export_uses_search_filters(self):
+		import csv
+		response, body = self._export('csv', {'ingredient': self.tomato.pk})
+		self.assertTrue(response['Content-Type'].startswith('text/csv'))
+		self.assertIn('attachment; filename="recipes-', response['Content-Disposition'])
+		rows = list(csv.DictReader(body.splitlines()))
+		self.assertEqual(len(rows), 1)
+		self.assertEqual(rows[0]['title'], 'Bruschetta')
+		self.assertEqual(rows[0]['category'], 'Italian')
+		self.assertEqual(rows[0]['author'], 'chef')
+		self.assertEqual(rows[0]['ingredient_count'], '2')
+		self.assertEqual(rows[0]['total_time_minutes'], '10')
+
+	def test_csv_cells_cannot_start_formulas(self):
+		_response, body = self._export('csv', {'min_time': 30})
+		self.assertIn("'=HYPERLINK", body)
+
+	def test_jsonl_export_without_filters_exports_everything(self):
+		import json
+		_response, body = self._export('jsonl')
+		rows = [json.loads(line) for line in body.splitlines()]
+		self.assertEqual(len(rows), 2)
+		missing = next(row for row in rows if row['category'] is None)
+		self.assertEqual(missing['ingredient_count'], 0)
+		self.assertIsNone(missing['author'])
+
+	@override_settings(EXPORT_CHUNK_SIZE=1)
+	def test_rows_are_read_with_iterator(self):
+		"""Rows are fetched in chunks rather than materialized in one list."""
+		from django.db.models.query import QuerySet
+		with mock.patch.object(QuerySet, 'iterator', autospec=True, side_effect=QuerySet.iterator) as iterator:
+			_response, body = self._export('jsonl')
+		self.assertEqual(iterator.call_args.kwargs, {'chunk_size': 1})
+		self.assertEqual(len(body.splitlines()), 2)
+
+	def test_invalid_filters_and_formats(self):
+		url = reverse('recipes:recipe_export', args=['csv'])
+		self.assertEqual(self.client.get(url, {'min_time': 50, 'max_time': 10}).status_code, 400)
+		self.assertEqual(self.client.get(reverse('recipes:recipe_export', args=['xml'])).status_code, 404)
+		self.client.logout()
+		self.assertEqual(self.client.get(url).status_code, 302)
+
+
 class DataVisualizationTests(TestCase):
 	"""Tests for data visualization functions."""
 	
@@ -627,7 +1046,7 @@ class DataVisualizationTests(TestCase):
 
 	def test_bar_chart_generation(self):
 		"""Bar chart is generated with recipe data."""
-		from recipes.views import create_bar_chart
+		from recipes.charts import create_bar_chart
 		chart = create_bar_chart(Recipe.objects.all())
 		self.assertIsNotNone(chart)
 		# Chart should be base64 encoded
@@ -635,14 +1054,14 @@ class DataVisualizationTests(TestCase):
 
 	def test_pie_chart_generation(self):
 		"""Pie chart is generated with recipe data."""
-		from recipes.views import create_pie_chart
+		from recipes.charts import create_pie_chart
 		chart = create_pie_chart(Recipe.objects.all())
 		self.assertIsNotNone(chart)
 		self.assertIsInstance(chart, str)
 
 	def test_line_chart_generation(self):
 		"""Line chart is generated with recipe data."""
-		from recipes.views import create_line_chart
+		from recipes.charts import create_line_chart
 		chart = create_line_chart(Recipe.objects.all())
 		# May return None if not enough data points
 		if chart:
@@ -650,13 +1069,1631 @@ class DataVisualizationTests(TestCase):
 
 	def test_bar_chart_empty_queryset(self):
 		"""Bar chart handles empty queryset gracefully."""
-		from recipes.views import create_bar_chart
+		from recipes.charts import create_bar_chart
 		chart = create_bar_chart(Recipe.objects.none())
 		self.assertIsNone(chart)
 
 	def test_pie_chart_empty_queryset(self):
 		"""Pie chart handles empty queryset gracefully."""
-		from recipes.views import create_pie_chart
+		from recipes.charts import create_pie_chart
 		chart = create_pie_chart(Recipe.objects.none())
 		self.assertIsNone(chart)
 
+
+class RecipeStatsTests(TestCase):
+	"""Tests for the aggregate recipe statistics helpers."""
+
+	@classmethod
+	def setUpTestData(cls):
+		for prep, cook in ((5, 10), (15, 20), (30, 60), (0, 0)):
+			Recipe.objects.create(
+				title=f"{prep}+{cook}", instructions="Cook",
+				prep_time_minutes=prep, cook_time_minutes=cook,
+			)
+
+	def test_default_buckets_single_query(self):
+		"""Default buckets are counted with one aggregate query."""
+		from recipes.stats import time_bucket_counts
+		with self.assertNumQueries(1):
+			buckets = time_bucket_counts(Recipe.objects.all())
+		self.assertEqual([b.count for b in buckets], [2, 1, 1])
+		self.assertEqual([b.label for b in buckets], ['≤15 min', '16-45 min', '>45 min'])
+
+	def test_custom_edges_and_field(self):
+		"""Edges and the time field are configurable."""
+		from recipes.stats import time_bucket_counts
+		buckets = time_bucket_counts(Recipe.objects.all(), edges=(20, 5), field='prep')
+		self.assertEqual([(b.lower, b.upper, b.count) for b in buckets], [
+			(None, 5, 2), (5, 20, 1), (20, None, 1),
+		])
+
+	@override_settings(RECIPE_TIME_BUCKETS=(30,))
+	def test_edges_from_settings(self):
+		"""RECIPE_TIME_BUCKETS sets the default edges."""
+		from recipes.stats import time_bucket_counts
+		self.assertEqual([b.count for b in time_bucket_counts(Recipe.objects.all())], [2, 2])
+
+	def test_unknown_field(self):
+		"""Unknown fields raise a ValueError."""
+		from recipes.stats import time_bucket_counts
+		with self.assertRaises(ValueError):
+			time_bucket_counts(Recipe.objects.all(), field='rest')
+
+
+class RecipeGrowthSeriesTests(TestCase):
+	"""Tests for the bucketed growth time series."""
+
+	def _create_on(self, *days_ago):
+		from datetime import timedelta
+		from django.utils import timezone
+		now = timezone.now()
+		for days in days_ago:
+			recipe = Recipe.objects.create(title=f"Day {days}", instructions="Cook")
+			Recipe.objects.filter(pk=recipe.pk).update(created_at=now - timedelta(days=days))
+
+	def test_daily_cumulative_totals(self):
+		"""Short ranges are bucketed per day with a running total."""
+		from recipes.stats import growth_series
+		self._create_on(2, 2, 1, 0)
+		with self.assertNumQueries(2):
+			series = growth_series(Recipe.objects.all())
+		self.assertEqual(series.resolution, 'day')
+		self.assertEqual(list(series.totals), [2, 3, 4])
+
+	def test_long_ranges_use_coarser_buckets_and_downsample(self):
+		"""Long ranges switch to weeks/months and never exceed max_points."""
+		from recipes.stats import growth_series
+		self._create_on(*range(0, 800, 5))
+		series = growth_series(Recipe.objects.all(), max_points=10)
+		self.assertEqual(series.resolution, 'month')
+		self.assertLessEqual(len(series.dates), 10)
+		self.assertEqual(series.totals[-1], 160)
+		self.assertEqual(list(series.totals), sorted(series.totals))
+
+	def test_explicit_resolution(self):
+		"""The resolution can be forced."""
+		from recipes.stats import growth_series
+		self._create_on(0, 14)
+		self.assertEqual(growth_series(Recipe.objects.all(), resolution='week').resolution, 'week')
+
+	def test_empty_queryset(self):
+		"""No recipes gives an empty series."""
+		from recipes.stats import growth_series
+		series = growth_series(Recipe.objects.none())
+		self.assertEqual(series.dates, [])
+		self.assertEqual(len(series.totals), 0)
+
+
+@override_settings(CHART_RENDER_WORKERS=0)
+class ChartCacheTests(TestCase):
+	"""Tests for the versioned chart cache."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username="chef", password="pass12345")
+		cls.category = Category.objects.create(name="Italian", slug="italian")
+		Recipe.objects.create(title="Pasta", instructions="Boil", category=cls.category)
+
+	def setUp(self):
+		cache.clear()
+		self.client.login(username='chef', password='pass12345')
+
+	def test_charts_render_once_per_data_version(self):
+		"""Repeat searches reuse the cached charts."""
+		from recipes import charts
+		with mock.patch.object(charts, 'render_bar_chart', wraps=charts.render_bar_chart) as bar:
+			self.client.get(reverse('recipes:recipe_search'))
+			self.client.get(reverse('recipes:recipe_search'))
+		self.assertEqual(bar.call_count, 1)
+
+	def test_recipe_save_invalidates_charts(self):
+		"""Saving a recipe bumps the data version and re-renders."""
+		from recipes import charts
+		with mock.patch.object(charts, 'render_pie_chart', wraps=charts.render_pie_chart) as pie:
+			self.client.get(reverse('recipes:recipe_search'))
+			Recipe.objects.create(title="Soup", instructions="Simmer")
+			self.client.get(reverse('recipes:recipe_search'))
+		self.assertEqual(pie.call_count, 2)
+
+	def test_category_delete_invalidates_charts(self):
+		"""Deleting a category bumps the data version."""
+		from recipes.chart_cache import CHART_SCOPE
+		from recipes.versioning import get_version
+		before = get_version(CHART_SCOPE)
+		Category.objects.create(name="Thai", slug="thai").delete()
+		self.assertNotEqual(get_version(CHART_SCOPE), before)
+
+	def test_charts_are_invalidated_again_on_commit(self):
+		"""A chart rendered from the old rows before the commit is not kept as the new version."""
+		from recipes.chart_cache import CHART_SCOPE
+		from recipes.versioning import get_version
+		with self.captureOnCommitCallbacks(execute=True):
+			Recipe.objects.create(title="Soup", instructions="Simmer")
+			during = get_version(CHART_SCOPE)
+		self.assertNotEqual(get_version(CHART_SCOPE), during)
+
+	def test_empty_chart_result_is_cached(self):
+		"""A chart that renders to None is not re-rendered on every request."""
+		from recipes.chart_cache import get_chart
+		render = mock.Mock(return_value=None)
+		self.assertIsNone(get_chart('empty', render))
+		self.assertIsNone(get_chart('empty', render))
+		self.assertEqual(render.call_count, 1)
+
+
+class ChartCacheConcurrencyTests(SimpleTestCase):
+	def setUp(self):
+		cache.clear()
+
+	def test_concurrent_misses_render_once(self):
+		"""Simultaneous misses for the same chart are coalesced into one render."""
+		import threading
+		import time
+		from concurrent.futures import ThreadPoolExecutor
+		from recipes.chart_cache import get_chart
+
+		calls = []
+		lock = threading.Lock()
+
+		def slow_render():
+			with lock:
+				calls.append(1)
+			time.sleep(0.2)
+			return 'png-data'
+
+		with ThreadPoolExecutor(max_workers=8) as pool:
+			results = list(pool.map(lambda _: get_chart('slow', slow_render), range(8)))
+		self.assertEqual(results, ['png-data'] * 8)
+		self.assertEqual(len(calls), 1)
+
+
+@override_settings(CHART_RENDER_WORKERS=0)
+class ChartEndpointTests(TestCase):
+	"""Tests for the chart image endpoints and conditional GET."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username="chef", password="pass12345")
+		cls.category = Category.objects.create(name="Italian", slug="italian")
+		cls.recipe = Recipe.objects.create(title="Pasta", instructions="Boil", category=cls.category)
+
+	def setUp(self):
+		cache.clear()
+		self.client.login(username='chef', password='pass12345')
+		self.url = reverse('recipes:recipe_chart', args=['bar', 'png'])
+
+	def test_page_links_to_endpoints(self):
+		"""recipe_search links chart images instead of inlining them."""
+		response = self.client.get(reverse('recipes:recipe_search'))
+		self.assertContains(response, self.url)
+		self.assertNotContains(response, 'base64')
+
+	def test_png_and_svg(self):
+		"""Charts are served as PNG and SVG with strong validators."""
+		response = self.client.get(self.url)
+		self.assertEqual(response['Content-Type'], 'image/png')
+		self.assertTrue(response.content.startswith(b'\x89PNG'))
+		self.assertFalse(response['ETag'].startswith('W/'))
+		# The versioned ETag is the only validator: charts also change with
+		# categories, which Recipe.updated_at does not follow
+		self.assertNotIn('Last-Modified', response)
+
+		response = self.client.get(reverse('recipes:recipe_chart', args=['pie', 'svg']))
+		self.assertEqual(response['Content-Type'], 'image/svg+xml')
+		self.assertIn(b'<svg', response.content)
+
+	def test_not_modified(self):
+		"""A matching If-None-Match gives a 304."""
+		first = self.client.get(self.url)
+		response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(response.content, b'')
+
+	def test_data_change_changes_etag(self):
+		"""Saving a recipe invalidates the ETag."""
+		first = self.client.get(self.url)
+		self.recipe.title = "Penne"
+		self.recipe.save()
+		response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(response.status_code, 200)
+		self.assertNotEqual(response['ETag'], first['ETag'])
+
+	def test_category_change_changes_etag(self):
+		"""Renaming a category changes the chart without touching any recipe."""
+		first = self.client.get(self.url)
+		self.category.name = "Tuscan"
+		self.category.save()
+		response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(response.status_code, 200)
+
+	def test_unknown_chart_or_format(self):
+		"""Unknown names and formats are 404s."""
+		self.assertEqual(self.client.get(reverse('recipes:recipe_chart', args=['radar', 'png'])).status_code, 404)
+		self.assertEqual(self.client.get(reverse('recipes:recipe_chart', args=['bar', 'gif'])).status_code, 404)
+
+	def test_requires_login(self):
+		"""Chart endpoints need a logged in user like recipe_search."""
+		self.client.logout()
+		self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+class ChartRenderPoolTests(SimpleTestCase):
+	"""Tests for the chart-rendering process pool."""
+
+	def _pool(self, **kwargs):
+		from recipes.chart_pool import ChartRenderPool
+		options = {'max_workers': 1, 'max_queue': 4, 'job_timeout': 10}
+		options.update(kwargs)
+		pool = ChartRenderPool(**options)
+		self.addCleanup(pool.shutdown)
+		return pool
+
+	def test_job_runs_in_worker_process(self):
+		"""Submitted jobs run in another process and return their result."""
+		import os
+		pool = self._pool()
+		self.assertNotEqual(pool.submit('pid', os.getpid).result(timeout=60), os.getpid())
+
+	def test_duplicate_keys_share_a_job(self):
+		"""A key that is already pending is not submitted twice."""
+		import time
+		pool = self._pool()
+		first = pool.submit('same', time.sleep, 0.5)
+		self.assertIs(pool.submit('same', time.sleep, 0.5), first)
+		first.result(timeout=60)
+
+	def test_queue_is_capped(self):
+		"""Submissions beyond max_queue are rejected."""
+		import time
+		pool = self._pool(max_queue=1)
+		running = pool.submit('a', time.sleep, 1)
+		with self.assertLogs('recipes.chart_pool', 'WARNING'):
+			self.assertIsNone(pool.submit('b', time.sleep, 1))
+		running.result(timeout=60)
+		self.assertEqual(pool.pending_count(), 0)
+
+	def test_jobs_time_out(self):
+		"""Jobs running past the timeout fail instead of holding a worker."""
+		import signal
+		import time
+		from recipes.chart_pool import ChartRenderTimeout
+		if not hasattr(signal, 'setitimer'):
+			self.skipTest('Per-job timeouts need SIGALRM')
+		pool = self._pool(job_timeout=0.2)
+		future = pool.submit('slow', time.sleep, 30)
+		self.assertIsInstance(future.exception(timeout=60), ChartRenderTimeout)
+
+
+class ChartThreadSafetyTests(SimpleTestCase):
+	"""Charts are drawn on per-call figures and canvases, so threads can render at once."""
+
+	ROUNDS = 34  # 34 x 3 charts x 2 formats = 204 renders
+
+	def _data(self):
+		import datetime
+		return {
+			'bar': {'categories': ['Italian', 'Mexican', 'Uncategorized'], 'counts': [12, 7, 3]},
+			'pie': {
+				'labels': ['Quick (< 30 min)', 'Medium (30-60 min)', 'Long (> 60 min)'],
+				'sizes': [10, 8, 4], 'colors': ['#4ade80', '#facc15', '#f87171'],
+			},
+			'line': {
+				'dates': [datetime.date(2024, 1, 1) + datetime.timedelta(days=30 * i) for i in range(6)],
+				'totals': [1, 3, 4, 8, 9, 12],
+			},
+		}
+
+	def test_concurrent_renders_match_serial_renders(self):
+		"""Hundreds of renders on a thread pool give exactly the bytes of a serial render."""
+		from concurrent.futures import ThreadPoolExecutor
+		from recipes.charts import CHART_FORMATS, render_chart
+		data = self._data()
+		jobs = [(name, fmt) for name in data for fmt in CHART_FORMATS]
+		expected = {(name, fmt): render_chart(name, data[name], fmt) for name, fmt in jobs}
+		with ThreadPoolExecutor(max_workers=16) as pool:
+			futures = [
+				((name, fmt), pool.submit(render_chart, name, data[name], fmt))
+				for _round in range(self.ROUNDS) for name, fmt in jobs
+			]
+			mismatched = [job for job, future in futures if future.result() != expected[job]]
+		self.assertEqual(len(futures), self.ROUNDS * len(jobs))
+		self.assertEqual(mismatched, [])
+
+	def test_pyplot_is_not_used(self):
+		"""Rendering never loads pyplot and its global figure manager."""
+		import sys
+		from recipes.charts import render_chart
+		render_chart('bar', self._data()['bar'])
+		self.assertNotIn('matplotlib.pyplot', sys.modules)
+
+
+@override_settings(CHART_RENDER_WORKERS=1)
+class ChartPoolViewTests(TestCase):
+	"""recipe_search returns immediately and picks up pool renders later."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username="chef", password="pass12345")
+		Recipe.objects.create(title="Pasta", instructions="Boil", category=Category.objects.create(name="Italian", slug="italian"))
+
+	def setUp(self):
+		import recipes.chart_pool
+		cache.clear()
+		recipes.chart_pool._pool = None
+		self.addCleanup(lambda: recipes.chart_pool._pool and recipes.chart_pool._pool.shutdown())
+		self.client.login(username='chef', password='pass12345')
+
+	def test_page_schedules_renders_and_endpoint_waits_for_them(self):
+		"""The page returns without rendering; the image endpoint gets the pool result."""
+		from recipes import charts
+		with mock.patch.object(charts, 'render_bar_chart') as render_inline:
+			response = self.client.get(reverse('recipes:recipe_search'))
+		render_inline.assert_not_called()
+		self.assertEqual(response.context['bar_chart'], reverse('recipes:recipe_chart', args=['bar', 'png']))
+
+		response = self.client.get(response.context['bar_chart'])
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(response.content.startswith(b'\x89PNG'))
+
+	@override_settings(CHART_RENDER_TIMEOUT=20)
+	def test_full_queue_answers_503_at_once(self):
+		"""A render the pool rejects is reported straight away instead of waited for."""
+		import time
+		from recipes.chart_cache import REJECTED, schedule_chart
+		from recipes.chart_pool import ChartRenderPool
+		with mock.patch.object(ChartRenderPool, 'submit', return_value=None):
+			self.assertEqual(schedule_chart('bar', Recipe.objects.all()), (None, REJECTED))
+			started = time.monotonic()
+			response = self.client.get(reverse('recipes:recipe_chart', args=['bar', 'png']))
+		self.assertLess(time.monotonic() - started, 5)
+		self.assertEqual(response.status_code, 503)
+		self.assertEqual(response['Retry-After'], '2')
+
+	def test_last_good_image_is_served_while_rendering(self):
+		"""After a data change the previous image is served, uncacheable, until the new one is ready."""
+		from concurrent.futures import Future
+		from recipes.chart_pool import ChartRenderPool
+		url = reverse('recipes:recipe_chart', args=['bar', 'png'])
+		previous = self.client.get(url)
+		self.assertEqual(previous.status_code, 200)
+
+		Recipe.objects.create(title="Tacos", instructions="Fold")
+		with mock.patch.object(ChartRenderPool, 'submit', return_value=Future()):
+			response = self.client.get(url)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.content, previous.content)
+		self.assertEqual(response['Cache-Control'], 'no-store')
+		self.assertEqual(response['ETag'], previous['ETag'])
+
+
+class StartupImportBudgetTests(SimpleTestCase):
+	"""Worker cold start: django.setup() plus URLconf loading."""
+
+	# Total self time of every import, in milliseconds. Override with the
+	# STARTUP_IMPORT_BUDGET_MS environment variable on slow machines.
+	BUDGET_MS = 750
+	HEAVY_MODULES = ('matplotlib', 'pandas', 'numpy')
+
+	@classmethod
+	def setUpClass(cls):
+		import os
+		import subprocess
+		import sys
+		from django.conf import settings as django_settings
+		super().setUpClass()
+		env = dict(os.environ, DJANGO_SETTINGS_MODULE='recipe_project.settings')
+		result = subprocess.run(
+			[
+				sys.executable, '-X', 'importtime', '-c',
+				'import django; django.setup(); '
+				'from django.urls import get_resolver; get_resolver().url_patterns',
+			],
+			cwd=django_settings.BASE_DIR, env=env, capture_output=True, text=True,
+		)
+		if result.returncode:
+			raise AssertionError(result.stderr)
+		cls.imports = {}
+		for line in result.stderr.splitlines():
+			if not line.startswith('import time:') or 'self [us]' in line:
+				continue
+			self_us, _cumulative, name = line[len('import time:'):].split('|')
+			cls.imports[name.strip()] = int(self_us)
+
+	def test_heavy_libraries_are_not_imported(self):
+		"""matplotlib, pandas and numpy are only loaded when a chart is rendered."""
+		loaded = [
+			name for name in self.imports
+			if name.split('.')[0] in self.HEAVY_MODULES
+		]
+		self.assertEqual(loaded, [])
+
+	def test_import_time_within_budget(self):
+		"""Total import time stays under the startup budget."""
+		import os
+		budget = float(os.environ.get('STARTUP_IMPORT_BUDGET_MS', self.BUDGET_MS))
+		total_ms = sum(self.imports.values()) / 1000
+		self.assertLess(total_ms, budget, f'Imports took {total_ms:.0f} ms')
+
+
+class QueryCountMiddlewareTests(TestCase):
+	"""Tests for the per-request SQL instrumentation middleware."""
+
+	@classmethod
+	def setUpTestData(cls):
+		Category.objects.create(name="Italian", slug="italian")
+
+	def setUp(self):
+		cache.clear()
+
+	@override_settings(QUERY_COUNT_HEADER=True)
+	def test_server_timing_header(self):
+		"""Query count and SQL time are reported in Server-Timing."""
+		response = self.client.get(reverse('categories:category_list'))
+		self.assertRegex(response['Server-Timing'], r'^db;dur=\d+\.\d;desc="2 queries"$')
+		self.assertEqual(response.wsgi_request.query_count, 2)
+
+	@override_settings(QUERY_COUNT_HEADER=False)
+	def test_header_disabled(self):
+		response = self.client.get(reverse('recipes:home'))
+		self.assertNotIn('Server-Timing', response)
+
+	@override_settings(QUERY_COUNT_WARNING_THRESHOLD=1)
+	def test_warns_above_threshold(self):
+		"""Views running more queries than the threshold are logged as warnings."""
+		with self.assertLogs('recipes.middleware', 'WARNING') as logs:
+			self.client.get(reverse('categories:category_list'))
+		self.assertIn('categories:category_list ran 2 queries', logs.output[0])
+
+
+class SyntheticCatalogTests(TestCase):
+	"""Tests for the synthetic catalog generator."""
+
+	def _generate(self, seed=7):
+		from recipes.synthetic import CatalogGenerator
+		return CatalogGenerator(
+			recipes=60, ingredients=40, categories=5, authors=3,
+			min_ingredients=2, max_ingredients=6, seed=seed, batch_size=25,
+		).run()
+
+	def test_generates_requested_sizes(self):
+		stats = self._generate()
+		self.assertEqual(Recipe.objects.count(), 60)
+		self.assertEqual(Ingredient.objects.count(), 40)
+		self.assertEqual(Category.objects.count(), 5)
+		self.assertEqual(RecipeIngredient.objects.count(), stats['recipe_ingredients'])
+		per_recipe = Recipe.objects.annotate(n=Count('recipe_ingredients')).values_list('n', flat=True)
+		self.assertTrue(all(2 <= n <= 6 for n in per_recipe))
+
+	def test_rows_are_consistent(self):
+		"""bulk_create skips save(), so derived columns and the FTS index are filled in explicitly."""
+		from django.db.models import F
+		from recipes.search import search_recipes
+		self._generate()
+		self.assertFalse(Recipe.objects.exclude(
+			total_time_minutes=F('prep_time_minutes') + F('cook_time_minutes')
+		).exists())
+		created = list(Recipe.objects.order_by('pk').values_list('created_at', flat=True))
+		self.assertEqual(created, sorted(created))
+		self.assertLess(created[0], created[-1])
+		title = Recipe.objects.first().title
+		self.assertTrue(search_recipes(Recipe.objects.all(), title).exists())
+		from recipes.counts import repair_all_counts
+		self.assertEqual(set(repair_all_counts(dry_run=True).values()), {0})
+
+	def test_same_seed_same_catalog(self):
+		from recipes.synthetic import clear_catalog
+		self._generate(seed=3)
+		first = list(Recipe.objects.order_by('pk').values_list('title', 'total_time_minutes'))
+		clear_catalog()
+		self.assertFalse(Recipe.objects.exists())
+		self._generate(seed=3)
+		second = list(Recipe.objects.order_by('pk').values_list('title', 'total_time_minutes'))
+		self.assertEqual(first, second)
+
+	def test_generation_invalidates_every_scope(self):
+		"""bulk_create() sends no signals, so every registered cache scope is bumped."""
+		from recipes.chart_cache import CHART_SCOPE
+		from recipes.similarity import SIMILAR_SCOPE
+		from recipes.versioning import _bulk_scopes, get_version
+		self.assertIn(CHART_SCOPE, _bulk_scopes)
+		self.assertIn(SIMILAR_SCOPE, _bulk_scopes)
+		before = {scope: get_version(scope) for scope in _bulk_scopes}
+		self._generate()
+		self.assertEqual([scope for scope in before if get_version(scope) == before[scope]], [])
+
+	def test_command_refuses_non_empty_catalog(self):
+		from django.core.management import CommandError, call_command
+		Category.objects.create(name="Italian", slug="italian")
+		with self.assertRaises(CommandError):
+			call_command('generate_catalog', recipes=5, ingredients=20, categories=2, stdout=StringIO())
+		call_command('generate_catalog', recipes=5, ingredients=20, categories=2, clear=True, stdout=StringIO())
+		self.assertEqual(Recipe.objects.count(), 5)
+
+
+class BenchmarkTests(TestCase):
+	"""Tests for the view benchmark harness."""
+
+	def test_run_benchmark_times_every_case(self):
+		from recipes import benchmark, charts
+		from recipes.synthetic import CatalogGenerator
+		CatalogGenerator(recipes=30, ingredients=20, categories=3, authors=2, seed=1).run()
+		with mock.patch.object(charts, 'render_chart', return_value=b'png'):
+			results = benchmark.run_benchmark(repeat=2)
+		views = {r['name']: r for r in results if r['kind'] == 'view'}
+		self.assertIn('recipe_detail', views)
+		self.assertIn('recipe_search:all', views)
+		self.assertTrue(all(r['status'] == 200 for r in views.values()))
+		self.assertEqual({r['name'] for r in results if r['kind'] == 'chart_render'}, set(charts.CHARTS))
+		for result in results:
+			self.assertEqual(result['runs'], 2)
+			self.assertLessEqual(result['min_ms'], result['median_ms'])
+			self.assertLessEqual(result['median_ms'], result['max_ms'])
+
+
+class ImportRecipesCommandTests(TestCase):
+	"""Tests for the import_recipes management command."""
+
+	CSV = (
+		'title,description,instructions,category,author,prep_time_minutes,cook_time_minutes,ingredients\n'
+		'Tomato Soup,Warm,Simmer,Soup,chef,10,20,Tomato:4:pcs;Salt;Basil:1:bunch\n'
+		'Bruschetta,Crunchy,Toast,Starters,ghost,5,5,tomato:2:pcs;Bread:4:slices;Basil\n'
+		',Missing title,,,,,,\n'
+		'Gazpacho,Cold,Blend,soup,,15,x,Tomato\n'
+		'Caprese,Fresh,Slice,Starters,,5,0,Tomato:2:pcs;Mozzarella:1:ball;Tomato:1:pcs\n'
+	)
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username="chef", password="pass12345")
+		cls.soup = Category.objects.create(name="Soup", slug="soup")
+		cls.salt = Ingredient.objects.create(name="Salt")
+
+	def setUp(self):
+		import tempfile
+		self.tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(self.tmp.cleanup)
+
+	def _write(self, name, content):
+		import os
+		path = os.path.join(self.tmp.name, name)
+		with open(path, 'w') as handle:
+			handle.write(content)
+		return path
+
+	def _import(self, path, **options):
+		from django.core.management import call_command
+		out, err = StringIO(), StringIO()
+		call_command('import_recipes', path, stdout=out, stderr=err, **options)
+		return out.getvalue(), err.getvalue()
+
+	def test_csv_import(self):
+		out, err = self._import(self._write('feed.csv', self.CSV), batch_size=2)
+		self.assertEqual(Recipe.objects.count(), 3)
+		soup = Recipe.objects.get(title='Tomato Soup')
+		self.assertEqual(soup.category, self.soup)
+		self.assertEqual(soup.author, self.user)
+		self.assertEqual(soup.total_time_minutes, 30)
+		self.assertEqual(
+			sorted(soup.recipe_ingredients.values_list('ingredient__name', 'unit')),
+			[('Basil', 'bunch'), ('Salt', ''), ('Tomato', 'pcs')],
+		)
+		# Names are matched case-insensitively against existing and new rows
+		self.assertEqual(Ingredient.objects.filter(name__iexact='tomato').count(), 1)
+		self.assertEqual(Ingredient.objects.filter(name='Salt').count(), 1)
+		bruschetta = Recipe.objects.get(title='Bruschetta')
+		self.assertIsNone(bruschetta.author)
+		self.assertEqual(bruschetta.category.slug, 'starters')
+		# Duplicate ingredient lines keep the first one
+		self.assertEqual(Recipe.objects.get(title='Caprese').recipe_ingredients.count(), 2)
+		self.assertIn('Record 3: title is required', err)
+		self.assertIn('Record 4: cook_time_minutes', err)
+		self.assertIn('Imported 3 recipe(s)', out)
+		self.assertIn('skipped 2 invalid record(s)', out)
+		# bulk_create() sends no signals; the importer keeps the counts itself
+		self.assertEqual(Category.objects.get(slug='starters').recipe_count, 2)
+		self.assertEqual(Ingredient.objects.get(name='Tomato').recipe_count, 3)
+		self.assertEqual(Ingredient.objects.get(name='Salt').recipe_count, 1)
+		from recipes.models import RecipeSignature
+		self.assertEqual(RecipeSignature.objects.count(), 3)
+
+	def test_jsonl_import_uses_a_few_queries_per_batch(self):
+		"""Names resolve through the caches instead of a get_or_create per row."""
+		import json
+
+		def feed(count):
+			return ''.join(
+				json.dumps({
+					'title': f'Dish {i}', 'category': 'Soup',
+					'ingredients': [{'name': 'Salt', 'quantity': 1, 'unit': 'tsp'}, 'Water'],
+				}) + '\n'
+				for i in range(count)
+			)
+
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		with CaptureQueriesContext(connection) as queries:
+			self._import(self._write('feed.jsonl', feed(200)))
+		self.assertEqual(Recipe.objects.count(), 200)
+		self.assertEqual(RecipeIngredient.objects.count(), 400)
+		self.assertEqual(Ingredient.objects.filter(name='Water').count(), 1)
+		# The similarity buckets (16 per recipe) add a few more bulk INSERTs,
+		# still nowhere near one query per record
+		self.assertLess(len(queries), 40)
+
+	def test_resume_skips_committed_records(self):
+		import os
+		from recipes.importer import Checkpoint
+		path = self._write('feed.csv', self.CSV)
+		# A previous run committed the first two records, then died
+		Checkpoint(f'{path}.checkpoint', path).save(2)
+		out, _err = self._import(path, resume=True)
+		self.assertIn('Resuming after record 2', out)
+		self.assertEqual(
+			sorted(Recipe.objects.values_list('title', flat=True)), ['Caprese'],
+		)
+		# A finished import removes its checkpoint
+		self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+
+class RecipeApiTests(TestCase):
+	"""Tests for the read-only JSON API."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username="chef", password="pass12345")
+		cls.category = Category.objects.create(name="Italian", slug="italian")
+		cls.tomato = Ingredient.objects.create(name="Tomato", default_unit="pcs")
+		cls.basil = Ingredient.objects.create(name="Basil")
+		cls.recipes = []
+		for i in range(5):
+			recipe = Recipe.objects.create(
+				title=f"Pasta {i}", description="Simple", instructions="Boil " * 50,
+				author=cls.user, category=cls.category, prep_time_minutes=i, cook_time_minutes=10,
+			)
+			RecipeIngredient.objects.create(recipe=recipe, ingredient=cls.tomato, quantity=2, unit="pcs")
+			RecipeIngredient.objects.create(recipe=recipe, ingredient=cls.basil)
+			cls.recipes.append(recipe)
+
+	def test_list_pages_with_cursors(self):
+		url = reverse('api:recipe_list')
+		titles = []
+		while url:
+			data = self.client.get(url, {'limit': 2} if '?' not in url else None).json()
+			titles += [row['title'] for row in data['results']]
+			url = data['next']
+		self.assertEqual(titles, [f"Pasta {i}" for i in reversed(range(5))])
+
+	def test_list_defaults_skip_heavy_fields(self):
+		row = self.client.get(reverse('api:recipe_list')).json()['results'][0]
+		self.assertNotIn('instructions', row)
+		self.assertNotIn('ingredients', row)
+		self.assertEqual(row['category'], {'id': self.category.pk, 'name': 'Italian', 'slug': 'italian'})
+		self.assertEqual(row['author'], 'chef')
+		self.assertTrue(row['url'].endswith(reverse('api:recipe_detail', args=[row['id']])))
+
+	def test_fields_limit_loaded_columns(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(reverse('api:recipe_list'), {'fields': 'id,title'})
+		self.assertEqual(set(response.json()['results'][0]), {'id', 'title'})
+		self.assertEqual(len(queries), 1)
+		self.assertNotIn('"instructions"', queries[0]['sql'])
+		self.assertNotIn('categories_category', queries[0]['sql'])
+
+	def test_unknown_field_is_rejected(self):
+		response = self.client.get(reverse('api:recipe_list'), {'fields': 'title,secret'})
+		self.assertEqual(response.status_code, 400)
+		self.assertIn('secret', response.json()['error'])
+
+	def test_list_filters(self):
+		data = self.client.get(reverse('api:recipe_list'), {'max_time': 11, 'fields': 'title'}).json()
+		self.assertEqual([row['title'] for row in data['results']], ['Pasta 1', 'Pasta 0'])
+		self.assertEqual(self.client.get(reverse('api:recipe_list'), {'limit': 0}).status_code, 400)
+
+	def test_detail_and_etag(self):
+		url = reverse('api:recipe_detail', args=[self.recipes[0].pk])
+		response = self.client.get(url)
+		data = response.json()
+		self.assertEqual(data['ingredients'][0], {
+			'id': self.tomato.pk, 'name': 'Tomato', 'quantity': '2.00', 'unit': 'pcs', 'notes': '',
+		})
+		etag = response['ETag']
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+		# A different field set is a different representation
+		self.assertEqual(self.client.get(url, {'fields': 'title'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+		# Renaming an ingredient does not touch the recipe but changes its payload
+		self.tomato.name = 'Roma Tomato'
+		self.tomato.save()
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+		self.assertEqual(self.client.get(reverse('api:recipe_detail', args=[0])).status_code, 404)
+
+	def test_list_etag_changes_when_a_recipe_is_updated(self):
+		url = reverse('api:recipe_list')
+		etag = self.client.get(url)['ETag']
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+		recipe = self.recipes[-1]
+		recipe.title = 'Renamed'
+		recipe.save()
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+	def test_batch_get_prefetches(self):
+		ids = [self.recipes[3].pk, 999999, self.recipes[1].pk]
+		# recipes (with category and author joined), then their ingredient lines
+		with self.assertNumQueries(2):
+			response = self.client.get(
+				reverse('api:recipe_batch'),
+				{'ids': ','.join(map(str, ids)), 'fields': 'id,category,author,ingredients'},
+			)
+		data = response.json()
+		self.assertEqual([row['id'] for row in data['results']], [ids[0], ids[2]])
+		self.assertEqual(data['missing'], [999999])
+		self.assertEqual(len(data['results'][0]['ingredients']), 2)
+		self.assertEqual(self.client.get(reverse('api:recipe_batch'), {'ids': 'a,b'}).status_code, 400)
+
+	def test_read_only(self):
+		self.assertEqual(self.client.post(reverse('api:recipe_list')).status_code, 405)
+
+	def test_category_and_ingredient_endpoints(self):
+		data = self.client.get(reverse('api:category_list'), {'fields': 'name,recipe_count'}).json()
+		self.assertEqual(data['results'], [{'name': 'Italian', 'recipe_count': 5}])
+		response = self.client.get(reverse('api:ingredient_list'), {'q': 'tom'})
+		self.assertEqual([row['name'] for row in response.json()['results']], ['Tomato'])
+		self.assertEqual(
+			self.client.get(reverse('api:ingredient_list'), {'q': 'tom'}, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+			304,
+		)
+		detail = self.client.get(reverse('api:ingredient_detail', args=[self.basil.pk])).json()
+		self.assertEqual(detail, {'id': self.basil.pk, 'name': 'Basil', 'default_unit': '', 'recipe_count': 5})
+
+
+class RecipeCountTests(TestCase):
+	"""Tests for the denormalized recipe_count columns."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.italian = Category.objects.create(name="Italian", slug="italian")
+		cls.mexican = Category.objects.create(name="Mexican", slug="mexican")
+		cls.tomato = Ingredient.objects.create(name="Tomato")
+		cls.basil = Ingredient.objects.create(name="Basil")
+
+	def _counts(self):
+		return (
+			dict(Category.objects.values_list('name', 'recipe_count')),
+			dict(Ingredient.objects.values_list('name', 'recipe_count')),
+		)
+
+	def test_recipe_save_and_delete_update_category_counts(self):
+		pasta = Recipe.objects.create(title="Pasta", instructions="Boil", category=self.italian)
+		Recipe.objects.create(title="Pizza", instructions="Bake", category=self.italian)
+		self.assertEqual(self._counts()[0], {'Italian': 2, 'Mexican': 0})
+		# Moving a recipe decrements the old category and increments the new one
+		pasta.category = self.mexican
+		pasta.save()
+		self.assertEqual(self._counts()[0], {'Italian': 1, 'Mexican': 1})
+		# Saves that leave the category alone do not touch the counts
+		pasta.title = "Fusion Pasta"
+		pasta.save(update_fields=['title'])
+		pasta.save()
+		self.assertEqual(self._counts()[0], {'Italian': 1, 'Mexican': 1})
+		pasta.category = None
+		pasta.save()
+		self.assertEqual(self._counts()[0], {'Italian': 1, 'Mexican': 0})
+		Recipe.objects.filter(category=self.italian).delete()
+		self.assertEqual(self._counts()[0], {'Italian': 0, 'Mexican': 0})
+
+	def test_recipe_ingredient_changes_update_ingredient_counts(self):
+		soup = Recipe.objects.create(title="Soup", instructions="Simmer")
+		salad = Recipe.objects.create(title="Salad", instructions="Toss")
+		line = RecipeIngredient.objects.create(recipe=soup, ingredient=self.tomato)
+		RecipeIngredient.objects.create(recipe=salad, ingredient=self.tomato)
+		RecipeIngredient.objects.create(recipe=salad, ingredient=self.basil)
+		self.assertEqual(self._counts()[1], {'Tomato': 2, 'Basil': 1})
+		line.ingredient = self.basil
+		line.save()
+		self.assertEqual(self._counts()[1], {'Tomato': 1, 'Basil': 2})
+		# Deleting a recipe cascades to its lines, which uncount themselves
+		salad.delete()
+		self.assertEqual(self._counts()[1], {'Tomato': 0, 'Basil': 1})
+
+	def test_repair_command_fixes_drift(self):
+		from django.core.management import call_command
+		Recipe.objects.create(title="Pasta", instructions="Boil", category=self.italian)
+		# QuerySet.update() bypasses the signals, leaving the counts stale
+		Recipe.objects.update(category=self.mexican)
+		Ingredient.objects.filter(pk=self.basil.pk).update(recipe_count=7)
+
+		out = StringIO()
+		call_command('repair_recipe_counts', dry_run=True, stdout=out)
+		self.assertIn('Category: 2 row(s) have', out.getvalue())
+		self.assertEqual(self._counts()[0], {'Italian': 1, 'Mexican': 0})
+
+		out = StringIO()
+		call_command('repair_recipe_counts', stdout=out)
+		self.assertIn('Repaired 3 row(s).', out.getvalue())
+		self.assertEqual(self._counts(), ({'Italian': 0, 'Mexican': 1}, {'Tomato': 0, 'Basil': 0}))
+
+
+class PrefixIndexTests(SimpleTestCase):
+	"""Tests for the bisect-based prefix index."""
+
+	def setUp(self):
+		from recipes.typeahead import PrefixIndex
+		self.index = PrefixIndex()
+		self.index.load([(1, 'Tomato', 5), (2, 'Cherry Tomatoes', 9), (3, 'Tofu', 2), (4, 'Basil', 7)])
+
+	def test_matches_any_word_prefix_ranked_by_count(self):
+		self.assertEqual(
+			[label for _key, label, _count in self.index.search('tom')],
+			['Cherry Tomatoes', 'Tomato'],
+		)
+		self.assertEqual([key for key, _label, _count in self.index.search('TO', limit=2)], [2, 1])
+
+	def test_every_query_word_must_match(self):
+		self.assertEqual([key for key, _l, _c in self.index.search('tom ch')], [2])
+		self.assertEqual(self.index.search('tom basil'), [])
+
+	def test_incremental_updates(self):
+		self.index.put(5, 'Tomatillo')
+		self.index.put(3, 'Smoked Tofu')  # rename keeps the count
+		self.index.adjust(1, 10)
+		self.index.remove(2)
+		self.assertEqual(
+			[(key, count) for key, _label, count in self.index.search('to')],
+			[(1, 15), (3, 2), (5, 0)],
+		)
+		self.assertEqual(self.index.search('cherry'), [])
+		self.assertEqual([key for key, _l, _c in self.index.search('smo')], [3])
+
+
+class TypeaheadTests(TestCase):
+	"""Tests for the typeahead endpoint and its signal-maintained index."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.tomato = Ingredient.objects.create(name="Tomato")
+		cls.tomatillo = Ingredient.objects.create(name="Tomatillo")
+		cls.basil = Ingredient.objects.create(name="Basil")
+		cls.soup = Recipe.objects.create(title="Tomato Soup", instructions="Simmer")
+		Recipe.objects.create(title="Tomato Soup", instructions="Simmer longer")
+		Recipe.objects.create(title="Tomato Salad", instructions="Slice")
+		RecipeIngredient.objects.create(recipe=cls.soup, ingredient=cls.tomato)
+
+	def setUp(self):
+		from recipes.typeahead import get_index
+		# Start every test from a fresh build of this test's data
+		get_index().invalidate()
+
+	def _get(self, **params):
+		response = self.client.get(reverse('api:typeahead'), params)
+		self.assertEqual(response.status_code, 200)
+		return response.json()
+
+	def test_suggests_ingredients_and_titles_by_recipe_count(self):
+		data = self._get(q='tom')
+		self.assertEqual(
+			data['ingredients'],
+			[
+				{'id': self.tomato.pk, 'name': 'Tomato', 'recipe_count': 1},
+				{'id': self.tomatillo.pk, 'name': 'Tomatillo', 'recipe_count': 0},
+			],
+		)
+		self.assertEqual(
+			data['recipes'],
+			[{'title': 'Tomato Soup', 'recipe_count': 2}, {'title': 'Tomato Salad', 'recipe_count': 1}],
+		)
+
+	def test_types_limit_and_minimum_length(self):
+		data = self._get(q='tom', types='ingredients', limit=1)
+		self.assertEqual(list(data), ['query', 'ingredients'])
+		self.assertEqual([item['name'] for item in data['ingredients']], ['Tomato'])
+		self.assertEqual(self._get(q='t'), {'query': 't', 'ingredients': [], 'recipes': []})
+		response = self.client.get(reverse('api:typeahead'), {'q': 'tom', 'types': 'users'})
+		self.assertEqual(response.status_code, 400)
+
+	def test_index_follows_saves_and_deletes(self):
+		self._get(q='tom')  # build the index
+		with self.captureOnCommitCallbacks(execute=True):
+			RecipeIngredient.objects.create(recipe=self.soup, ingredient=self.tomatillo)
+			RecipeIngredient.objects.create(
+				recipe=Recipe.objects.create(title="Salsa Verde", instructions="Blend"), ingredient=self.tomatillo,
+			)
+			self.basil.name = "Thai Basil"
+			self.basil.save()
+			self.soup.title = "Roast Tomato Soup"
+			self.soup.save()
+		with self.assertNumQueries(0):
+			data = self._get(q='tom')
+		self.assertEqual([item['name'] for item in data['ingredients']], ['Tomatillo', 'Tomato'])
+		self.assertEqual(
+			[(item['title'], item['recipe_count']) for item in data['recipes']],
+			[('Roast Tomato Soup', 1), ('Tomato Salad', 1), ('Tomato Soup', 1)],
+		)
+		self.assertEqual([item['name'] for item in self._get(q='thai')['ingredients']], ['Thai Basil'])
+		with self.captureOnCommitCallbacks(execute=True):
+			self.tomato.delete()
+			Recipe.objects.filter(title="Tomato Salad").delete()
+		data = self._get(q='tom')
+		self.assertEqual([item['name'] for item in data['ingredients']], ['Tomatillo'])
+		self.assertNotIn('Tomato Salad', [item['title'] for item in data['recipes']])
+
+	def test_bulk_changes_rebuild_the_index(self):
+		from recipes.typeahead import TYPEAHEAD_SCOPE
+		from recipes.versioning import bump_version
+		self._get(q='tom')
+		Ingredient.objects.bulk_create([Ingredient(name="Tomato Paste")])
+		bump_version(TYPEAHEAD_SCOPE)
+		self.assertIn('Tomato Paste', [item['name'] for item in self._get(q='tom')['ingredients']])
+
+	def test_other_processes_replay_changes_without_rebuilding(self):
+		"""Signal-driven changes reach another process's copy through the change log."""
+		from recipes.typeahead import TypeaheadIndex, get_index
+		other = TypeaheadIndex()  # another worker process's copy
+		other.search('tom')
+		get_index().search('tom')
+		version = other._version
+		with self.captureOnCommitCallbacks(execute=True):
+			Ingredient.objects.create(name="Tomato Paste")
+			self.soup.title = "Tomato Bisque"
+			self.soup.save()
+		with mock.patch.object(other, 'build') as build, self.assertNumQueries(0):
+			data = other.search('tom')
+		build.assert_not_called()
+		self.assertEqual(other._version, version)
+		self.assertIn('Tomato Paste', [label for _key, label, _count in data['ingredients']])
+		self.assertIn('Tomato Bisque', [label for _key, label, _count in data['recipes']])
+		self.assertEqual(data, get_index().search('tom'))
+
+	def test_missing_log_entries_force_a_rebuild(self):
+		from recipes.indexing import LOG_ENTRY_KEY
+		from recipes.typeahead import TYPEAHEAD_SCOPE, TypeaheadIndex
+		other = TypeaheadIndex()
+		other.search('tom')
+		with self.captureOnCommitCallbacks(execute=True):
+			Ingredient.objects.create(name="Tomato Paste")
+		cache.delete(LOG_ENTRY_KEY.format(scope=TYPEAHEAD_SCOPE, version=other._version, position=other._position + 1))
+		with mock.patch.object(other, 'build', wraps=other.build) as build:
+			data = other.search('tom')
+		build.assert_called_once()
+		self.assertIn('Tomato Paste', [label for _key, label, _count in data['ingredients']])
+
+	def test_rolled_back_changes_are_not_indexed(self):
+		"""Changes reach the index (and its shared log) only when their transaction commits."""
+		from django.db import transaction
+		self._get(q='tom')
+		with self.captureOnCommitCallbacks(execute=True):
+			try:
+				with transaction.atomic():
+					Ingredient.objects.create(name="Tomato Paste")
+					Recipe.objects.create(title="Tomato Bread", instructions="Bake")
+					self.tomato.delete()
+					raise RuntimeError
+			except RuntimeError:
+				pass
+		data = self._get(q='tom')
+		self.assertEqual([item['name'] for item in data['ingredients']], ['Tomato', 'Tomatillo'])
+		self.assertNotIn('Tomato Bread', [item['title'] for item in data['recipes']])
+
+	def test_search_form_uses_typeahead_instead_of_select(self):
+		user = User.objects.create_user(username="searcher", password="pass12345")
+		self.client.force_login(user)
+		response = self.client.get(reverse('recipes:recipe_search'), {'ingredient': self.tomato.pk})
+		self.assertNotContains(response, '<select name="ingredient"')
+		self.assertContains(response, 'data-typeahead-url="%s"' % reverse('api:typeahead'))
+		self.assertContains(response, 'value="Tomato"')
+		self.assertContains(response, 'name="ingredient" value="%d"' % self.tomato.pk)
+
+
+class TrigramIndexTests(SimpleTestCase):
+	"""Tests for the trigram index behind typo-tolerant search."""
+
+	def setUp(self):
+		from recipes.fuzzy import TrigramIndex
+		self.index = TrigramIndex()
+		self.index.load([('Chicken Curry', 3), ('Chickpea Salad', 1), ('Parmesan Risotto', 2), ('Chicken Soup', 1)])
+
+	def test_similar_words_ranked_by_similarity_then_use(self):
+		self.assertEqual([word for word, _score in self.index.similar('chiken', 0.2)], ['chicken', 'chickpea'])
+		word, score = self.index.similar('parmesean', 0.4)[0]
+		self.assertEqual(word, 'parmesan')
+		self.assertAlmostEqual(score, 7 / 12)
+		self.assertEqual(self.index.similar('zzzzz', 0.3), [])
+
+	def test_suggest_corrects_only_unknown_words(self):
+		self.assertEqual(self.index.suggest('Chiken cury', 0.4), 'chicken curry')
+		self.assertEqual(self.index.suggest('parmesean risot', 0.4), 'parmesan risot')
+		self.assertIsNone(self.index.suggest('chick soup', 0.4))
+		self.assertIsNone(self.index.suggest('xyz qwerty', 0.4))
+
+	def test_incremental_updates(self):
+		self.index.add('Chickn Wings')
+		self.index.discard('Chicken Curry', 3)
+		self.index.discard('Chicken Soup')
+		self.assertEqual(self.index.count('chicken'), 0)
+		self.assertEqual(self.index.count('chickn'), 1)
+		self.assertEqual(self.index.suggest('chikn wings', 0.4), 'chickn wings')
+		self.assertIsNone(self.index.suggest('chiken', 0.4))
+		self.assertFalse(self.index.known('curry'))
+
+
+@override_settings(FUZZY_SEARCH_THRESHOLD=0.4)
+class FuzzySearchTests(TestCase):
+	"""Tests for the "did you mean" retries of recipe_list, recipe_search and ingredient_list."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.parmesan = Ingredient.objects.create(name="Parmesan Cheese")
+		Ingredient.objects.create(name="Chicken Thighs")
+		cls.curry = Recipe.objects.create(title="Chicken Curry", instructions="Simmer")
+		Recipe.objects.create(title="Mushroom Risotto", instructions="Stir")
+		cls.user = User.objects.create_user(username="searcher", password="pass12345")
+
+	def setUp(self):
+		from recipes.fuzzy import get_index
+		cache.clear()
+		get_index().invalidate()
+
+	def test_recipe_list_retries_misspelt_search(self):
+		response = self.client.get(reverse('recipes:recipe_list'), {'q': 'chiken', 'category': ''})
+		self.assertEqual(response.context['suggestion'], 'chicken')
+		self.assertEqual([recipe.title for recipe in response.context['recipes']], ['Chicken Curry'])
+		self.assertContains(response, 'Showing results for')
+		self.assertContains(response, '<a href="?q=chicken">chicken</a>', html=True)
+
+	def test_recipe_list_exact_search_has_no_suggestion(self):
+		response = self.client.get(reverse('recipes:recipe_list'), {'q': 'chicken'})
+		self.assertIsNone(response.context['suggestion'])
+		self.assertNotContains(response, 'did-you-mean')
+
+	def test_suggestion_without_results_is_offered_as_a_question(self):
+		category = Category.objects.create(name="Desserts", slug="desserts")
+		response = self.client.get(reverse('recipes:recipe_list'), {'q': 'chiken', 'category': category.slug})
+		self.assertEqual(response.context['suggestion'], 'chicken')
+		self.assertEqual(list(response.context['recipes']), [])
+		self.assertContains(response, 'Did you mean')
+		self.assertEqual(response.context['suggestion_query'], 'q=chicken&category=desserts')
+
+	def test_recipe_search_retries_recipe_name(self):
+		self.client.force_login(self.user)
+		response = self.client.get(reverse('recipes:recipe_search'), {'recipe_name': 'risoto'})
+		self.assertEqual(response.context['suggestion'], 'risotto')
+		self.assertEqual([row['title'] for row in response.context['results']], ['Mushroom Risotto'])
+		self.assertEqual(response.context['export_query'], 'recipe_name=risotto')
+
+	def test_ingredient_list_retries_misspelt_search(self):
+		response = self.client.get(reverse('ingredients:ingredient_list'), {'q': 'parmesean'})
+		self.assertEqual(response.context['suggestion'], 'parmesan')
+		self.assertEqual([ingredient.pk for ingredient in response.context['ingredients']], [self.parmesan.pk])
+
+	def test_index_follows_saves_and_deletes(self):
+		self.client.get(reverse('recipes:recipe_list'), {'q': 'chiken'})  # build the index
+		with self.captureOnCommitCallbacks(execute=True):
+			self.curry.title = "Lentil Curry"
+			self.curry.save()
+			Ingredient.objects.filter(name="Chicken Thighs").get().delete()
+			self.parmesan.name = "Pecorino"
+			self.parmesan.save()
+		from recipes.fuzzy import get_index
+		with self.assertNumQueries(0):
+			self.assertEqual(get_index().suggest_title('lentl'), 'lentil')
+			self.assertIsNone(get_index().suggest_title('chiken'))
+			self.assertIsNone(get_index().suggest_ingredient('parmesean'))
+			self.assertEqual(get_index().suggest_ingredient('pecorin0'), 'pecorino')
+
+	def test_rolled_back_words_are_not_suggested(self):
+		"""Titles and ingredients that never committed do not become suggestions."""
+		from django.db import transaction
+		from recipes.fuzzy import get_index
+		get_index().suggest_title('chiken')  # build the index
+		with self.captureOnCommitCallbacks(execute=True):
+			try:
+				with transaction.atomic():
+					Recipe.objects.create(title="Zucchini Bread", instructions="Bake")
+					Ingredient.objects.create(name="Zucchini")
+					raise RuntimeError
+			except RuntimeError:
+				pass
+		self.assertIsNone(get_index().suggest_title('zuchini'))
+		self.assertIsNone(get_index().suggest_ingredient('zuchini'))
+
+
+class PantryTests(TestCase):
+	"""Tests for the pantry matcher, its page and its API."""
+
+	@classmethod
+	def setUpTestData(cls):
+		names = ['Egg', 'Flour', 'Milk', 'Butter', 'Sugar', 'Salt']
+		cls.ing = {name: Ingredient.objects.create(name=name) for name in names}
+
+		def recipe(title, *ingredients):
+			obj = Recipe.objects.create(title=title, instructions="Cook")
+			for name in ingredients:
+				RecipeIngredient.objects.create(recipe=obj, ingredient=cls.ing[name])
+			return obj
+
+		cls.pancakes = recipe("Pancakes", 'Egg', 'Flour', 'Milk')
+		cls.cake = recipe("Cake", 'Egg', 'Flour', 'Butter', 'Sugar')
+		cls.omelette = recipe("Omelette", 'Egg', 'Salt')
+		cls.shortbread = recipe("Shortbread", 'Flour', 'Butter', 'Sugar')
+
+	def setUp(self):
+		from recipes.pantry import get_index
+		get_index().invalidate()
+
+	def _ids(self, *names):
+		return [self.ing[name].pk for name in names]
+
+	def _match(self, *names, **kwargs):
+		from recipes.pantry import get_index
+		count, matches = get_index().match(self._ids(*names), **kwargs)
+		return count, [(match.recipe_id, match.have, match.total) for match in matches]
+
+	def test_ranks_by_coverage_then_fewest_missing(self):
+		count, matches = self._match('Egg', 'Flour', 'Milk', 'Sugar')
+		self.assertEqual(count, 4)
+		self.assertEqual(matches, [
+			(self.pancakes.pk, 3, 3),
+			(self.cake.pk, 3, 4),
+			(self.shortbread.pk, 2, 3),
+			(self.omelette.pk, 1, 2),
+		])
+		self.assertEqual(self._match('Egg', 'Flour', 'Milk', 'Sugar', max_missing=0)[1], [(self.pancakes.pk, 3, 3)])
+		self.assertEqual(self._match('Egg', offset=1, limit=1), (3, [(self.pancakes.pk, 1, 3)]))
+		self.assertEqual(self._match(), (0, []))
+
+	def test_posting_lists_follow_ingredient_lines(self):
+		self._match('Egg')  # build the index
+		line = RecipeIngredient.objects.get(recipe=self.omelette, ingredient=self.ing['Salt'])
+		with self.captureOnCommitCallbacks(execute=True):
+			line.ingredient = self.ing['Milk']
+			line.save()
+		self.assertEqual(self._match('Egg', 'Milk', max_missing=0), (1, [(self.omelette.pk, 2, 2)]))
+		with self.captureOnCommitCallbacks(execute=True):
+			RecipeIngredient.objects.create(recipe=self.pancakes, ingredient=self.ing['Salt'])
+			self.cake.delete()
+		with self.assertNumQueries(0):
+			count, matches = self._match('Egg', 'Milk')
+		self.assertEqual(count, 2)
+		self.assertEqual(matches, [(self.omelette.pk, 2, 2), (self.pancakes.pk, 2, 4)])
+
+	def test_rolled_back_lines_are_not_indexed(self):
+		"""Posting lists change only when the ingredient lines commit."""
+		from django.db import transaction
+		self._match('Egg')  # build the index
+		with self.captureOnCommitCallbacks(execute=True):
+			try:
+				with transaction.atomic():
+					tart = Recipe.objects.create(title="Tart", instructions="Bake")
+					RecipeIngredient.objects.create(recipe=tart, ingredient=self.ing['Milk'])
+					RecipeIngredient.objects.filter(recipe=self.pancakes, ingredient=self.ing['Milk']).delete()
+					raise RuntimeError
+			except RuntimeError:
+				pass
+		self.assertEqual(self._match('Milk'), (1, [(self.pancakes.pk, 1, 3)]))
+
+	def test_pantry_page(self):
+		response = self.client.get(reverse('recipes:pantry'), {
+			'ingredients': 'egg, FLOUR\nmilk, dragon fruit', 'max_missing': '1',
+		})
+		self.assertEqual(response.status_code, 200)
+		matches = response.context['matches']
+		self.assertEqual([match.recipe for match in matches], [self.pancakes, self.omelette])
+		self.assertEqual(matches[0].missing_ingredients, [])
+		self.assertEqual([i.name for i in matches[1].missing_ingredients], ['Salt'])
+		self.assertContains(response, 'Not found: dragon fruit')
+		self.assertContains(response, '100% covered')
+
+	def test_pantry_page_errors(self):
+		response = self.client.get(reverse('recipes:pantry'), {'ingredients': 'dragon fruit'})
+		self.assertFormError(response.context['form'], 'ingredients', 'None of these ingredients are in the catalog.')
+		response = self.client.get(reverse('recipes:pantry'))
+		self.assertEqual(response.status_code, 200)
+		self.assertFalse(response.context['form'].is_bound)
+
+	def test_pantry_api(self):
+		ids = ','.join(str(pk) for pk in self._ids('Egg', 'Flour', 'Sugar'))
+		response = self.client.get(reverse('api:pantry'), {'ingredients': ids, 'limit': 2})
+		self.assertEqual(response.status_code, 200)
+		data = response.json()
+		self.assertEqual(data['count'], 4)
+		first = data['results'][0]
+		self.assertEqual(first['recipe']['id'], self.cake.pk)
+		self.assertEqual((first['have'], first['total'], first['coverage']), (3, 4, 0.75))
+		self.assertEqual(first['missing'], [{'id': self.ing['Butter'].pk, 'name': 'Butter'}])
+		self.assertIn('offset=2', data['next'])
+		self.assertIsNone(data['previous'])
+		self.assertEqual(len(self.client.get(data['next']).json()['results']), 2)
+		self.assertEqual(self.client.get(reverse('api:pantry')).status_code, 400)
+		self.assertEqual(self.client.get(reverse('api:pantry'), {'ingredients': 'x'}).status_code, 400)
+
+
+class SimilarRecipesTests(TestCase):
+	"""Tests for the MinHash/LSH similar recipes panel."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.ing = [Ingredient.objects.create(name=f"Ingredient {i}") for i in range(12)]
+
+	def setUp(self):
+		cache.clear()
+
+	def _recipe(self, title, *indexes):
+		with self.captureOnCommitCallbacks(execute=True):
+			recipe = Recipe.objects.create(title=title, instructions="Cook")
+			for i in indexes:
+				RecipeIngredient.objects.create(recipe=recipe, ingredient=self.ing[i])
+		return recipe
+
+	def test_vectorised_signatures_match(self):
+		from recipes.similarity import agreement, minhash, minhash_many
+		groups = [[self.ing[0].pk, self.ing[3].pk], [5, 9, 1000], [7]]
+		matrix = minhash_many(groups)
+		for group, row in zip(groups, matrix):
+			self.assertEqual(list(minhash(group)), [int(value) for value in row])
+		self.assertEqual(agreement(minhash([1, 2, 3]), minhash([3, 2, 1])), 1.0)
+		self.assertLess(agreement(minhash([1, 2, 3]), minhash([4, 5, 6])), 0.2)
+
+	def test_detail_page_lists_similar_recipes(self):
+		base = self._recipe("Base", 0, 1, 2, 3, 4, 5)
+		close = self._recipe("Close", 0, 1, 2, 3, 4, 6)
+		self._recipe("Unrelated", 7, 8, 9, 10, 11)
+		response = self.client.get(reverse('recipes:recipe_detail', args=[base.pk]))
+		self.assertEqual(response.context['similar_recipes'], [close])
+		self.assertContains(response, 'Similar Recipes')
+		self.assertContains(response, reverse('recipes:recipe_detail', args=[close.pk]))
+
+	def test_signatures_follow_ingredient_changes(self):
+		from recipes.models import RecipeBucket, RecipeSignature
+		from recipes.similarity import find_similar
+		base = self._recipe("Base", 0, 1, 2, 3)
+		other = self._recipe("Other", 7, 8, 9, 10)
+		self.assertEqual(find_similar(base.pk), [])
+		self.assertEqual(RecipeBucket.objects.filter(recipe=other).count(), 16)
+		# Rewriting "Other" to match "Base" refreshes its signature once
+		with self.captureOnCommitCallbacks(execute=True) as callbacks:
+			RecipeIngredient.objects.filter(recipe=other).delete()
+			for i in (0, 1, 2, 3):
+				RecipeIngredient.objects.create(recipe=other, ingredient=self.ing[i])
+		self.assertEqual(find_similar(base.pk), [other.pk])
+		with mock.patch('recipes.similarity.refresh_signatures') as refresh:
+			for callback in callbacks:
+				callback()
+		refresh.assert_not_called()
+		with self.captureOnCommitCallbacks(execute=True):
+			RecipeIngredient.objects.filter(recipe=other).delete()
+		self.assertFalse(RecipeSignature.objects.filter(recipe=other).exists())
+		self.assertEqual(find_similar(base.pk), [])
+
+	def test_rolled_back_changes_are_not_refreshed(self):
+		"""Ids collected in a rolled back block are dropped with its on_commit callbacks."""
+		from django.db import transaction
+		from recipes import similarity
+		base = self._recipe("Base", 0, 1)
+		other = self._recipe("Other", 2, 3)
+		with mock.patch.object(similarity, 'refresh_signatures', wraps=similarity.refresh_signatures) as refresh:
+			with self.captureOnCommitCallbacks(execute=True):
+				try:
+					with transaction.atomic():
+						RecipeIngredient.objects.create(recipe=base, ingredient=self.ing[4])
+						raise RuntimeError
+				except RuntimeError:
+					pass
+				RecipeIngredient.objects.create(recipe=other, ingredient=self.ing[5])
+				RecipeIngredient.objects.create(recipe=other, ingredient=self.ing[6])
+		refresh.assert_called_once_with({other.pk}, 'default')
+
+	def test_rebuild_command(self):
+		from django.core.management import call_command
+		from recipes.models import RecipeBucket, RecipeSignature
+		recipes = Recipe.objects.bulk_create([Recipe(title=f"Dish {i}", instructions="Cook") for i in range(3)])
+		RecipeIngredient.objects.bulk_create([
+			RecipeIngredient(recipe=recipe, ingredient=self.ing[i])
+			for recipe in recipes for i in (0, 1, 2)
+		])
+		Recipe.objects.create(title="No ingredients", instructions="Wait")
+		out = StringIO()
+		call_command('rebuild_similar_recipes', batch_size=2, stdout=out)
+		self.assertIn('Signed 3 recipe(s)', out.getvalue())
+		self.assertEqual(RecipeSignature.objects.count(), 3)
+		self.assertEqual(RecipeBucket.objects.count(), 3 * 16)
+		from recipes.similarity import find_similar
+		self.assertEqual(find_similar(recipes[0].pk), [recipes[2].pk, recipes[1].pk])
+
+
+class PageCacheTests(TestCase):
+	"""Versioned full-page cache for anonymous visitors."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username="chef", password="pass12345")
+		cls.category = Category.objects.create(name="Italian", slug="italian")
+		cls.recipe = Recipe.objects.create(
+			title="Pasta", instructions="Boil", author=cls.user, category=cls.category,
+		)
+
+	def setUp(self):
+		cache.clear()
+
+	def test_repeat_view_is_served_without_queries(self):
+		urls = [
+			reverse('recipes:recipe_list'),
+			reverse('recipes:recipe_detail', args=[self.recipe.pk]),
+			reverse('categories:category_list'),
+			reverse('ingredients:ingredient_list'),
+		]
+		for url in urls:
+			with self.subTest(url=url):
+				first = self.client.get(url)
+				self.assertEqual(first['X-Page-Cache'], 'miss')
+				with self.assertNumQueries(0):
+					second = self.client.get(url)
+				self.assertEqual(second['X-Page-Cache'], 'hit')
+				self.assertEqual(second.content, first.content)
+				self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+	def test_query_string_is_normalized(self):
+		url = reverse('recipes:recipe_list')
+		self.client.get(url, {'q': 'pasta', 'category': 'italian', 'min_time': ''})
+		response = self.client.get(url + '?category=italian&max_time=&q=pasta')
+		self.assertEqual(response['X-Page-Cache'], 'hit')
+		response = self.client.get(url, {'q': 'soup', 'category': 'italian'})
+		self.assertEqual(response['X-Page-Cache'], 'miss')
+
+	def test_changes_show_up_on_next_request(self):
+		url = reverse('recipes:recipe_detail', args=[self.recipe.pk])
+		self.client.get(url)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.recipe.title = "Fresh Pasta"
+			self.recipe.save()
+		self.assertContains(self.client.get(url), "Fresh Pasta")
+		list_url = reverse('categories:category_list')
+		self.client.get(list_url)
+		with self.captureOnCommitCallbacks(execute=True):
+			Category.objects.create(name="Mexican", slug="mexican")
+		self.assertContains(self.client.get(list_url), "Mexican")
+		ingredient_url = reverse('ingredients:ingredient_list')
+		self.client.get(ingredient_url)
+		with self.captureOnCommitCallbacks(execute=True):
+			RecipeIngredient.objects.create(
+				recipe=self.recipe, ingredient=Ingredient.objects.create(name="Basil", default_unit="g"),
+			)
+		self.assertContains(self.client.get(ingredient_url), "Basil")
+
+	def test_bulk_repairs_invalidate_pages(self):
+		from recipes.counts import repair_all_counts
+		url = reverse('categories:category_list')
+		self.client.get(url)
+		Category.objects.filter(pk=self.category.pk).update(recipe_count=7)
+		repair_all_counts()
+		self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+
+	def test_signed_in_users_are_not_cached(self):
+		self.client.force_login(self.user)
+		url = reverse('recipes:recipe_list')
+		self.client.get(url)
+		response = self.client.get(url)
+		self.assertNotIn('X-Page-Cache', response)
+		self.assertContains(response, 'Hello, <strong>chef</strong>', html=False)
+		self.assertContains(response, 'csrfmiddlewaretoken')
+
+	def test_errors_are_not_cached(self):
+		url = reverse('recipes:recipe_detail', args=[self.recipe.pk + 100])
+		self.client.get(url)
+		response = self.client.get(url)
+		self.assertEqual(response.status_code, 404)
+		self.assertNotIn('X-Page-Cache', response)
+
+	def test_header_fragments_keep_the_active_section(self):
+		response = self.client.get(reverse('categories:category_list'))
+		self.assertContains(
+			response, f'<a href="{reverse("categories:category_list")}" class="active">Categories</a>', html=True,
+		)
+		response = self.client.get(reverse('ingredients:ingredient_list'))
+		self.assertContains(
+			response, f'<a href="{reverse("ingredients:ingredient_list")}" class="active">Ingredients</a>', html=True,
+		)
+		self.assertContains(response, f'<a href="{reverse("categories:category_list")}">Categories</a>', html=True)
+
+
+class AsyncViewTests(TestCase):
+	"""The async list and search views, served through the ASGI handler."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username="chef", password="pass12345")
+		cls.category = Category.objects.create(name="Italian", slug="italian")
+		Recipe.objects.create(title="Pasta", instructions="Boil", author=cls.user, category=cls.category)
+		Ingredient.objects.create(name="Basil", default_unit="g")
+
+	def setUp(self):
+		cache.clear()
+
+	@override_settings(CHART_RENDER_WORKERS=0)
+	async def test_search_over_asgi(self):
+		from asgiref.sync import sync_to_async
+		response = await self.async_client.get(reverse('recipes:recipe_search'), {'show_all': '1'})
+		self.assertEqual(response.status_code, 302)
+		await sync_to_async(self.async_client.force_login)(self.user)
+		response = await self.async_client.get(reverse('recipes:recipe_search'), {'show_all': '1'})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.context['result_count'], 1)
+		self.assertTrue(response.context['bar_chart'])
+
+	async def test_list_pages_over_asgi(self):
+		for url in (
+			reverse('recipes:recipe_list'), reverse('categories:category_list'),
+			reverse('ingredients:ingredient_list'),
+		):
+			with self.subTest(url=url):
+				response = await self.async_client.get(url)
+				self.assertEqual(response.status_code, 200)
+				self.assertEqual(response['X-Page-Cache'], 'miss')
+				self.assertEqual(response.context['page'].total_count, 1)
+				response = await self.async_client.get(url)
+				self.assertEqual(response['X-Page-Cache'], 'hit')
+
+	async def test_stages_stay_on_the_request_thread_inside_a_transaction(self):
+		import threading
+		from asgiref.sync import sync_to_async
+		from recipes.async_views import gather_blocking
+		request_thread = await sync_to_async(threading.get_ident)()
+		threads = await gather_blocking(threading.get_ident, threading.get_ident)
+		self.assertEqual(threads, [request_thread, request_thread])
+
+
+class GatherBlockingTests(SimpleTestCase):
+	async def test_stages_run_at_the_same_time(self):
+		import time
+		from recipes.async_views import gather_blocking
+
+		def stage(value):
+			time.sleep(0.2)
+			return value
+
+		start = time.perf_counter()
+		results = await gather_blocking(lambda: stage(1), lambda: stage(2), lambda: stage(3))
+		self.assertLess(time.perf_counter() - start, 0.5)
+		self.assertEqual(results, [1, 2, 3])
+
+
+class AsyncQueryCountTests(TransactionTestCase):
+	"""Outside a transaction the stages use worker threads; their queries still count."""
+
+	@override_settings(QUERY_COUNT_HEADER=True)
+	def test_worker_thread_queries_are_counted(self):
+		Category.objects.create(name="Italian", slug="italian")
+		cache.clear()
+		response = self.client.get(reverse('categories:category_list'))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.wsgi_request.query_count, 2)
+		self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+
+class DatabaseRoutingTests(TransactionTestCase):
+	"""Reads from the replica views, writes to the primary, and read-after-write pinning."""
+
+	databases = {'default', 'replica'}
+
+	def setUp(self):
+		cache.clear()
+		self.recipe = Recipe.objects.create(title="Pasta", instructions="Boil")
+		self.url = reverse('recipes:recipe_detail', args=[self.recipe.pk])
+
+	def _get(self, client, url):
+		"""GET ``url``; returns (response, primary queries, replica queries) with their SQL."""
+		from django.db import connections
+		from django.test.utils import CaptureQueriesContext
+		cache.clear()
+		with CaptureQueriesContext(connections['default']) as primary, \
+				CaptureQueriesContext(connections['replica']) as replica:
+			response = client.get(url)
+		return response, [query['sql'] for query in primary], [query['sql'] for query in replica]
+
+	def test_view_reads_go_to_the_replica(self):
+		response, primary, replica = self._get(self.client, self.url)
+		self.assertContains(response, "Pasta")
+		self.assertEqual(primary, [])
+		self.assertGreater(len(replica), 0)
+		self.assertNotIn('primary_until', response.cookies)
+
+	def test_session_and_login_writes_do_not_pin(self):
+		response = self.client.post(reverse('register'), {
+			'username': 'newcook', 'password1': 'Str0ng-pass-42', 'password2': 'Str0ng-pass-42',
+		})
+		self.assertEqual(response.status_code, 302)
+		self.assertNotIn('primary_until', response.cookies)
+		# Only the session and the user come from the primary; the catalog
+		# still comes from the replica
+		response, primary, replica = self._get(self.client, self.url)
+		self.assertContains(response, 'Hello, <strong>newcook</strong>')
+		self.assertEqual(len(primary), 2)
+		self.assertIn('"django_session"', primary[0])
+		self.assertIn('"auth_user"', primary[1])
+		self.assertTrue(all('"recipes_recipe"' not in sql for sql in primary))
+		self.assertGreater(len(replica), 0)
+
+	def test_session_reads_its_own_writes(self):
+		from django.http import HttpResponse
+		from django.test import RequestFactory
+		from recipes.middleware import DatabaseRoutingMiddleware
+
+		def write(request):
+			Category.objects.create(name="Soups", slug="soups")
+			return HttpResponse()
+		response = DatabaseRoutingMiddleware(write)(RequestFactory().post('/'))
+		self.assertIn('primary_until', response.cookies)
+		self.client.cookies['primary_until'] = response.cookies['primary_until'].value
+		# The writer's next reads come from the primary
+		_response, primary, replica = self._get(self.client, self.url)
+		self.assertGreater(len(primary), 0)
+		self.assertEqual(replica, [])
+		# Other sessions keep reading from the replica, which has the row too
+		_response, primary, replica = self._get(Client(), self.url)
+		self.assertEqual(primary, [])
+		self.assertGreater(len(replica), 0)
+		# Once the pin expires the writer is back on the replica
+		with mock.patch('recipes.routers.time.time', return_value=time.time() + 60):
+			_response, primary, replica = self._get(self.client, self.url)
+		self.assertEqual(primary, [])
+
+	def test_router_rules(self):
+		from django.db import transaction
+		from recipes.routers import PrimaryReplicaRouter, begin_request, end_request
+		router = PrimaryReplicaRouter()
+		state, token = begin_request(pinned=False)
+		try:
+			self.assertIsNone(router.db_for_read(Recipe))
+			state.replica_reads = True
+			self.assertEqual(router.db_for_read(Recipe), 'replica')
+			with transaction.atomic():
+				self.assertIsNone(router.db_for_read(Recipe))
+			# Users and sessions always use the primary and do not pin
+			self.assertIsNone(router.db_for_read(User))
+			self.assertEqual(router.db_for_write(User), 'default')
+			self.assertEqual(router.db_for_read(Recipe), 'replica')
+			self.assertEqual(router.db_for_write(Recipe), 'default')
+			self.assertIsNone(router.db_for_read(Recipe))
+		finally:
+			end_request(token)
+		self.assertIsNone(router.db_for_read(Recipe))
+		self.assertFalse(router.allow_migrate('replica', 'recipes'))
+		self.assertTrue(router.allow_migrate('default', 'recipes'))
+
+
+class SqlitePragmaTests(SimpleTestCase):
+	def test_new_connections_are_tuned(self):
+		import os
+		import tempfile
+		from pathlib import Path
+		from django.db import OperationalError, connections
+		from django.db.backends.sqlite3.base import DatabaseWrapper
+		from recipes.routers import enable_wal
+
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, 'tuned.sqlite3')
+			primary = DatabaseWrapper({**connections['default'].settings_dict, 'NAME': path}, 'tuned')
+			replica = DatabaseWrapper(
+				{**connections['default'].settings_dict, 'NAME': f'{Path(path).as_uri()}?mode=ro'}, 'tuned-ro',
+			)
+			try:
+				primary.ensure_connection()
+				pragma = lambda wrapper, name: wrapper.connection.execute(f'PRAGMA {name}').fetchone()[0]
+				# Connecting leaves the file's journal mode alone
+				self.assertEqual(pragma(primary, 'journal_mode'), 'delete')
+				self.assertEqual(pragma(primary, 'synchronous'), 2)  # FULL
+				self.assertEqual(pragma(primary, 'busy_timeout'), 5000)
+				self.assertEqual(pragma(primary, 'mmap_size'), 256 * 1024 * 1024)
+				primary.connection.execute('CREATE TABLE t (x)')
+				self.assertEqual(enable_wal(primary), 'wal')
+				primary.close()
+				primary.ensure_connection()
+				self.assertEqual(pragma(primary, 'synchronous'), 1)  # NORMAL
+				replica.ensure_connection()
+				self.assertEqual(pragma(replica, 'journal_mode'), 'wal')
+				self.assertEqual(pragma(replica, 'busy_timeout'), 5000)
+				with self.assertRaises(OperationalError):
+					with replica.cursor() as cursor:
+						cursor.execute('INSERT INTO t VALUES (1)')
+			finally:
+				primary.close()
+				replica.close()
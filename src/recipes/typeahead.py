@@ -0,0 +1,186 @@
+"""
+Prefix index behind the typeahead endpoint.
+
+Every word of an ingredient name or recipe title is stored as a
+``(word, key)`` pair in one sorted list, so the names containing a word that
+starts with the typed prefix sit in a contiguous run found with bisect. Matches
+are ranked by how many recipes they stand for: an ingredient's recipe_count,
+or the number of recipes sharing a title.
+"""
+import heapq
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.db.models import Count
+
+from ingredients.models import Ingredient
+
+from .indexing import InProcessIndex
+from .models import Recipe
+from .versioning import register_bulk_scope
+
+
+TYPEAHEAD_SCOPE = register_bulk_scope('typeahead')
+
+_WORD = re.compile(r'\w+')
+
+
+def words(text):
+	return _WORD.findall(text.casefold())
+
+
+class PrefixIndex:
+	"""Labels searchable by word prefix, each with a count to rank by."""
+
+	def __init__(self):
+		self._entries = []  # sorted (word, key)
+		self._items = {}  # key -> [label, count]
+
+	def __len__(self):
+		return len(self._items)
+
+	def load(self, items):
+		"""Replace the contents with ``(key, label, count)`` triples."""
+		self._items = {key: [label, count] for key, label, count in items}
+		self._entries = sorted(
+			(word, key) for key, (label, _count) in self._items.items() for word in set(words(label))
+		)
+
+	def put(self, key, label, count=None):
+		"""Add ``key`` or change its label; ``count=None`` keeps the current count."""
+		item = self._items.get(key)
+		if item is not None:
+			if count is None:
+				count = item[1]
+			self.remove(key)
+		self._items[key] = [label, count or 0]
+		for word in set(words(label)):
+			insort(self._entries, (word, key))
+
+	def remove(self, key):
+		item = self._items.pop(key, None)
+		if item is None:
+			return
+		for word in set(words(item[0])):
+			position = bisect_left(self._entries, (word, key))
+			if position < len(self._entries) and self._entries[position] == (word, key):
+				del self._entries[position]
+
+	def adjust(self, key, delta):
+		item = self._items.get(key)
+		if item is not None:
+			item[1] = max(item[1] + delta, 0)
+
+	def count(self, key):
+		item = self._items.get(key)
+		return item[1] if item is not None else 0
+
+	def _keys_with_prefix(self, prefix):
+		keys = set()
+		position = bisect_left(self._entries, (prefix,))
+		entries = self._entries
+		while position < len(entries) and entries[position][0].startswith(prefix):
+			keys.add(entries[position][1])
+			position += 1
+		return keys
+
+	def search(self, query, limit=10):
+		"""
+		The ``limit`` best ``(key, label, count)`` matches for ``query``.
+
+		Every word of the query must start some word of the label. The
+		longest query word is looked up in the index (it has the shortest run)
+		and the others are checked against the candidates.
+		"""
+		query_words = words(query)
+		if not query_words:
+			return []
+		longest = max(query_words, key=len)
+		others = [word for word in query_words if word != longest]
+		matches = []
+		for key in self._keys_with_prefix(longest):
+			label, count = self._items[key]
+			if others:
+				label_words = words(label)
+				if not all(any(word.startswith(other) for word in label_words) for other in others):
+					continue
+			matches.append((key, label, count))
+		return heapq.nsmallest(limit, matches, key=lambda match: (-match[2], match[1].casefold(), str(match[0])))
+
+
+class TypeaheadIndex(InProcessIndex):
+	"""Ingredient names (keyed by pk) and recipe titles (keyed by folded title)."""
+
+	scope = TYPEAHEAD_SCOPE
+
+	def __init__(self):
+		super().__init__()
+		self.ingredients = PrefixIndex()
+		self.titles = PrefixIndex()
+
+	def build(self):
+		self.ingredients.load(Ingredient.objects.values_list('pk', 'name', 'recipe_count').iterator())
+		titles, labels = Counter(), {}
+		rows = Recipe.objects.order_by().values_list('title').annotate(n=Count('pk')).iterator()
+		for title, n in rows:
+			key = title.casefold()
+			titles[key] += n
+			labels.setdefault(key, title)
+		self.titles.load((key, labels[key], n) for key, n in titles.items())
+
+	def search(self, query, limit=10, ingredients=True, titles=True):
+		"""``{'ingredients': [...], 'recipes': [...]}`` for ``query``."""
+		self.ensure()
+		with self._lock:
+			return {
+				'ingredients': self.ingredients.search(query, limit) if ingredients else [],
+				'recipes': self.titles.search(query, limit) if titles else [],
+			}
+
+	# Incremental updates, called from recipes.signals
+
+	def ingredient_saved(self, pk, name):
+		self.update('_ingredient_saved', pk, name)
+
+	def ingredient_deleted(self, pk):
+		self.update('_ingredient_deleted', pk)
+
+	def ingredient_counts_changed(self, deltas):
+		self.update('_ingredient_counts_changed', deltas)
+
+	def title_changed(self, old, new):
+		"""A recipe titled ``old`` (None when created) is now titled ``new`` (None when deleted)."""
+		self.update('_title_changed', old, new)
+
+	# The changes themselves, applied with the lock held (see InProcessIndex.update)
+
+	def _ingredient_saved(self, pk, name):
+		self.ingredients.put(pk, name)
+
+	def _ingredient_deleted(self, pk):
+		self.ingredients.remove(pk)
+
+	def _ingredient_counts_changed(self, deltas):
+		for pk, delta in deltas.items():
+			self.ingredients.adjust(pk, delta)
+
+	def _title_changed(self, old, new):
+		if old is not None:
+			key = old.casefold()
+			self.titles.adjust(key, -1)
+			if not self.titles.count(key):
+				self.titles.remove(key)
+		if new is not None:
+			key = new.casefold()
+			if self.titles.count(key):
+				self.titles.adjust(key, 1)
+			else:
+				self.titles.put(key, new, 1)
+
+
+_index = TypeaheadIndex()
+
+
+def get_index():
+	return _index
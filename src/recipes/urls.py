@@ -8,4 +8,7 @@ urlpatterns = [
     path('recipes/', views.recipe_list, name='recipe_list'),
     path('recipes/<int:pk>/', views.recipe_detail, name='recipe_detail'),
     path('search/', views.recipe_search, name='recipe_search'),
+    path('pantry/', views.pantry, name='pantry'),
+    path('search/export.<slug:fmt>', views.recipe_export, name='recipe_export'),
+    path('search/charts/<slug:name>.<slug:fmt>', views.recipe_chart, name='recipe_chart'),
 ]
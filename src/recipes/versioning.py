@@ -0,0 +1,51 @@
+import time
+
+from django.core.cache import cache
+
+
+VERSION_KEY = 'recipes:version:{scope}'
+
+
+def _new_token():
+	return format(time.time_ns(), 'x')
+
+
+def get_version(scope):
+	"""
+	Return the current data-version token for ``scope``.
+
+	Tokens are opaque strings that change whenever bump_version() is called,
+	so they can be embedded in cache keys and ETags.
+	"""
+	key = VERSION_KEY.format(scope=scope)
+	version = cache.get(key)
+	if version is None:
+		cache.add(key, _new_token(), None)
+		version = cache.get(key)
+	return version
+
+
+def bump_version(*scopes):
+	"""Invalidate everything keyed on the given scopes."""
+	token = _new_token()
+	cache.set_many({VERSION_KEY.format(scope=scope): token for scope in scopes}, None)
+
+
+_bulk_scopes = []
+
+
+def register_bulk_scope(scope):
+	"""
+	Have invalidate_bulk_change() bump ``scope``; returns ``scope``.
+
+	Modules call this where they define their scope, and recipes.signals
+	imports all of them at startup, so every process knows every scope.
+	"""
+	if scope not in _bulk_scopes:
+		_bulk_scopes.append(scope)
+	return scope
+
+
+def invalidate_bulk_change():
+	"""Invalidate every registered scope, after writes that send no model signals (bulk_create(), raw SQL)."""
+	bump_version(*_bulk_scopes)
@@ -1,21 +1,37 @@
+import asyncio
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q, Count, F
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Recipe
-from .forms import RecipeSearchForm
+from .models import Recipe, RecipeIngredient
+from .async_views import async_login_required, gather_blocking
+from .chart_cache import CHART_SCOPE, READY, ChartUnavailable, get_chart_image, schedule_chart
+from .charts import CHART_FORMATS, CHARTS
+from .export import EXPORT_FORMATS, export_lines, export_rows
+from .forms import PantryForm, RecipeSearchForm
+from .fuzzy import get_index as get_fuzzy_index, suggestion_query
+from .page_cache import cache_anonymous_page
+from .pagination import apaginate
+from .pantry import DEFAULT_PANTRY_RESULTS_LIMIT, get_index as get_pantry_index, load_matches
+from .results import apply_search_filters, build_results, order_results
+from .routers import use_replica
+from .search import search_recipes
+from .search_cache import ALL_RECIPES, get_cache as get_search_cache, normalize_search
+from .similarity import SIMILAR_SCOPE, similar_recipes
+from .versioning import get_version
 from categories.models import Category
 from ingredients.models import Ingredient
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-from io import BytesIO
-import base64
-from datetime import datetime
-from collections import Counter
 
 
 def home(request):
@@ -40,25 +56,16 @@ def register(request):
 	return render(request, 'auth/register.html', {'form': form})
 
 
-def recipe_list(request):
-	"""Display all recipes with optional filtering."""
+def _filter_recipes(search_query, category_filter, ingredient_filter, min_time, max_time):
+	"""The recipe_list queryset for the given filters, plus the filtered ingredient's name."""
 	recipes = Recipe.objects.select_related('category', 'author').all()
-	categories = Category.objects.all()
-
-	# Get filter parameters
-	search_query = request.GET.get('q', '').strip()
-	category_filter = request.GET.get('category', '')
-	ingredient_filter = request.GET.get('ingredient', '')
-	max_time = request.GET.get('max_time', '')
 
 	# For displaying ingredient name if filtered
 	ingredient_name = ''
 
-	# Apply search filter (title or description)
+	# Apply full-text search (title, description and instructions)
 	if search_query:
-		recipes = recipes.filter(
-			Q(title__icontains=search_query) | Q(description__icontains=search_query)
-		)
+		recipes = search_recipes(recipes, search_query)
 
 	# Apply category filter
 	if category_filter:
@@ -75,263 +82,257 @@ def recipe_list(request):
 		except ValueError:
 			pass
 
-	# Apply max total time filter
-	if max_time:
-		try:
-			max_minutes = int(max_time)
-			# Filter where prep_time + cook_time <= max_minutes
-			from django.db.models import F
-			recipes = recipes.annotate(
-				total_time=F('prep_time_minutes') + F('cook_time_minutes')
-			).filter(total_time__lte=max_minutes)
-		except ValueError:
-			pass
+	# Apply total time range filters (indexed total_time_minutes column)
+	for param, lookup in ((min_time, 'gte'), (max_time, 'lte')):
+		if param:
+			try:
+				recipes = recipes.filter(**{f'total_time_minutes__{lookup}': int(param)})
+			except ValueError:
+				pass
+	return recipes, ingredient_name
+
+
+@use_replica
+@cache_anonymous_page()
+async def recipe_list(request):
+	"""Display all recipes with optional filtering."""
+	# Get filter parameters
+	search_query = request.GET.get('q', '').strip()
+	category_filter = request.GET.get('category', '')
+	ingredient_filter = request.GET.get('ingredient', '')
+	min_time = request.GET.get('min_time', '')
+	max_time = request.GET.get('max_time', '')
+
+	recipes, ingredient_name = await sync_to_async(_filter_recipes)(
+		search_query, category_filter, ingredient_filter, min_time, max_time,
+	)
+
+	# Keyset pagination keeps every page O(page size); searches are ranked
+	# by relevance, everything else is newest first.
+	if search_query:
+		ordering = ('search_rank', '-created_at', '-id')
+	else:
+		ordering = ('-created_at', '-id')
+	# The page, its count and the filter bar's categories are independent
+	page, categories = await asyncio.gather(
+		apaginate(request, recipes, ordering),
+		sync_to_async(list)(Category.objects.all()),
+	)
 
-	recipes = recipes.order_by('-created_at')
+	# Nothing matched: retry with the misspelt words corrected
+	suggestion = None
+	if search_query and not page.object_list:
+		suggestion = await sync_to_async(get_fuzzy_index().suggest_title)(search_query)
+		if suggestion:
+			recipes, _ = await sync_to_async(_filter_recipes)(
+				suggestion, category_filter, ingredient_filter, min_time, max_time,
+			)
+			page = await apaginate(request, recipes, ordering)
 
 	context = {
-		'recipes': recipes,
+		'recipes': page.object_list,
+		'page': page,
 		'categories': categories,
 		'search_query': search_query,
+		'suggestion': suggestion,
+		'suggestion_query': suggestion_query(request.GET, 'q', suggestion) if suggestion else '',
 		'category_filter': category_filter,
 		'ingredient_filter': ingredient_filter,
 		'ingredient_name': ingredient_name,
+		'min_time': min_time,
 		'max_time': max_time,
 	}
-	return render(request, 'recipes/recipe_list.html', context)
+	return await sync_to_async(render)(request, 'recipes/recipe_list.html', context)
 
 
+@use_replica
+@cache_anonymous_page(SIMILAR_SCOPE)
 def recipe_detail(request, pk):
 	"""Display a single recipe with full details."""
 	recipe = get_object_or_404(
 		Recipe.objects.select_related('category', 'author')
-		.prefetch_related('recipe_ingredients__ingredient'),
+		.prefetch_related(Prefetch(
+			'recipe_ingredients',
+			queryset=RecipeIngredient.objects.select_related('ingredient'),
+		)),
 		pk=pk
 	)
 	
-	total_time = recipe.prep_time_minutes + recipe.cook_time_minutes
-	
 	context = {
 		'recipe': recipe,
-		'total_time': total_time,
+		'total_time': recipe.total_time_minutes,
+		'similar_recipes': similar_recipes(recipe),
 	}
 	return render(request, 'recipes/recipe_detail.html', context)
 
 
-def get_chart_base64(fig):
-	"""Convert a matplotlib figure to base64 encoded string."""
-	buffer = BytesIO()
-	fig.savefig(buffer, format='png', bbox_inches='tight', dpi=100)
-	buffer.seek(0)
-	image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-	buffer.close()
-	plt.close(fig)
-	return image_base64
+def _search_filters_applied(form):
+	return form.is_valid() and any([
+		form.cleaned_data.get('recipe_name'),
+		form.cleaned_data.get('ingredient'),
+		form.cleaned_data.get('category'),
+		form.cleaned_data.get('min_time'),
+		form.cleaned_data.get('max_time')
+	])
 
 
-def create_bar_chart(recipes_qs):
-	"""Create a bar chart showing recipes per category."""
-	# Count recipes per category
-	category_counts = recipes_qs.values('category__name').annotate(
-		count=Count('id')
-	).order_by('-count')
-	
-	categories = [item['category__name'] or 'Uncategorized' for item in category_counts]
-	counts = [item['count'] for item in category_counts]
-	
-	if not categories:
-		return None
-	
-	fig, ax = plt.subplots(figsize=(10, 6))
-	bars = ax.bar(categories, counts, color='#4f8cff', edgecolor='#3a6fd8')
-	
-	# Add value labels on bars
-	for bar, count in zip(bars, counts):
-		ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
-				str(count), ha='center', va='bottom', fontweight='bold')
-	
-	ax.set_xlabel('Category', fontsize=12)
-	ax.set_ylabel('Number of Recipes', fontsize=12)
-	ax.set_title('Recipes per Category', fontsize=14, fontweight='bold')
-	plt.xticks(rotation=45, ha='right')
-	plt.tight_layout()
-	
-	return get_chart_base64(fig)
+def _run_search(query):
+	"""Results and name suggestion for a normalized search (see recipes.search_cache)."""
+	filters = dict(query)
+	results = _filtered_results(filters)
+	recipe_name = filters.get('recipe_name')
+	suggestion = None
+	if recipe_name and not results.count:
+		suggestion = get_fuzzy_index().suggest_title(recipe_name)
+		if suggestion:
+			results = _filtered_results({**filters, 'recipe_name': suggestion})
+	return results, suggestion
 
 
-def create_pie_chart(recipes_qs):
-	"""Create a pie chart showing recipe distribution by cooking time difficulty."""
-	# Categorize recipes by total time
-	quick = 0  # <= 15 min
-	medium = 0  # 16-45 min
-	long_time = 0  # > 45 min
-	
-	for recipe in recipes_qs:
-		total = recipe.prep_time_minutes + recipe.cook_time_minutes
-		if total <= 15:
-			quick += 1
-		elif total <= 45:
-			medium += 1
-		else:
-			long_time += 1
-	
-	labels = ['Quick (≤15 min)', 'Medium (16-45 min)', 'Long (>45 min)']
-	sizes = [quick, medium, long_time]
-	colors = ['#4ade80', '#facc15', '#f87171']
-	
-	# Filter out zero values
-	filtered_data = [(l, s, c) for l, s, c in zip(labels, sizes, colors) if s > 0]
-	if not filtered_data:
-		return None
-	
-	labels, sizes, colors = zip(*filtered_data)
-	
-	fig, ax = plt.subplots(figsize=(8, 8))
-	wedges, texts, autotexts = ax.pie(
-		sizes, labels=labels, colors=colors, autopct='%1.1f%%',
-		startangle=90, explode=[0.02] * len(sizes)
-	)
-	
-	for autotext in autotexts:
-		autotext.set_fontsize(11)
-		autotext.set_fontweight('bold')
-	
-	ax.set_title('Recipe Distribution by Time Complexity', fontsize=14, fontweight='bold')
-	plt.tight_layout()
-	
-	return get_chart_base64(fig)
+def _filtered_results(filters):
+	recipes, ranked = apply_search_filters(Recipe.objects.all(), filters)
+	# Fetch annotated rows in one query; the template renders them in one pass
+	return build_results(order_results(recipes, ranked))
 
 
-def create_line_chart(recipes_qs):
-	"""Create a line chart showing cumulative recipes over time."""
-	# Get recipes with dates
-	recipes_with_dates = recipes_qs.filter(created_at__isnull=False).order_by('created_at')
-	
-	if not recipes_with_dates.exists():
-		return None
-	
-	dates = []
-	cumulative_counts = []
-	count = 0
-	
-	for recipe in recipes_with_dates:
-		count += 1
-		dates.append(recipe.created_at)
-		cumulative_counts.append(count)
-	
-	if len(dates) < 2:
-		return None
-	
-	fig, ax = plt.subplots(figsize=(10, 6))
-	ax.plot(dates, cumulative_counts, marker='o', color='#4f8cff', linewidth=2, markersize=6)
-	ax.fill_between(dates, cumulative_counts, alpha=0.3, color='#4f8cff')
-	
-	ax.set_xlabel('Date', fontsize=12)
-	ax.set_ylabel('Cumulative Recipes', fontsize=12)
-	ax.set_title('Recipe Collection Growth Over Time', fontsize=14, fontweight='bold')
-	plt.xticks(rotation=45, ha='right')
-	ax.grid(True, alpha=0.3)
-	plt.tight_layout()
-	
-	return get_chart_base64(fig)
+def _search_results(form, show_all):
+	"""
+	``((results, suggestion), cache_hit)`` for recipe_search.
+
+	``suggestion`` is the corrected recipe name the results were found with,
+	if the name as typed found nothing. The results are None when nothing
+	was searched.
+	"""
+	if show_all:
+		query = ALL_RECIPES
+	elif _search_filters_applied(form):
+		query = normalize_search(form.cleaned_data)
+	else:
+		return (None, None), None
+	return get_search_cache().get_or_set(query, lambda: _run_search(query))
 
 
-@login_required
-def recipe_search(request):
-	"""Search recipes with filters and display results as pandas DataFrame table."""
+def _chart_url(name):
+	"""
+	Make sure chart ``name`` is cached or rendering; its URL, or None if there is nothing to plot.
+
+	Charts are served by recipe_chart; scheduling them here lets the pool
+	start rendering while the page is still on its way to the browser.
+	"""
+	image, state = schedule_chart(name, Recipe.objects.all())
+	return reverse('recipes:recipe_chart', args=[name, 'png']) if image or state != READY else None
+
+
+@use_replica
+@async_login_required
+async def recipe_search(request):
+	"""Search recipes with filters and display the results as a table."""
 	form = RecipeSearchForm(request.GET or None)
-	recipes_df = None
-	search_performed = False
 	show_all = request.GET.get('show_all', False)
-	
-	# Get base queryset
-	recipes = Recipe.objects.select_related('category', 'author').prefetch_related(
-		'recipe_ingredients__ingredient'
+
+	# The search query and each chart's data query run at the same time; the
+	# charts themselves are drawn in the chart process pool.
+	((results, suggestion), cache_hit), bar_chart, pie_chart, line_chart, chart_version = await gather_blocking(
+		lambda: _search_results(form, show_all),
+		*(partial(_chart_url, name) for name in ('bar', 'pie', 'line')),
+		partial(get_version, CHART_SCOPE),
 	)
-	
-	if show_all:
-		search_performed = True
-	elif form.is_valid() and any([
-		form.cleaned_data.get('recipe_name'),
-		form.cleaned_data.get('ingredient'),
-		form.cleaned_data.get('category'),
-		form.cleaned_data.get('max_time')
-	]):
-		search_performed = True
-		
-		# Apply recipe name filter with partial matching (wildcard/icontains)
-		recipe_name = form.cleaned_data.get('recipe_name')
-		if recipe_name:
-			# Split search terms for flexible matching
-			search_terms = recipe_name.split()
-			query = Q()
-			for term in search_terms:
-				query |= Q(title__icontains=term) | Q(description__icontains=term)
-			recipes = recipes.filter(query)
-		
-		# Apply ingredient filter
-		ingredient = form.cleaned_data.get('ingredient')
-		if ingredient:
-			recipes = recipes.filter(recipe_ingredients__ingredient=ingredient)
-		
-		# Apply category filter
-		category = form.cleaned_data.get('category')
-		if category:
-			recipes = recipes.filter(category=category)
-		
-		# Apply max time filter
-		max_time = form.cleaned_data.get('max_time')
-		if max_time:
-			recipes = recipes.annotate(
-				total_time=F('prep_time_minutes') + F('cook_time_minutes')
-			).filter(total_time__lte=max_time)
-	
-	recipes = recipes.distinct().order_by('-created_at')
-	
-	# Convert to pandas DataFrame if search was performed
-	if search_performed and recipes.exists():
-		data = []
-		for recipe in recipes:
-			ingredient_count = recipe.recipe_ingredients.count()
-			total_time = recipe.prep_time_minutes + recipe.cook_time_minutes
-			data.append({
-				'id': recipe.pk,
-				'name': recipe.title,
-				'category': recipe.category.name if recipe.category else 'Uncategorized',
-				'ingredients': ingredient_count,
-				'total_time': f"{total_time} min",
-				'author': recipe.author.username if recipe.author else 'Unknown'
-			})
-		
-		df = pd.DataFrame(data)
-		recipes_df = df.to_html(
-			classes='search-results-table',
-			index=False,
-			escape=False,
-			columns=['name', 'category', 'ingredients', 'total_time', 'author']
-		)
-		
-		# Make recipe names clickable
-		for recipe in recipes:
-			old_name = f'<td>{recipe.title}</td>'
-			new_name = f'<td><a href="/recipes/{recipe.pk}/" class="recipe-link">{recipe.title}</a></td>'
-			recipes_df = recipes_df.replace(old_name, new_name)
-	
-	# Generate charts
-	all_recipes = Recipe.objects.all()
-	bar_chart = create_bar_chart(all_recipes)
-	pie_chart = create_pie_chart(all_recipes)
-	line_chart = create_line_chart(all_recipes)
-	
+
 	context = {
 		'form': form,
-		'recipes_df': recipes_df,
-		'search_performed': search_performed,
-		'result_count': recipes.count() if search_performed else 0,
+		'results': results.rows if results else [],
+		'results_truncated': results.truncated if results else False,
+		'search_performed': results is not None,
+		'result_count': results.count if results else 0,
 		'bar_chart': bar_chart,
 		'pie_chart': pie_chart,
 		'line_chart': line_chart,
+		'chart_version': chart_version,
+		'suggestion': suggestion,
+		# Export what the page shows, including results found through a suggestion
+		'export_query': (
+			suggestion_query(request.GET, 'recipe_name', suggestion) if suggestion
+			else request.GET.urlencode()
+		),
 	}
 	
-	return render(request, 'recipes/recipe_search.html', context)
+	response = await sync_to_async(render)(request, 'recipes/recipe_search.html', context)
+	if cache_hit is not None:
+		response['X-Search-Cache'] = 'hit' if cache_hit else 'miss'
+	return response
+
+
+def pantry(request):
+	"""Recipes ranked by how much of their ingredient list the user already has."""
+	form = PantryForm(request.GET or None)
+	matches = []
+	match_count = 0
+	if form.is_bound and form.is_valid():
+		ingredient_ids = [ingredient.pk for ingredient in form.cleaned_data['ingredients']]
+		limit = getattr(settings, 'PANTRY_RESULTS_LIMIT', DEFAULT_PANTRY_RESULTS_LIMIT)
+		match_count, matches = get_pantry_index().match(
+			ingredient_ids, max_missing=form.cleaned_data['max_missing'], limit=limit,
+		)
+		matches = load_matches(matches, ingredient_ids)
+
+	context = {
+		'form': form,
+		'matches': matches,
+		'match_count': match_count,
+		'unknown_ingredients': form.unknown_ingredients,
+	}
+	return render(request, 'recipes/pantry.html', context)
+
+
+@login_required
+def recipe_export(request, fmt):
+	"""Stream every recipe matching the recipe_search filters as CSV or JSON Lines."""
+	if fmt not in EXPORT_FORMATS:
+		raise Http404('Unknown export format')
+	form = RecipeSearchForm(request.GET or None)
+	if form.is_bound and not form.is_valid():
+		return HttpResponseBadRequest(form.errors.as_text(), content_type='text/plain')
+
+	recipes, ranked = Recipe.objects.all(), False
+	if _search_filters_applied(form):
+		recipes, ranked = apply_search_filters(recipes, form.cleaned_data)
 
+	rows = export_rows(order_results(recipes, ranked))
+	response = StreamingHttpResponse(export_lines(rows, fmt), content_type=EXPORT_FORMATS[fmt])
+	filename = f"recipes-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"
+	response['Content-Disposition'] = f'attachment; filename="{filename}"'
+	return response
+
+
+def _chart_etag(request, name, fmt):
+	return f'{name}.{fmt}-{get_version(CHART_SCOPE)}'
+
+
+@login_required
+@condition(etag_func=_chart_etag)
+def recipe_chart(request, name, fmt):
+	"""Serve a recipe_search chart as PNG or SVG with conditional GET support."""
+	if name not in CHARTS or fmt not in CHART_FORMATS:
+		raise Http404('Unknown chart')
+	
+	try:
+		image = get_chart_image(name, Recipe.objects.all(), fmt)
+	except ChartUnavailable as unavailable:
+		if unavailable.stale is None:
+			response = HttpResponse('Chart is still rendering.', status=503, content_type='text/plain')
+			response['Retry-After'] = '2'
+			return response
+		# The previous version, until the current one is rendered: never
+		# stored, and tagged with its own version so it cannot be revalidated
+		version, image = unavailable.stale
+		response = HttpResponse(image, content_type=CHART_FORMATS[fmt])
+		response['Cache-Control'] = 'no-store'
+		response['ETag'] = quote_etag(f'{name}.{fmt}-{version}')
+		return response
+	if image is None:
+		raise Http404('No data for this chart')
+	
+	response = HttpResponse(image, content_type=CHART_FORMATS[fmt])
+	# Always revalidate: the ETag changes as soon as the data does
+	response['Cache-Control'] = 'private, no-cache'
+	return response